@@ -0,0 +1,117 @@
+"""
+ASGI variant of the cloud langroid server (see server.py).
+
+Completions await `ChatAgent.llm_response_async`, so a single worker keeps
+many LLM calls in flight at once. Requests to the *same* agent are still
+serialized (by the per-agent lock in langroid_agents.py), since one agent's
+message history can only advance one turn at a time.
+
+Run like this:
+
+uvicorn async_server:app --host 0.0.0.0 --port 8080
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+
+# metrics.py and llm_pool.py are shared by the example servers
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "server_common"))
+
+import langroid_agents
+import llm_pool
+import metrics
+
+app = FastAPI()
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = Jinja2Templates(directory="templates")
+# index.html uses the Flask-style url_for('static', filename=...)
+templates.env.globals["url_for"] = lambda name, filename: f"/{name}/{filename}"
+
+agent_manager = langroid_agents.AgentManager()
+metrics.add_collector(agent_manager.metrics)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+
+@app.get('/')
+async def index(request: Request):
+    return templates.TemplateResponse(request, 'index.html')
+
+# Create endpoint for langroid agent.
+@app.post('/langroid/agent')
+async def create_agent(request: Request):
+    request_data = await request.json()
+    name = request_data['agent_name']
+    agent_name = await agent_manager.create_agent_async(name)
+
+    return {"message": f"Agent {agent_name} created successfully."}
+
+# Example endpoint to get LLM response.
+@app.post('/langroid/agent/completions')
+async def serve_completions(request: Request):
+    request_data = await request.json()
+
+    # Prepare get_agent_response params.
+    agent_name = request_data.get('agent_name', 'default')
+    llm_prompt = request_data.get('prompt', 'tell me something.')
+
+    resp = await agent_manager.get_agent_response_async(agent_name, llm_prompt)
+    if resp is not None:
+        return {"message": f"{resp}"}
+    else:
+        return JSONResponse({"message": "something went wrong"}, status_code=500)
+
+# Streaming endpoint: sends tokens as server-sent events as they arrive.
+@app.post('/langroid/agent/completions/stream')
+async def stream_completions(request: Request):
+    request_data = await request.json()
+
+    agent_name = request_data.get('agent_name', 'default')
+    llm_prompt = request_data.get('prompt', 'tell me something.')
+    tokens = await agent_manager.stream_agent_response(agent_name, llm_prompt)
+
+    async def events():
+        # if the client disconnects, this generator is cancelled, which
+        # closes `tokens` and cancels the upstream LLM call
+        async for token in tokens:
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# Agent pool metrics: size, hit rate, evictions.
+@app.get('/langroid/agent/stats')
+async def agent_stats():
+    return agent_manager.stats()
+
+# Shared LLM connection pool utilization.
+@app.get('/langroid/llm/stats')
+async def llm_stats():
+    return llm_pool.stats()
+
+# Prometheus metrics.
+@app.get('/metrics')
+async def serve_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=8080)
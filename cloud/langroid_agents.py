@@ -1,6 +1,16 @@
 """
 This file defines all the langroid related classes.
 """
+import asyncio
+import contextlib
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
 from random import choice
 from string import ascii_lowercase
 
@@ -9,35 +19,215 @@ from langroid.agent.task import Task
 from langroid.language_models.openai_gpt import (OpenAIChatModel,
                                                  OpenAIGPTConfig)
 
+# metrics.py, llm_pool.py and llm_stream.py are shared by the example servers
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "server_common"))
+
+import llm_pool
+import llm_stream
+import metrics
+
+# Pool limits, overridable from the environment (e.g. in the .env file).
+MAX_AGENTS = int(os.environ.get("LANGROID_MAX_AGENTS", "100"))
+AGENT_IDLE_TTL = float(os.environ.get("LANGROID_AGENT_IDLE_TTL", "1800"))
+# If set, evicted agents' message histories are saved here and restored
+# the next time the agent is asked for.
+AGENT_SPILL_DIR = os.environ.get("LANGROID_AGENT_SPILL_DIR") or None
+
 
 class LangroidAgent:
     def __init__(self, agent_name, chat_model=OpenAIChatModel.GPT4):
         self.name = agent_name
+        self.chat_model = chat_model
         config = ChatAgentConfig(
             name=agent_name,
-            llm = OpenAIGPTConfig(
+            # all agents share one HTTP connection pool per LLM base URL
+            llm = llm_pool.pooled(OpenAIGPTConfig(
                 chat_model=chat_model,
-            ),
+            )),
             vecdb=None,
         )
         self.agent = ChatAgent(config)
+        # Serializes turns on this agent: its message history is only
+        # consistent if one llm_response runs at a time.
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        # number of responses in progress or about to start (counted by
+        # AgentManager.get_agent(name, hold=True)); busy agents are never
+        # evicted
+        self.in_flight = 0
+
+    # The response methods below are called on an agent obtained with
+    # get_agent(name, hold=True), and release that hold when done.
 
     def get_response(self, prompt):
-        response = self.agent.llm_response(prompt)
+        try:
+            response = self.agent.llm_response(prompt)
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+        metrics.observe_response(response)
+        if response is not None:
+            return response.content
+
+        return None
+
+    async def get_response_async(self, prompt):
+        try:
+            async with self.lock:
+                response = await self.agent.llm_response_async(prompt)
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+        metrics.observe_response(response)
         if response is not None:
             return response.content
 
         return None
 
+    async def stream_response_async(self, prompt):
+        '''
+        Async generator yielding the response tokens as the LLM streams them.
+        Closing the generator (e.g. on client disconnect) cancels the LLM call.
+        '''
+        try:
+            async with self.lock:
+                # closed before the lock is released, even if we are closed early
+                tokens = llm_stream.stream_response(self.agent, prompt)
+                async with contextlib.aclosing(tokens):
+                    async for token in tokens:
+                        yield token
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
 class AgentManager:
-    def __init__(self):
+    def __init__(
+        self,
+        max_agents=MAX_AGENTS,
+        idle_ttl=AGENT_IDLE_TTL,
+        spill_dir=AGENT_SPILL_DIR,
+    ):
         '''
-        self.agents is a dict from agent_name and the ChatAgent object.
+        self.agents is an LRU-ordered dict from agent_name to LangroidAgent,
+        holding at most max_agents agents; agents idle for longer than
+        idle_ttl seconds are reaped. Evicted/reaped agents are spilled to
+        spill_dir (if given) and rehydrated on their next request.
         self.langroid_agent is a the default chat agent.
         '''
-        self.agents = {}
+        self.agents = OrderedDict()
+        # evicted agents whose history is still being written out
+        self.spilling = {}
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
         self.langroid_agent = LangroidAgent('default')
-        pass
+        # guards self.agents: the Flask server handles requests in threads
+        self.pool_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reaped = 0
+        self.rehydrated = 0
+
+    def _spill_path(self, name):
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pkl")
+
+    def _remove(self, name):
+        '''
+        Drop an agent from the pool (under pool_lock). If spilling is
+        configured, the agent is returned, to be written out by `_spill`
+        once the lock is released; until then it is kept in self.spilling.
+        '''
+        agent = self.agents.pop(name)
+        if self.spill_dir is None:
+            return None
+        self.spilling[name] = agent
+        return agent
+
+    def _spill(self, removed):
+        '''Write out the histories of agents dropped by `_remove`.'''
+        for agent in removed:
+            if agent is None:
+                continue
+            path = self._spill_path(agent.name)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(
+                    dict(
+                        model=agent.chat_model,
+                        history=agent.agent.message_history,
+                    ),
+                    f,
+                )
+            with self.pool_lock:
+                # only if the agent was not taken back meanwhile
+                if self.spilling.get(agent.name) is agent:
+                    os.replace(tmp, path)
+                    del self.spilling[agent.name]
+                else:
+                    os.remove(tmp)
+
+    def _spill_version(self, name):
+        if self.spill_dir is None:
+            return None
+        try:
+            st = os.stat(self._spill_path(name))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load_spilled(self, name):
+        '''
+        Rebuild a spilled agent, or return None if there is none, with the
+        version of the spill file it came from.
+        '''
+        if self.spill_dir is None:
+            return None, None
+        version = self._spill_version(name)
+        try:
+            with open(self._spill_path(name), "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None, None
+        agent = LangroidAgent(name, state["model"])
+        agent.agent.message_history = state["history"]
+        return agent, version
+
+    def _make_room(self):
+        '''Evict least-recently-used idle agents until below capacity.'''
+        removed = []
+        for name in list(self.agents):
+            if len(self.agents) < self.max_agents:
+                break
+            if self.agents[name].in_flight == 0:
+                removed.append(self._remove(name))
+                self.evictions += 1
+        return removed
+
+    def _insert(self, name, agent):
+        if name in self.agents:
+            del self.agents[name]
+        removed = self._make_room()
+        self.agents[name] = agent
+        return removed
+
+    def reap_idle(self):
+        '''Remove agents that have not been used for idle_ttl seconds.'''
+        cutoff = time.monotonic() - self.idle_ttl
+        removed = []
+        with self.pool_lock:
+            # agents are in LRU order, so stop at the first recent one
+            for name in list(self.agents):
+                agent = self.agents[name]
+                if agent.last_used > cutoff:
+                    break
+                if agent.in_flight == 0:
+                    removed.append(self._remove(name))
+                    self.reaped += 1
+        self._spill(removed)
 
     def create_agent(self, name="", model=OpenAIChatModel.GPT4):
         '''
@@ -48,15 +238,119 @@ class AgentManager:
         if name == "":
             name = ''.join([choice(ascii_lowercase) for _ in range(32)])
 
-        self.agents[name] = LangroidAgent(name, model)
+        agent = LangroidAgent(name, model)
+        with self.pool_lock:
+            removed = self._insert(name, agent)
+            # a new agent starts with a fresh history
+            self.spilling.pop(name, None)
+            if self.spill_dir is not None and os.path.exists(self._spill_path(name)):
+                os.remove(self._spill_path(name))
+        self._spill(removed)
 
         return name
 
+    def _take(self, name, hold):
+        '''The pooled (or still spilling) agent, under pool_lock, or None.'''
+        agent = self.agents.get(name)
+        if agent is not None:
+            self.hits += 1
+            self.agents.move_to_end(name)
+        else:
+            agent = self.spilling.pop(name, None)
+            if agent is not None:
+                self.hits += 1
+                self.agents[name] = agent
+        if agent is not None and hold:
+            agent.in_flight += 1
+        return agent
+
+    def get_agent(self, name, hold=False):
+        '''
+        Returns the named agent (rehydrating it if it was spilled),
+        or the default agent if there is no such agent. With `hold`, the
+        agent is counted in `in_flight` before it is returned, so it cannot
+        be evicted before the response that releases it starts.
+        Spilled histories are read and written outside pool_lock, so in the
+        async server call this in a thread (see get_agent_async).
+        '''
+        self.reap_idle()
+        while name != self.langroid_agent.name:
+            with self.pool_lock:
+                agent = self._take(name, hold)
+            if agent is not None:
+                return agent
+            spilled, version = self._load_spilled(name)
+            removed = []
+            with self.pool_lock:
+                # another request may have brought it back meanwhile...
+                agent = self._take(name, hold)
+                if agent is not None:
+                    return agent
+                # ...and even spilled it again: then read the new history
+                if version != self._spill_version(name):
+                    continue
+                self.misses += 1
+                if spilled is not None:
+                    os.remove(self._spill_path(name))
+                    self.rehydrated += 1
+                    removed = self._insert(name, spilled)
+                    if hold:
+                        spilled.in_flight += 1
+                    agent = spilled
+            self._spill(removed)
+            if agent is not None:
+                return agent
+            break
+        agent = self.langroid_agent
+        if hold:
+            with self.pool_lock:
+                agent.in_flight += 1
+        return agent
+
+    async def get_agent_async(self, name, hold=False):
+        '''get_agent, in a thread: it may read or write spilled histories.'''
+        return await asyncio.to_thread(self.get_agent, name, hold)
+
+    async def create_agent_async(self, name="", model=OpenAIChatModel.GPT4):
+        return await asyncio.to_thread(self.create_agent, name, model)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            size=len(self.agents),
+            capacity=self.max_agents,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+            evictions=self.evictions,
+            reaped=self.reaped,
+            rehydrated=self.rehydrated,
+        )
+
+    def metrics(self):
+        '''Agent pool metrics, read when /metrics is scraped.'''
+        stats = self.stats()
+        return [
+            ("agent_pool_size", "gauge", "Agents in the pool", stats["size"]),
+            ("agent_pool_hit_rate", "gauge", "Agent pool hit rate", stats["hit_rate"]),
+            ("agent_pool_evictions_total", "counter", "Agents evicted (LRU)",
+             stats["evictions"]),
+            ("agent_pool_reaped_total", "counter", "Idle agents reaped",
+             stats["reaped"]),
+        ]
+
     def get_agent_response(self, name, prompt):
-        if name in self.agents:
-            return self.agents[name].get_response(prompt)
+        return self.get_agent(name, hold=True).get_response(prompt)
 
-        return self.langroid_agent.get_response(prompt)
+    async def get_agent_response_async(self, name, prompt):
+        agent = await self.get_agent_async(name, hold=True)
+        return await agent.get_response_async(prompt)
 
-        
-        
\ No newline at end of file
+    async def stream_agent_response(self, name, prompt):
+        '''
+        The response tokens of the named agent, as an async generator. The
+        agent is held from now on, not only once the generator starts, so
+        it cannot be evicted (and spilled) before the response streams.
+        '''
+        agent = await self.get_agent_async(name, hold=True)
+        return agent.stream_response_async(prompt)
@@ -0,0 +1,166 @@
+"""
+Load test for the cloud langroid server completions endpoint.
+
+Each concurrency level runs that many clients, each with its own agent,
+issuing `--requests` sequential completions. Reports p50/p99 latency and
+requests/sec per level.
+
+Start the mock LLM, the server under test, then the load test:
+
+MOCK_LLM_LATENCY=0.5 uvicorn mock_openai:app --port 9000
+OPENAI_API_BASE=http://localhost:9000/v1 OPENAI_API_KEY=xxx \\
+    uvicorn async_server:app --port 8080
+python3 load_test.py --url http://localhost:8080
+
+(run the Flask server.py the same way to compare against the blocking path).
+
+With `--disconnects N` it then opens N streaming completions, drops each one
+after its first token, and checks that the server's LLM pool gives all of
+their concurrency slots back (`in_flight` returns to 0). Use a slow token
+stream for this, e.g. MOCK_LLM_TOKEN_DELAY=1.
+"""
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+import typer
+from rich import print
+from rich.table import Table
+
+app = typer.Typer()
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+async def run_level(
+    url: str, concurrency: int, n_requests: int, shared: bool, timeout: float
+) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=url, timeout=timeout, limits=limits
+    ) as client:
+        names = [
+            "default" if shared else f"load-{concurrency}-{i}"
+            for i in range(concurrency)
+        ]
+        if not shared:
+            for name in names:
+                r = await client.post("/langroid/agent", json={"agent_name": name})
+                r.raise_for_status()
+
+        latencies: List[float] = []
+        errors = 0
+
+        async def client_loop(name: str) -> None:
+            nonlocal errors
+            for i in range(n_requests):
+                start = time.perf_counter()
+                r = await client.post(
+                    "/langroid/agent/completions",
+                    json={"agent_name": name, "prompt": f"request {i} from {name}"},
+                )
+                if r.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(name) for name in names))
+        elapsed = time.perf_counter() - start
+
+    return dict(
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=errors,
+        p50=percentile(latencies, 50) if latencies else float("nan"),
+        p99=percentile(latencies, 99) if latencies else float("nan"),
+        mean=statistics.mean(latencies) if latencies else float("nan"),
+        rps=len(latencies) / elapsed,
+    )
+
+
+async def run_disconnects(url: str, n: int, timeout: float) -> dict:
+    """
+    Open `n` streaming completions, each on its own agent, and disconnect
+    from each as soon as its first token arrives; then poll the server's LLM
+    pool until no request is in flight (or `timeout` passes).
+    """
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+
+        async def drop_after_first_token(i: int) -> None:
+            async with client.stream(
+                "POST",
+                "/langroid/agent/completions/stream",
+                json={"agent_name": f"disconnect-{i}", "prompt": f"request {i}"},
+            ) as r:
+                async for line in r.aiter_lines():
+                    if line.startswith("data:"):
+                        break
+            # leaving the block closes the connection mid-stream
+
+        await asyncio.gather(*(drop_after_first_token(i) for i in range(n)))
+        start = time.perf_counter()
+        while True:
+            stats = (await client.get("/langroid/llm/stats")).json()
+            waited = time.perf_counter() - start
+            if stats["in_flight"] == 0 or waited > timeout:
+                return dict(in_flight=stats["in_flight"], waited=waited)
+            await asyncio.sleep(0.1)
+
+
+@app.command()
+def main(
+    url: str = typer.Option("http://localhost:8080", "--url", "-u", help="server"),
+    levels: str = typer.Option(
+        "1,16,128", "--levels", "-l", help="comma-separated concurrency levels"
+    ),
+    n_requests: int = typer.Option(
+        5, "--requests", "-n", help="sequential requests per client"
+    ),
+    shared: bool = typer.Option(
+        False, "--shared", "-s", help="all clients talk to the default agent"
+    ),
+    timeout: float = typer.Option(300.0, "--timeout", "-t", help="request timeout"),
+    disconnects: int = typer.Option(
+        0, "--disconnects", "-d", help="streaming clients that disconnect early"
+    ),
+) -> None:
+    table = Table(title=f"Completions load test: {url}")
+    for col in ["clients", "ok", "errors", "p50 (s)", "p99 (s)", "mean (s)", "req/s"]:
+        table.add_column(col, justify="right")
+
+    for level in [int(x) for x in levels.split(",") if x]:
+        res = asyncio.run(run_level(url, level, n_requests, shared, timeout))
+        table.add_row(
+            str(res["concurrency"]),
+            str(res["requests"]),
+            str(res["errors"]),
+            f"{res['p50']:.3f}",
+            f"{res['p99']:.3f}",
+            f"{res['mean']:.3f}",
+            f"{res['rps']:.1f}",
+        )
+    print(table)
+
+    if disconnects > 0:
+        res = asyncio.run(run_disconnects(url, disconnects, timeout))
+        if res["in_flight"] != 0:
+            print(
+                f"[red]{res['in_flight']} LLM pool slot(s) still held "
+                f"{res['waited']:.1f}s after {disconnects} client disconnects"
+            )
+            raise typer.Exit(1)
+        print(
+            f"[green]All LLM pool slots released {res['waited']:.1f}s "
+            f"after {disconnects} client disconnects"
+        )
+
+
+if __name__ == "__main__":
+    app()
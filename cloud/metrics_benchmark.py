@@ -0,0 +1,66 @@
+"""
+Per-request cost of the instrumentation in metrics.py.
+
+Times the calls a request makes (track_request, histogram observe, counter
+inc) against an empty loop, and how long rendering /metrics takes:
+
+python3 metrics_benchmark.py -n 200000
+"""
+import sys
+import time
+from pathlib import Path
+
+import typer
+from rich import print
+from rich.table import Table
+
+# metrics.py and llm_pool.py are shared by the example servers
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "server_common"))
+
+import metrics
+
+app = typer.Typer()
+
+
+def ns_per_op(fn, n: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter_ns() - start) / n
+
+
+@app.command()
+def main(
+    n: int = typer.Option(200_000, "--iterations", "-n", help="calls per case"),
+) -> None:
+    def track():
+        with metrics.track_request("/bench"):
+            pass
+
+    cases = [
+        ("empty loop", lambda: None),
+        ("counter inc", lambda: metrics.LLM_CACHE.inc(1, "miss")),
+        ("histogram observe", lambda: metrics.LLM_CALL_SECONDS.observe(0.42)),
+        ("track_request", track),
+    ]
+    baseline = ns_per_op(cases[0][1], n)
+
+    table = Table(title=f"metrics overhead ({n} calls each)")
+    table.add_column("operation")
+    table.add_column("ns/op", justify="right")
+    table.add_column("over empty loop", justify="right")
+    for label, fn in cases:
+        ns = ns_per_op(fn, n)
+        table.add_row(label, f"{ns:.0f}", f"{max(ns - baseline, 0):.0f}")
+    start = time.perf_counter_ns()
+    text = metrics.render()
+    table.add_row(
+        f"render() ({len(text.splitlines())} lines)",
+        f"{time.perf_counter_ns() - start:.0f}",
+        "",
+    )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,100 @@
+"""
+A tiny OpenAI-compatible chat-completions endpoint for local load testing.
+
+It does no inference: each call sleeps for MOCK_LLM_LATENCY seconds
+(default 0.5) and returns a canned answer, streamed word by word when the
+client asks for `stream: true`. With MOCK_LLM_ECHO=1 the answer instead
+reports the API key, the number of messages and the last message it got,
+which lets tests check that requests don't leak into each other.
+
+Run like this:
+
+MOCK_LLM_LATENCY=0.5 uvicorn mock_openai:app --port 9000
+
+and point the agents at it with OPENAI_API_BASE=http://localhost:9000/v1
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(os.environ.get("MOCK_LLM_LATENCY", "0.5"))
+# delay between streamed tokens; the first token arrives after LATENCY
+TOKEN_DELAY = float(os.environ.get("MOCK_LLM_TOKEN_DELAY", "0.01"))
+ANSWER = "This is a mock answer from the local test endpoint."
+ECHO = os.environ.get("MOCK_LLM_ECHO", "0") == "1"
+
+app = FastAPI()
+
+
+def _answer(request, messages):
+    if not ECHO:
+        return ANSWER
+    key = request.headers.get("authorization", "").removeprefix("Bearer ")
+    last = messages[-1].get("content", "") if messages else ""
+    return f"key={key} messages={len(messages)} last={last}"
+
+
+def _usage(messages, answer):
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    completion_tokens = len(answer.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _chunk(id, model, delta, finish_reason=None):
+    return {
+        "id": id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def _stream(id, model, messages, answer):
+    await asyncio.sleep(LATENCY)
+    for i, word in enumerate(answer.split()):
+        token = word if i == 0 else " " + word
+        yield f"data: {json.dumps(_chunk(id, model, {'content': token}))}\n\n"
+        await asyncio.sleep(TOKEN_DELAY)
+    last = _chunk(id, model, {}, finish_reason="stop")
+    last["usage"] = _usage(messages, answer)
+    yield f"data: {json.dumps(last)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    messages = body.get("messages", [])
+    id = f"chatcmpl-{uuid.uuid4().hex}"
+    answer = _answer(request, messages)
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream(id, model, messages, answer), media_type="text/event-stream"
+        )
+
+    await asyncio.sleep(LATENCY)
+    return {
+        "id": id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": _usage(messages, answer),
+    }
@@ -1,12 +1,33 @@
 """
 This file defines the cloud langroid server.
 """
-from flask import Flask, jsonify, request, render_template
+import sys
+import time
+from pathlib import Path
+
+from flask import Flask, Response, g, jsonify, request, render_template
+
+# metrics.py and llm_pool.py are shared by the example servers
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "server_common"))
 
 import langroid_agents
+import llm_pool
+import metrics
 
 app = Flask(__name__)
 agent_manager = langroid_agents.AgentManager()
+metrics.add_collector(agent_manager.metrics)
+
+@app.before_request
+def start_request_timer():
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    g.request_start = time.perf_counter()
+
+@app.teardown_request
+def record_request_latency(exc=None):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+    metrics.REQUESTS_IN_FLIGHT.dec()
 
 @app.route('/')
 def index():
@@ -38,6 +59,21 @@ def serve_completions():
     else:
         return jsonify({"message": "something went wrong"}), 500
 
+# Agent pool metrics: size, hit rate, evictions.
+@app.route('/langroid/agent/stats', methods=['GET'])
+def agent_stats():
+    return jsonify(agent_manager.stats()), 200
+
+# Shared LLM connection pool utilization.
+@app.route('/langroid/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm_pool.stats()), 200
+
+# Prometheus metrics.
+@app.route('/metrics', methods=['GET'])
+def serve_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     # TODO: Use WSGI server for production.
     app.run(host='0.0.0.0', port=8080)
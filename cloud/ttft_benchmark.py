@@ -0,0 +1,105 @@
+"""
+Time-to-first-token: blocking completions endpoint vs. its SSE streaming twin.
+
+For the blocking endpoint the first token arrives with the whole response;
+for the streaming endpoint it is the first `data:` event carrying a token.
+
+Start the mock LLM (it streams when asked to), the server, then this script:
+
+MOCK_LLM_LATENCY=0.3 MOCK_LLM_TOKEN_DELAY=0.05 uvicorn mock_openai:app --port 9000
+OPENAI_API_BASE=http://localhost:9000/v1 OPENAI_API_KEY=xxx \\
+    uvicorn async_server:app --port 8080
+python3 ttft_benchmark.py --url http://localhost:8080
+
+For the fastapi-server app:
+
+python3 ttft_benchmark.py --url http://localhost:80 --field text \\
+    --endpoint /process_text --stream-endpoint /process_text_stream
+"""
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Tuple
+
+import httpx
+import typer
+from rich import print
+from rich.table import Table
+
+app = typer.Typer()
+
+
+async def blocking_ttft(
+    client: httpx.AsyncClient, endpoint: str, payload: dict
+) -> Tuple[float, float]:
+    start = time.perf_counter()
+    r = await client.post(endpoint, json=payload)
+    r.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def streaming_ttft(
+    client: httpx.AsyncClient, endpoint: str, payload: dict
+) -> Tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", endpoint, json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if first is None and line.startswith("data:"):
+                if json.loads(line[len("data:") :]).get("token"):
+                    first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total
+
+
+async def measure(
+    url: str, endpoint: str, stream: bool, field: str, n: int
+) -> List[Tuple[float, float]]:
+    results = []
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        for i in range(n):
+            payload = {field: f"ttft request {i}: tell me something."}
+            if stream:
+                results.append(await streaming_ttft(client, endpoint, payload))
+            else:
+                results.append(await blocking_ttft(client, endpoint, payload))
+    return results
+
+
+@app.command()
+def main(
+    url: str = typer.Option("http://localhost:8080", "--url", "-u", help="server"),
+    endpoint: str = typer.Option(
+        "/langroid/agent/completions", "--endpoint", "-e", help="blocking endpoint"
+    ),
+    stream_endpoint: str = typer.Option(
+        "/langroid/agent/completions/stream",
+        "--stream-endpoint",
+        "-se",
+        help="streaming endpoint",
+    ),
+    field: str = typer.Option("prompt", "--field", "-f", help="prompt field name"),
+    n: int = typer.Option(10, "--requests", "-n", help="requests per endpoint"),
+) -> None:
+    table = Table(title=f"Time to first token: {url}")
+    for col in ["endpoint", "TTFT p50 (s)", "TTFT mean (s)", "total mean (s)"]:
+        table.add_column(col, justify="right")
+
+    for path, stream in [(endpoint, False), (stream_endpoint, True)]:
+        res = asyncio.run(measure(url, path, stream, field, n))
+        ttft = [r[0] for r in res]
+        total = [r[1] for r in res]
+        table.add_row(
+            path,
+            f"{statistics.median(ttft):.3f}",
+            f"{statistics.mean(ttft):.3f}",
+            f"{statistics.mean(total):.3f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
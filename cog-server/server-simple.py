@@ -1,10 +1,35 @@
+import os
+import pathlib
+import sys
+import time
+
+from cog import Input, Path
+
 import langroid as lr
 import langroid.language_models as lm
+from langroid.utils.constants import NO_ANSWER
+
+# metrics.py and llm_pool.py are shared by the example servers
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "server_common"))
+
+import metrics
+
+# Set WARMUP=0 to skip preloading in setup (e.g. to measure its benefit
+# with startup_benchmark.py); WARMUP_LLM=1 also makes a 1-token LLM call in
+# setup, so the connection to the LLM API is open before the first request.
+WARMUP = os.environ.get("WARMUP", "1") == "1"
+WARMUP_LLM = os.environ.get("WARMUP_LLM", "0") == "1"
+# the input file is sent to the LLM in pieces of about this many characters
+FILE_CHUNK_CHARS = 8_000
+# cog owns the HTTP server, so /metrics is served on a port of its own
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+
 
 class Server:
     def setup(self) -> None:
         """Set up any required state or preprocessing for more efficient start"""
 
+        start = time.perf_counter()
         self.file = None
         llm_config = lm.OpenAIGPTConfig(
             chat_model=lm.OpenAIChatModel.GPT4_TURBO,
@@ -22,7 +47,48 @@ class Server:
         )
 
         self.agent = agent
+        if METRICS_PORT:
+            metrics.serve_in_thread(METRICS_PORT)
+        if WARMUP:
+            self.warmup()
+        self.setup_seconds = time.perf_counter() - start
 
+    def warmup(self) -> None:
+        """Do now the one-time work the first request would otherwise pay for."""
+        # builds the system message with any tool instructions/schemas
+        self.agent.init_message_history()
+        # loads the tokenizer and model info
+        self.agent.chat_num_tokens()
+        if WARMUP_LLM:
+            # opens (and keeps alive) the connection to the LLM API
+            self.agent.llm.chat("Say OK", max_tokens=1)
+
+    def file_chunks(self, file: Path):
+        """
+        Lazily yield (chunk, lines-so-far) for the file, a piece of about
+        FILE_CHUNK_CHARS characters at a time, without reading it all in.
+        """
+        n_lines = 0
+        chunk = []
+        size = 0
+        with open(file, "r") as f:
+            for line in f:
+                n_lines += 1
+                chunk.append(line)
+                size += len(line)
+                if size >= FILE_CHUNK_CHARS:
+                    yield "".join(chunk), n_lines
+                    chunk = []
+                    size = 0
+        yield "".join(chunk), n_lines
+
+    def ask(self, message: str):
+        """LLM response that leaves the agent's history as it was, timed."""
+        start = time.perf_counter()
+        response = self.agent.llm_response_forget(message)
+        metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - start)
+        metrics.observe_response(response)
+        return response
 
     # function that will be used to serve the API calls
     def serve(
@@ -32,13 +98,25 @@ class Server:
     ) -> str:
         """Extract requirements"""
 
-        # count how many lines in file
-        with open(file, "r") as f:
-            lines = f.readlines()
-            n_lines = len(lines)
+        with metrics.track_request("serve"):
+            return self.extract(query, file)
+
+    def extract(self, query: str, file: Path) -> str:
+        n_lines = 0
+        answers = []
+        for chunk, n_lines in self.file_chunks(file):
+            if not chunk.strip():
+                continue
+            # each piece is answered without adding to the agent's history
+            response = self.ask(f"{query}\n\nUse this part of the file:\n\n{chunk}")
+            if response is not None:
+                answers.append(response.content)
 
-        response = self.agent.llm_response(query)
+        if not answers:
+            response = self.ask(query)
+            answers.append(response.content if response is not None else NO_ANSWER)
+        answer = "\n\n".join(answers)
         return f"""
         {n_lines}
-        {response.content}
+        {answer}
         """
@@ -0,0 +1,74 @@
+"""
+Cold-start vs. warm request latency for the cog predictor in server-simple.py.
+
+Times setup(), the first request (cold) and the following requests (warm),
+in-process, so no cog container is needed. Run it against a local mock LLM
+(see ../cloud/mock_openai.py) to leave out real API latency:
+
+OPENAI_API_BASE=http://localhost:9000/v1 OPENAI_API_KEY=xxx \\
+    python3 startup_benchmark.py --file query.txt
+
+and with WARMUP=0 to see what the preloading in setup() saves.
+"""
+import importlib.util
+import os
+import statistics
+import time
+
+import typer
+from rich import print
+from rich.table import Table
+
+app = typer.Typer()
+
+
+def load_server_class():
+    path = os.path.join(os.path.dirname(__file__), "server-simple.py")
+    spec = importlib.util.spec_from_file_location("server_simple", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Server
+
+
+@app.command()
+def main(
+    file: str = typer.Option(..., "--file", "-f", help="input file for serve()"),
+    query: str = typer.Option(
+        "List the requirements.", "--query", "-q", help="query for serve()"
+    ),
+    n: int = typer.Option(5, "--requests", "-n", help="warm requests to time"),
+) -> None:
+    start = time.perf_counter()
+    Server = load_server_class()
+    import_seconds = time.perf_counter() - start
+
+    server = Server()
+    start = time.perf_counter()
+    server.setup()
+    setup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    server.serve(query=query, file=file)
+    cold_seconds = time.perf_counter() - start
+
+    warm = []
+    for _ in range(n):
+        start = time.perf_counter()
+        server.serve(query=query, file=file)
+        warm.append(time.perf_counter() - start)
+
+    table = Table(title=f"cog predictor startup (WARMUP={os.environ.get('WARMUP', '1')})")
+    table.add_column("phase")
+    table.add_column("seconds", justify="right")
+    table.add_row("import", f"{import_seconds:.3f}")
+    table.add_row("setup()", f"{setup_seconds:.3f}")
+    table.add_row("first request (cold)", f"{cold_seconds:.3f}")
+    table.add_row(f"warm request (median of {n})", f"{statistics.median(warm):.3f}")
+    table.add_row(
+        "time to first response", f"{import_seconds + setup_seconds + cold_seconds:.3f}"
+    )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
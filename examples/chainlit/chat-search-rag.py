@@ -31,10 +31,6 @@ from langroid.agent.callbacks.chainlit import (
     update_llm,
 )
 from langroid.agent.chat_agent import ChatAgent, ChatDocument
-from langroid.agent.special.doc_chat_agent import (
-    DocChatAgent,
-    DocChatAgentConfig,
-)
 from langroid.agent.task import Task
 from langroid.agent.tool_message import ToolMessage
 from langroid.agent.tools.orchestration import ForwardTool
@@ -43,6 +39,13 @@ from langroid.parsing.web_search import metaphor_search
 from langroid.utils.configuration import Settings, set_global
 from langroid.utils.constants import NO_ANSWER
 
+from examples.docqa.retrieval_cache import (
+    CachingDocChatAgent,
+    CachingDocChatAgentConfig,
+)
+from examples.docqa.page_cache import PageCache
+from examples.docqa.web_fetch import fetch_and_ingest_async
+
 logger = logging.getLogger(__name__)
 
 app = typer.Typer()
@@ -92,9 +95,14 @@ class RelevantSearchExtractsTool(ToolMessage):
         """
 
 
-class SearchDocChatAgent(DocChatAgent):
+class SearchDocChatAgent(CachingDocChatAgent):
     tried_vecdb: bool = False
 
+    def __init__(self, config: CachingDocChatAgentConfig):
+        super().__init__(config)
+        # pages from earlier searches, also across sessions
+        self.page_cache = PageCache()
+
     def llm_response_async(
         self,
         message: None | str | ChatDocument = None,
@@ -120,7 +128,9 @@ class SearchDocChatAgent(DocChatAgent):
             """
         return "\n".join(str(e) for e in extracts)
 
-    def relevant_search_extracts(self, msg: RelevantSearchExtractsTool) -> str:
+    async def relevant_search_extracts_async(
+        self, msg: RelevantSearchExtractsTool
+    ) -> str:
         """Get docs/extracts relevant to the query, from a web search"""
         if not self.tried_vecdb and len(self.original_docs) > 0:
             return "Please try the `relevant_extracts` tool, before using this tool"
@@ -129,8 +139,14 @@ class SearchDocChatAgent(DocChatAgent):
         self.callbacks.show_start_response(entity="agent")
         results = metaphor_search(query, num_results)
         links = [r.link for r in results]
-        self.config.doc_paths = links
-        self.ingest()
+        # ingest pages as they arrive, stop when there is enough to answer
+        await fetch_and_ingest_async(
+            self,
+            links,
+            query=query,
+            enough_chunks=2 * self.config.n_relevant_chunks,
+            cache=self.page_cache,
+        )
         _, extracts = self.get_relevant_extracts(query)
         if len(extracts) == 0:
             return """
@@ -155,7 +171,7 @@ async def setup_agent_task():
         )
     )
 
-    config = DocChatAgentConfig(
+    config = CachingDocChatAgentConfig(
         name="Searcher",
         llm=llm_config,
         n_similar_chunks=3,
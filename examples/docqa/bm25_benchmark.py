@@ -0,0 +1,160 @@
+"""
+BM25 index build time and query latency of bm25_index.py vs. DocChatAgent's
+own BM25 search, as the corpus grows.
+
+Chunks are 20-200 words cut from the example text files; queries are 2-6
+consecutive words from the same text. For each corpus size:
+
+- build: langroid preprocesses every chunk (what `setup_documents` does on
+  every ingestion, for the whole collection); the index tokenizes and writes
+  them as a segment;
+- add 1%: time for the index to take 1% more chunks as a new segment;
+- query: `find_closest_matches_with_bm25` (a `BM25Okapi` model built over the
+  corpus per query) vs. `Bm25Index.search`, and how many of langroid's top-k
+  matches the index returns in the same order;
+- disk: size of the saved index.
+
+python3 -m examples.docqa.bm25_benchmark --sizes 1000,10000,50000
+"""
+
+import glob
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.mytypes import DocMetaData, Document
+from langroid.parsing.search import find_closest_matches_with_bm25, preprocess_text
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.bm25_index import Bm25Index
+
+app = typer.Typer()
+
+
+def load_words() -> List[str]:
+    words: List[str] = []
+    for path in sorted(glob.glob("examples/docqa/*.txt")):
+        with open(path) as f:
+            words += f.read().split()
+    return words
+
+
+def make_chunks(words: List[str], n: int, seed: int) -> List[Document]:
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(n):
+        size = rng.randint(20, 200)
+        start = rng.randrange(len(words) - size)
+        chunks.append(
+            Document(
+                content=" ".join(words[start : start + size]),
+                metadata=DocMetaData(id=f"{seed}-{i}", is_chunk=True),
+            )
+        )
+    return chunks
+
+
+def disk_mb(directory: str) -> float:
+    return (
+        sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(directory)
+            for f in files
+        )
+        / 1e6
+    )
+
+
+@app.command()
+def main(
+    sizes: str = typer.Option(
+        "1000,10000,50000", "--sizes", "-s", help="comma-separated corpus sizes"
+    ),
+    n_queries: int = typer.Option(200, "--queries", "-q", help="index queries"),
+    n_stock_queries: int = typer.Option(
+        10, "--stock-queries", help="langroid queries (slow on large corpora)"
+    ),
+    k: int = typer.Option(15, "--k", "-k", help="matches per query"),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    words = load_words()
+    rng = random.Random(1)
+    queries = []
+    for _ in range(n_queries):
+        start = rng.randrange(len(words) - 6)
+        queries.append(" ".join(words[start : start + rng.randint(2, 6)]))
+    preprocess_text("warm up nltk")
+
+    table = Table(title=f"BM25, top {k}")
+    for col in [
+        "chunks",
+        "build: langroid s",
+        "index s",
+        "add 1%: index s",
+        "query: langroid ms",
+        "index ms",
+        "same top-k",
+        "disk MB",
+    ]:
+        table.add_column(col, justify="right")
+
+    for n in [int(s) for s in sizes.split(",")]:
+        chunks = make_chunks(words, n, seed=0)
+        start = time.perf_counter()
+        clean = [
+            Document(content=preprocess_text(c.content), metadata=c.metadata)
+            for c in chunks
+        ]
+        stock_build = time.perf_counter() - start
+
+        directory = tempfile.mkdtemp(prefix="bm25-bench-")
+        index = Bm25Index(directory)
+        start = time.perf_counter()
+        index.add(chunks)
+        index_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.add(make_chunks(words, max(1, n // 100), seed=1))
+        index_add = time.perf_counter() - start
+        index.discard([f"1-{i}" for i in range(max(1, n // 100))])
+
+        start = time.perf_counter()
+        stock = [
+            [
+                (d.id(), round(s, 6))
+                for d, s in find_closest_matches_with_bm25(chunks, clean, q, k=k)
+                if s > 0
+            ]
+            for q in queries[:n_stock_queries]
+        ]
+        stock_ms = 1000 * (time.perf_counter() - start) / len(stock)
+
+        start = time.perf_counter()
+        results = [index.search(q, k) for q in queries]
+        index_ms = 1000 * (time.perf_counter() - start) / len(queries)
+        same = sum(
+            [(id, round(s, 6)) for id, s in r] == ref
+            for r, ref in zip(results, stock)
+        )
+
+        table.add_row(
+            f"{n:,}",
+            f"{stock_build:.2f}",
+            f"{index_build:.2f}",
+            f"{index_add:.3f}",
+            f"{stock_ms:.1f}",
+            f"{index_ms:.2f}",
+            f"{same}/{len(stock)}",
+            f"{disk_mb(directory):.1f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
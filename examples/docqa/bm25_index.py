@@ -0,0 +1,484 @@
+"""
+BM25 search over a persisted inverted index, for hybrid (BM25 + vector)
+retrieval with any vector store.
+
+DocChatAgent's BM25 search (`use_bm25_search`) keeps a preprocessed copy of
+every chunk in memory (`chunked_docs_clean`), recomputed for the whole
+collection on every ingestion, and for each query builds a fresh `BM25Okapi`
+model over all of it, so both ingestion and queries get slower with the size
+of the collection. Only LanceDB has a full-text index of its own.
+
+`Bm25DocChatAgent` instead keeps a `Bm25Index` per collection, saved under
+`.langroid-bm25/` by default:
+
+- the vocabulary, and immutable segments of postings: for each term, the rows
+  of the chunks it occurs in and its count in each, as numpy arrays (CSR
+  layout), memory-mapped when loaded;
+- ingestion tokenizes only the new chunks and writes them as a new segment;
+  segments are merged, and deleted chunks dropped, once there are more than
+  `MAX_SEGMENTS` of them or a quarter of the rows are deleted;
+- a query reads only the postings of its terms.
+
+Tokens and scores are those of langroid's BM25 (`preprocess_text`, then
+`BM25Okapi`'s formula and idf floor), so the ranking is the same; the
+candidates are fused with the vector results by reciprocal rank fusion, which
+`Bm25DocChatAgentConfig` turns on.
+"""
+
+import json
+import os
+import re
+import shutil
+from functools import cache, lru_cache
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
+from langroid.mytypes import Document
+from langroid.parsing.utils import download_nltk_resource
+from langroid.vector_store.base import VectorStore
+
+from examples.docqa.chunk_store import IndexedDocChatAgent
+
+BM25_DIR = ".langroid-bm25"
+MAX_SEGMENTS = 8
+K1, B, EPSILON = 1.5, 0.75, 0.25  # BM25Okapi defaults
+
+WORD = re.compile(r"\w+")
+
+
+@cache
+def _stopwords() -> Set[str]:
+    for resource in ["tokenizers/punkt", "corpora/wordnet", "corpora/stopwords"]:
+        download_nltk_resource(resource)
+    from nltk.corpus import stopwords
+
+    return set(stopwords.words("english"))
+
+
+@cache
+def _lemmatizer():  # type: ignore
+    from nltk.stem import WordNetLemmatizer
+
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=200_000)
+def _lemma(word: str) -> str:
+    return _lemmatizer().lemmatize(word)  # type: ignore
+
+
+def tokenize(text: str) -> List[str]:
+    """The tokens of langroid's `preprocess_text(text)`, with NLTK loaded once."""
+    stop = _stopwords()
+    return [_lemma(w) for w in WORD.findall(text.lower()) if w not in stop]
+
+
+class Segment:
+    """Postings of a batch of chunks: rows of `terms[i]` are
+    `rows[offsets[i] : offsets[i + 1]]`, with counts `tfs[...]`."""
+
+    FILES = ["terms", "offsets", "rows", "tfs", "doc_len"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        arrays = {
+            f: np.load(os.path.join(path, f + ".npy"), mmap_mode="r")
+            for f in self.FILES
+        }
+        self.terms = arrays["terms"]  # term ids, sorted
+        self.offsets = arrays["offsets"]
+        self.rows = arrays["rows"]
+        self.tfs = arrays["tfs"]
+        self.doc_len = np.asarray(arrays["doc_len"])
+        with open(os.path.join(path, "ids.txt")) as f:
+            self.ids = f.read().splitlines()
+
+    @staticmethod
+    def write(
+        path: str,
+        ids: Sequence[str],
+        doc_len: np.ndarray,
+        terms: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+    ) -> "Segment":
+        """Write postings given as (term, row, count) triples."""
+        order = np.lexsort((rows, terms))
+        terms, rows, tfs = terms[order], rows[order], tfs[order]
+        unique, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        for stale in [path, path + ".tmp"]:  # left by an interrupted update
+            shutil.rmtree(stale, ignore_errors=True)
+        os.makedirs(path + ".tmp")
+        arrays = dict(
+            terms=unique.astype(np.int32),
+            offsets=offsets,
+            rows=rows.astype(np.int32),
+            tfs=np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_len=doc_len.astype(np.int32),
+        )
+        for name, array in arrays.items():
+            np.save(os.path.join(path + ".tmp", name + ".npy"), array)
+        with open(os.path.join(path + ".tmp", "ids.txt"), "w") as f:
+            f.writelines(i + "\n" for i in ids)
+        os.replace(path + ".tmp", path)
+        return Segment(path)
+
+    def postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return self.rows[:0], self.tfs[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+    def triples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        terms = np.repeat(np.asarray(self.terms), np.diff(self.offsets))
+        return terms, np.asarray(self.rows), np.asarray(self.tfs)
+
+
+class Bm25Index:
+    """
+    Inverted index of the chunks of one collection. Rows number the chunks
+    across segments in the order they were added; `manifest.json` lists the
+    live segments and deleted rows, and is replaced last on every change, so
+    an interrupted update leaves the previous index in place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.terms_path = os.path.join(directory, "terms.txt")
+        self.version = 0  # bumped on every change
+        self._load()
+
+    @staticmethod
+    def for_vecdb(vecdb: VectorStore, directory: str = BM25_DIR) -> str:
+        name = f"{type(vecdb).__name__.lower()}-{vecdb.config.collection_name}"
+        return os.path.join(directory, name)
+
+    def _load(self) -> None:
+        manifest = dict(segments=[], deleted=[], n_terms=0, next_segment=0)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        self.next_segment: int = manifest["next_segment"]
+        self.vocab: List[str] = []
+        if os.path.exists(self.terms_path):
+            with open(self.terms_path) as f:
+                self.vocab = f.read().splitlines()
+        if len(self.vocab) > manifest["n_terms"]:  # terms of an unfinished add
+            self.vocab = self.vocab[: manifest["n_terms"]]
+            self._write_terms(self.vocab, mode="w")
+        self.term_id = {t: i for i, t in enumerate(self.vocab)}
+        self.segments = [
+            Segment(os.path.join(self.directory, name))
+            for name in manifest["segments"]
+        ]
+        self.ids = [id for s in self.segments for id in s.ids]
+        self.row_of = {id: row for row, id in enumerate(self.ids)}
+        self.doc_len = np.concatenate(
+            [s.doc_len for s in self.segments] + [np.empty(0, np.int32)]
+        )
+        self.deleted = np.zeros(len(self.ids), dtype=bool)
+        self.deleted[manifest["deleted"]] = True
+        self.df = self._count_terms(~self.deleted)
+        self._update_stats()
+
+    def _count_terms(self, rows: np.ndarray) -> np.ndarray:
+        """Number of the given rows (a boolean mask) that contain each term."""
+        df = np.zeros(len(self.vocab), dtype=np.int64)
+        for s in self.segments:
+            terms, segment_rows, _ = s.triples()
+            df += np.bincount(terms[rows[segment_rows]], minlength=len(df))
+        return df
+
+    def _update_stats(self) -> None:
+        """Idf of every term and average length, over the live rows."""
+        df = self.df
+        self.n_docs = int((~self.deleted).sum())
+        self.avgdl = float(self.doc_len[~self.deleted].sum()) / max(self.n_docs, 1)
+        # as BM25Okapi: idf of terms in over half the docs is floored at
+        # EPSILON times the average idf of the terms that occur at all
+        present = df > 0
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5)
+        average = float(idf[present].mean()) if present.any() else 0.0
+        idf[present & (idf < 0)] = EPSILON * average
+        idf[~present] = 0.0
+        self.idf = idf
+        self.version += 1
+
+    def _write_terms(self, terms: Sequence[str], mode: str = "a") -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.terms_path, mode) as f:
+            f.writelines(t + "\n" for t in terms)
+
+    def _save(self) -> None:
+        manifest = dict(
+            segments=[s.name for s in self.segments],
+            deleted=np.flatnonzero(self.deleted).tolist(),
+            n_terms=len(self.vocab),
+            next_segment=self.next_segment,
+        )
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        live = {s.name for s in self.segments}
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name not in live:
+                shutil.rmtree(os.path.join(self.directory, name))
+        self._update_stats()
+
+    def _new_segment_path(self) -> str:
+        self.next_segment += 1
+        return os.path.join(self.directory, f"segment-{self.next_segment:06d}")
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def __contains__(self, id: str) -> bool:
+        row = self.row_of.get(id)
+        return row is not None and not self.deleted[row]
+
+    def add(self, docs: Sequence[Document]) -> None:
+        """Index the docs not indexed yet, as a new segment."""
+        seen = set()
+        new = []
+        for d in docs:
+            if d.id() not in self and d.id() not in seen:  # re-added if deleted
+                seen.add(d.id())
+                new.append(d)
+        if len(new) == 0:
+            return
+        new_terms: List[str] = []
+        doc_terms = []
+        for d in new:
+            ids = []
+            for token in tokenize(d.content):
+                if token not in self.term_id:
+                    self.term_id[token] = len(self.vocab)
+                    self.vocab.append(token)
+                    new_terms.append(token)
+                ids.append(self.term_id[token])
+            doc_terms.append(ids)
+        doc_len = np.array([len(t) for t in doc_terms], dtype=np.int64)
+        first = len(self.ids)
+        rows = np.repeat(np.arange(first, first + len(new)), doc_len)
+        terms = np.fromiter((t for ts in doc_terms for t in ts), np.int64, len(rows))
+        # one (term, row) key per posting, counted
+        keys, tfs = np.unique(rows * len(self.vocab) + terms, return_counts=True)
+        self._write_terms(new_terms)
+        segment = Segment.write(
+            self._new_segment_path(),
+            [d.id() for d in new],
+            doc_len,
+            keys % len(self.vocab),
+            keys // len(self.vocab),
+            tfs,
+        )
+        self.segments.append(segment)
+        for row, d in enumerate(new, start=first):
+            self.row_of[d.id()] = row
+            self.ids.append(d.id())
+        self.doc_len = np.concatenate([self.doc_len, segment.doc_len])
+        self.df = np.append(self.df, np.zeros(len(new_terms), dtype=np.int64))
+        self.df += np.bincount(keys % len(self.vocab), minlength=len(self.vocab))
+        self.deleted = np.append(self.deleted, np.zeros(len(new), dtype=bool))
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+        else:
+            self._save()
+
+    def discard(self, ids: Sequence[str]) -> None:
+        """Drop chunks, e.g. deleted from the collection."""
+        rows = [self.row_of[i] for i in ids if i in self.row_of]
+        rows = [r for r in rows if not self.deleted[r]]
+        if len(rows) == 0:
+            return
+        dropped = np.zeros(len(self.ids), dtype=bool)
+        dropped[rows] = True
+        self.df -= self._count_terms(dropped)
+        self.deleted |= dropped
+        if self.deleted.sum() > len(self.deleted) / 4:
+            self.compact()
+        else:
+            self._save()
+
+    def compact(self) -> None:
+        """Merge all segments into one, without the deleted rows."""
+        if len(self.segments) == 0:
+            return
+        keep = ~self.deleted
+        new_row = np.full(len(self.ids), -1, dtype=np.int64)
+        new_row[keep] = np.arange(int(keep.sum()))
+        triples = [s.triples() for s in self.segments]
+        terms, rows, tfs = (np.concatenate(a) for a in zip(*triples))
+        live = keep[rows]
+        ids = [id for id, k in zip(self.ids, keep) if k]
+        segment = Segment.write(
+            self._new_segment_path(),
+            ids,
+            self.doc_len[keep],
+            terms[live],
+            new_row[rows[live]],
+            tfs[live],
+        )
+        self.segments = [segment]
+        self.ids = ids
+        self.row_of = {id: row for row, id in enumerate(ids)}
+        self.doc_len = segment.doc_len
+        self.deleted = np.zeros(len(ids), dtype=bool)
+        self._save()
+
+    def clear(self) -> None:
+        self.segments = []
+        self.ids, self.row_of = [], {}
+        self.vocab, self.term_id = [], {}
+        self.df = self.df[:0]
+        self.doc_len = self.doc_len[:0]
+        self.deleted = self.deleted[:0]
+        self._write_terms([], mode="w")
+        self._save()
+
+    def mask(self, ids: Sequence[str]) -> np.ndarray:
+        """Rows of the given ids, as a boolean mask."""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[[self.row_of[i] for i in ids if i in self.row_of]] = True
+        return mask
+
+    def search(
+        self, query: str, k: int, mask: np.ndarray | None = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Ids and BM25 scores of the (at most) k best chunks containing any term
+        of the query, best first; only rows in `mask`, if given.
+        """
+        terms = [self.term_id[t] for t in tokenize(query) if t in self.term_id]
+        rows_list, weights_list = [], []
+        for term in terms:  # a repeated term counts again, as in BM25Okapi
+            for s in self.segments:
+                rows, tfs = s.postings(term)
+                if len(rows) == 0:
+                    continue
+                tf = tfs.astype(np.float64)
+                norm = K1 * (1 - B + B * self.doc_len[rows] / self.avgdl)
+                rows_list.append(rows)
+                weights_list.append(self.idf[term] * tf * (K1 + 1) / (tf + norm))
+        if len(rows_list) == 0:
+            return []
+        rows, inverse = np.unique(np.concatenate(rows_list), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights_list))
+        keep = ~self.deleted[rows]
+        if mask is not None:
+            keep &= mask[rows]
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            # keep everything tied with the k-th best, ordered below
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            top = scores >= kth - 1e-9
+            rows, scores = rows[top], scores[top]
+        # ties (up to rounding) in order of ingestion
+        order = np.lexsort((rows, -np.round(scores, 9)))
+        return [(self.ids[rows[i]], float(scores[i])) for i in order[:k]]
+
+
+class Bm25DocChatAgentConfig(DocChatAgentConfig):
+    bm25_index_dir: str = BM25_DIR  # one index per collection in here
+    use_bm25_search: bool = True
+    # fuzzy matching scans every chunk, and needs all of them preprocessed
+    use_fuzzy_match: bool = False
+    use_reciprocal_rank_fusion: bool = True  # fuse BM25 and vector results
+
+
+class Bm25DocChatAgent(IndexedDocChatAgent):
+    def __init__(self, config: Bm25DocChatAgentConfig):
+        # set before DocChatAgent.__init__, which may ingest docs
+        self._bm25_index: Bm25Index | None = None
+        # a replaced collection starts with an empty index
+        self._replace_bm25 = config.vecdb is not None and (
+            config.vecdb.replace_collection
+        )
+        # ids of the chunks lexical search is limited to, when filtered
+        self._bm25_ids: List[str] | None = None
+        self._bm25_mask: Tuple[int, np.ndarray | None] = (-1, None)
+        self._chunk_map: Tuple[int, int, Dict[str, Document]] = (0, 0, {})
+        super().__init__(config)
+        self.config: Bm25DocChatAgentConfig = config
+
+    @property
+    def bm25_index(self) -> Bm25Index:
+        """The index of the current collection (the agent may switch them)."""
+        if self.vecdb is None:
+            raise ValueError("VecDB not set")
+        directory = Bm25Index.for_vecdb(self.vecdb, self.config.bm25_index_dir)
+        if self._bm25_index is None or self._bm25_index.directory != directory:
+            self._bm25_index = Bm25Index(directory)
+            if self._replace_bm25:
+                self._bm25_index.clear()
+                self._replace_bm25 = False
+        return self._bm25_index
+
+    def setup_documents(
+        self,
+        docs: List[Document] = [],
+        filter: str | None = None,
+    ) -> None:
+        # called with the chunks after every ingestion
+        if self.vecdb is None or self.config.use_fuzzy_match:
+            # fuzzy matching still needs DocChatAgent's `chunked_docs_clean`
+            super().setup_documents(docs, filter=filter)
+        elif filter is None and len(docs) > 0:
+            self.chunked_docs.extend(docs)
+        else:
+            self.chunked_docs = self.vecdb.get_all_documents(where=filter or "")
+        if self.vecdb is None:
+            return
+        # chunks ingested before the index existed are added on first use
+        self.bm25_index.add(docs if len(docs) > 0 else self.chunked_docs)
+        if filter is not None:
+            self._bm25_ids = [d.id() for d in self.chunked_docs]
+        elif len(docs) == 0:
+            self._bm25_ids = None
+        elif self._bm25_ids is not None:
+            self._bm25_ids += [d.id() for d in docs]
+
+    def clear(self) -> None:
+        if self.vecdb is not None:
+            self.bm25_index.clear()
+        self._bm25_ids = None
+        super().clear()
+
+    def on_chunks_deleted(self, ids: Sequence[str]) -> None:
+        if self.vecdb is not None:
+            self.bm25_index.discard(ids)
+        super().on_chunks_deleted(ids)
+
+    def _chunks_by_id(self) -> Dict[str, Document]:
+        """Id -> chunk, for the chunks held in `self.chunked_docs`."""
+        n, list_id, chunks = self._chunk_map
+        if n != len(self.chunked_docs) or list_id != id(self.chunked_docs):
+            chunks = {d.id(): d for d in self.chunked_docs}
+            self._chunk_map = (len(self.chunked_docs), id(self.chunked_docs), chunks)
+        return chunks
+
+    def get_similar_chunks_bm25(
+        self, query: str, multiple: int
+    ) -> List[Tuple[Document, float]]:
+        if self.vecdb is None:
+            return super().get_similar_chunks_bm25(query, multiple)
+        index = self.bm25_index
+        version, mask = self._bm25_mask
+        if self._bm25_ids is None:
+            mask = None
+        elif version != index.version or mask is None:
+            mask = index.mask(self._bm25_ids)
+            self._bm25_mask = (index.version, mask)
+        hits = index.search(query, self.config.n_similar_chunks * multiple, mask)
+        in_memory = self._chunks_by_id()
+        chunks = {id: in_memory[id] for id, _ in hits if id in in_memory}
+        missing = [id for id, _ in hits if id not in chunks]
+        if len(missing) > 0:
+            chunks.update({d.id(): d for d in self.vecdb.get_documents_by_ids(missing)})
+        return [(chunks[id], score) for id, score in hits if id in chunks]
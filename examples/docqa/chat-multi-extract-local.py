@@ -43,7 +43,6 @@ from rich import print
 import langroid.language_models as lm
 from langroid.agent import ChatDocument
 from langroid.agent.chat_agent import ChatAgent, ChatAgentConfig
-from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
 from langroid.agent.task import Task
 from langroid.agent.tool_message import ToolMessage
 from langroid.language_models.openai_gpt import OpenAIGPTConfig
@@ -54,6 +53,8 @@ from langroid.utils.configuration import Settings, set_global
 from langroid.utils.constants import DONE, NO_ANSWER
 from langroid.utils.pydantic_utils import get_field_names
 
+from examples.docqa.rerank import RerankingDocChatAgent, RerankingDocChatAgentConfig
+
 app = typer.Typer()
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -125,7 +126,7 @@ class QuestionGeneratorAgent(ChatAgent):
             return DONE + json.dumps(msg.questions)
 
 
-class MyDocChatAgent(DocChatAgent):
+class MyDocChatAgent(RerankingDocChatAgent):
     def llm_response(
         self,
         message: None | str | ChatDocument = None,
@@ -244,7 +245,7 @@ def main(
 
     # (2) RAG AGENT: try to answer a given question based on documents
     doc_agent = MyDocChatAgent(
-        DocChatAgentConfig(
+        RerankingDocChatAgentConfig(
             llm=llm_cfg,
             assistant_mode=True,
             n_neighbor_chunks=2,
@@ -255,7 +256,9 @@ def main(
                 overlap=30,
                 n_neighbor_ids=4,
             ),
-            cross_encoder_reranking_model="",
+            # cross-encoder reranking runs off-thread and cached; when it takes
+            # longer than this many seconds, chunks keep their retrieval order
+            rerank_budget=1.0,
         )
     )
     doc_agent.vecdb.set_collection("docqa-chat-multi-extract", replace=True)
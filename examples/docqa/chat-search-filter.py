@@ -23,7 +23,6 @@ Optional args:
 https://langroid.github.io/langroid/tutorials/local-llm-setup/
 """
 
-import json
 import re
 from typing import Any, List
 
@@ -34,10 +33,6 @@ from rich.prompt import Prompt
 import langroid as lr
 import langroid.language_models as lm
 from langroid.agent.chat_agent import ChatAgent, ChatDocument
-from langroid.agent.special.doc_chat_agent import (
-    DocChatAgent,
-    DocChatAgentConfig,
-)
 from langroid.agent.task import Task
 from langroid.agent.tool_message import ToolMessage
 from langroid.agent.tools.orchestration import ForwardTool
@@ -46,6 +41,16 @@ from langroid.parsing.web_search import metaphor_search
 from langroid.pydantic_v1 import Field
 from langroid.utils.configuration import Settings, set_global
 from langroid.utils.constants import NO_ANSWER
+from langroid.vector_store.base import VectorStore
+
+from examples.docqa.dedup import DedupDocChatAgent, DedupDocChatAgentConfig
+from examples.docqa.metadata_filter import F, all_of, compile_for
+from examples.docqa.retrieval_cache import (
+    CachingDocChatAgent,
+    CachingDocChatAgentConfig,
+)
+from examples.docqa.page_cache import PageCache
+from examples.docqa.web_fetch import can_fetch, fetch_and_ingest, load_urls
 
 
 class RelevantExtractsTool(ToolMessage):
@@ -115,26 +120,36 @@ class RelevantSearchExtractsTool(ToolMessage):
         """
 
 
-def tags_to_filter(tags: List[str]) -> str | None:
+def tags_to_filter(tags: List[str], vecdb: VectorStore | None) -> str | None:
     """
-    Given a list of tags, create a qdrant-db filter condition expressing:
+    Given a list of tags, create a filter condition expressing:
     EVERY tag MUST appear in the metadata.tags field of the document.
     Args:
         tags: List of tags to filter by
+        vecdb: the vector store the filter is for (its syntax is used)
     Returns:
-        json string of the qdrant filter condition, or None
+        filter string in the syntax of the vecdb, or None
     """
     if len(tags) == 0:
         return None
-    match_conditions = [
-        {"key": "metadata.tags", "match": {"any": [tag]}} for tag in tags
-    ]
+    return compile_for(vecdb, all_of([F("metadata.tags").has(tag) for tag in tags]))
+
 
-    filter = {"must": match_conditions}
-    return json.dumps(filter)
+class SearchDocChatAgentConfig(DedupDocChatAgentConfig, CachingDocChatAgentConfig):
+    pass
 
 
-class SearchDocChatAgent(DocChatAgent):
+class SearchDocChatAgent(DedupDocChatAgent, CachingDocChatAgent):
+    """
+    Searches often return the same text (mirrors, syndicated articles, pages
+    seen in earlier searches): near-duplicate chunks are not ingested again,
+    but the chunk already stored gets their search tag too.
+    """
+
+    def __init__(self, config: SearchDocChatAgentConfig):
+        super().__init__(config)
+        # pages from earlier searches, also across sessions and resets
+        self.page_cache = PageCache()
 
     def init_state(self) -> None:
         super().init_state()
@@ -157,7 +172,7 @@ class SearchDocChatAgent(DocChatAgent):
         self.tried_vecdb = True
         query = msg.query
         if msg.filter_tag != "":
-            self.set_filter(tags_to_filter([msg.filter_tag]))
+            self.set_filter(tags_to_filter([msg.filter_tag], self.vecdb))
         _, extracts = self.get_relevant_extracts(query)
         if len(extracts) == 0:
             return """
@@ -183,9 +198,25 @@ class SearchDocChatAgent(DocChatAgent):
         else:
             results = metaphor_search(query, msg.num_results)
             links = [r.link for r in results]
-        self.ingest_doc_paths(links, metadata={"tags": [msg.tag]})
+        if can_fetch(self):
+            fetch_and_ingest(
+                self,
+                links,
+                query=query,
+                enough_chunks=2 * self.config.n_relevant_chunks,
+                metadata={"tags": [msg.tag]},
+                cache=self.page_cache,
+            )
+        else:
+            docs = load_urls(
+                links,
+                self.config.parsing,
+                self.config.crawler_config,
+                cache=self.page_cache,
+            )
+            self.ingest_docs(docs, metadata={"tags": [msg.tag]})
         if msg.tag != "":
-            self.set_filter(tags_to_filter([msg.tag]))
+            self.set_filter(tags_to_filter([msg.tag], self.vecdb))
         _, extracts = self.get_relevant_extracts(query)
         return "\n".join(str(e) for e in extracts)
 
@@ -235,7 +266,7 @@ def main(
         chat_context_length=2048,  # adjust based on model
     )
 
-    config = DocChatAgentConfig(
+    config = SearchDocChatAgentConfig(
         use_functions_api=fn_api,
         use_tools=not fn_api,
         llm=llm_config,
@@ -341,9 +372,14 @@ def main(
     print(f"[red]Using {collection_name}")
 
     agent.vecdb.set_collection(collection_name, replace=replace)
+    if replace:
+        agent.dedup_index.clear()
 
     task = Task(agent, interactive=False)
     task.run("Can you help me answer some questions, possibly using web search?")
+    print(f"[dim]Retrieval cache: {agent.retrieval_cache_stats()}")
+    print(f"[dim]Page cache: {agent.page_cache.stats()}")
+    print(f"[dim]Duplicate chunks: {agent.dedup_stats()}")
 
 
 if __name__ == "__main__":
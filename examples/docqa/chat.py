@@ -9,6 +9,10 @@ python3 examples/docqa/chat.py url-or-file-orfolder-path
 (or run with no arguments to go through the dialog).
 
 If a document-arg is provided, it will be ingested into the vector database.
+Re-running with the same document-arg only ingests what changed since the last
+run (see ingest_manifest.py); use --reingest to ingest everything again.
+Embeddings are cached on disk (see embedding_cache.py), so re-embedding the
+same chunks is free; use --no-embed-cache to turn this off.
 
 To change the model, use the --model flag, e.g.:
 
@@ -25,6 +29,12 @@ python3 examples/docqa/chat.py --embed hf --embedconfig BAAI/bge-large-en-v1.5
 For Llama.cpp Server
 python3 examples/docqa/chat.py --embed llamacpp --embedconfig localhost:8000
 
+To keep the vector store in-process (no database service), use --vecdb numpy
+(see numpy_vecdb.py).
+
+Neighbor windows (n_neighbor_chunks) are resolved from an adjacency index kept
+next to the collection (see neighbor_index.py), not fetched per match.
+
 See here for how to set up a Local LLM to work with Langroid:
 https://langroid.github.io/langroid/tutorials/local-llm-setup/
 
@@ -37,13 +47,18 @@ from rich import print
 
 import langroid as lr
 import langroid.language_models as lm
-from langroid.agent.special.doc_chat_agent import (
-    DocChatAgent,
-    DocChatAgentConfig,
-)
 from langroid.parsing.parser import ParsingConfig, PdfParsingConfig, Splitter
 from langroid.utils.configuration import Settings, set_global
 
+from examples.docqa.embedding_cache import CachedEmbeddings
+from examples.docqa.ingest_manifest import ingest_incremental
+from examples.docqa.neighbor_index import (
+    NeighborDocChatAgent,
+    NeighborDocChatAgentConfig,
+)
+from examples.docqa.numpy_vecdb import NumpyVectorStore, NumpyVectorStoreConfig
+from examples.docqa.page_cache import PageCache
+
 app = typer.Typer()
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -59,6 +74,15 @@ def main(
         "qdrant", "--vecdb", "-v", help="vector db name (default: qdrant)"
     ),
     nostream: bool = typer.Option(False, "--nostream", "-ns", help="no streaming"),
+    reingest: bool = typer.Option(
+        False, "--reingest", "-ri", help="ingest the doc(s) even if unchanged"
+    ),
+    workers: int = typer.Option(
+        0, "--workers", "-w", help="processes for parsing docs (default: #cpus)"
+    ),
+    no_embed_cache: bool = typer.Option(
+        False, "--no-embed-cache", "-nec", help="don't cache embeddings on disk"
+    ),
     embed_provider: str = typer.Option(
         "openai",
         "--embed",
@@ -82,7 +106,7 @@ def main(
         timeout=60,
     )
 
-    config = DocChatAgentConfig(
+    config = NeighborDocChatAgentConfig(
         llm=llm_config,
         n_query_rephrases=0,
         full_citations=True,
@@ -165,6 +189,15 @@ def main(
             config.vecdb = lr.vector_store.PostgresDBConfig(
                 embedding=embed_cfg, cloud=True
             )
+        case "numpy":
+            config.vecdb = NumpyVectorStoreConfig(
+                collection_name="doc-chat-numpy",
+                storage_path=".numpy-vecdb/data",
+                embedding=embed_cfg,
+            )
+
+    if not no_embed_cache:
+        config.vecdb.embedding_model = CachedEmbeddings.from_config(embed_cfg)
 
     set_global(
         Settings(
@@ -174,12 +207,30 @@ def main(
         )
     )
 
-    agent = DocChatAgent(config)
+    vecdb_config = config.vecdb
+    if isinstance(vecdb_config, NumpyVectorStoreConfig):
+        # langroid's VectorStore.create does not know this store: attach it here
+        config.vecdb = None
+        agent = NeighborDocChatAgent(config)
+        agent.vecdb = NumpyVectorStore(vecdb_config)
+        config.vecdb = vecdb_config
+    else:
+        agent = NeighborDocChatAgent(config)
     print("[blue]Welcome to the document chatbot!")
 
     if doc:
-        # TODO - could save time by checking whether we've already ingested this doc(s)
-        agent.ingest_doc_paths([doc])
+        stats = ingest_incremental(
+            agent,
+            doc,
+            force=reingest,
+            workers=workers or None,
+            page_cache=PageCache(),
+        )
+        print(
+            f"[green]{stats['added']} new, {stats['updated']} changed, "
+            f"{stats['removed']} removed, {stats['unchanged']} unchanged docs; "
+            f"{stats['chunks']} chunks ingested in {stats['seconds']:.1f}s"
+        )
     else:
         agent.user_docs_ingest_dialog()
 
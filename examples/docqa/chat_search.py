@@ -35,10 +35,6 @@ from rich.prompt import Prompt
 import langroid as lr
 import langroid.language_models as lm
 from langroid.agent.chat_agent import ChatAgent, ChatDocument
-from langroid.agent.special.doc_chat_agent import (
-    DocChatAgent,
-    DocChatAgentConfig,
-)
 from langroid.agent.task import Task
 from langroid.agent.tool_message import ToolMessage
 from langroid.agent.tools.orchestration import ForwardTool
@@ -51,6 +47,13 @@ from langroid.parsing.web_search import exa_search
 from langroid.utils.configuration import Settings, set_global
 from langroid.utils.constants import NO_ANSWER
 
+from examples.docqa.retrieval_cache import (
+    CachingDocChatAgent,
+    CachingDocChatAgentConfig,
+)
+from examples.docqa.page_cache import PageCache
+from examples.docqa.web_fetch import can_fetch, fetch_and_ingest, load_urls
+
 logger = logging.getLogger(__name__)
 
 
@@ -94,14 +97,16 @@ class RelevantSearchExtractsTool(ToolMessage):
         """
 
 
-class SearchDocChatAgent(DocChatAgent):
+class SearchDocChatAgent(CachingDocChatAgent):
     tried_vecdb: bool = False
     crawler: Optional[str] = None
 
-    def __init__(self, config: DocChatAgentConfig, crawler: Optional[str] = None):
+    def __init__(self, config: CachingDocChatAgentConfig, crawler: Optional[str] = None):
         super().__init__(config)
         self.tried_vecdb = False
         self.crawler = crawler
+        # pages from earlier searches, also across sessions
+        self.page_cache = PageCache()
         self.update_crawler_config(crawler)
 
     def update_crawler_config(self, crawler: Optional[str]):
@@ -151,9 +156,28 @@ class SearchDocChatAgent(DocChatAgent):
         results = exa_search(query, num_results)
         links = [r.link for r in results]
         logger.warning(f"Found {len(links)} links, ingesting into vecdb...")
-        self.config.doc_paths = links
-        self.ingest()
-        logger.warning(f"Ingested {len(links)} links into vecdb")
+        if can_fetch(self):
+            # ingest pages as they arrive, stop when there is enough to answer
+            stats = fetch_and_ingest(
+                self,
+                links,
+                query=query,
+                enough_chunks=2 * self.config.n_relevant_chunks,
+                cache=self.page_cache,
+            )
+            logger.warning(
+                f"Ingested {stats['pages']} of {len(links)} links into vecdb "
+                f"in {stats['seconds']:.1f}s"
+            )
+        else:
+            docs = load_urls(
+                links,
+                self.config.parsing,
+                self.config.crawler_config,
+                cache=self.page_cache,
+            )
+            self.ingest_docs(docs)
+            logger.warning(f"Ingested {len(links)} links into vecdb")
         _, extracts = self.get_relevant_extracts(query)
         return "\n".join(str(e) for e in extracts)
 
@@ -227,7 +251,7 @@ def main(
         chat_context_length=8000,  # adjust based on model
     )
 
-    config = DocChatAgentConfig(
+    config = CachingDocChatAgentConfig(
         use_functions_api=fn_api,
         use_tools=not fn_api,
         llm=llm_config,
@@ -287,6 +311,8 @@ def main(
     task.run(
         "Can you help me answer some questions, possibly using web search and crawling?"
     )
+    print(f"[dim]Retrieval cache: {agent.retrieval_cache_stats()}")
+    print(f"[dim]Page cache: {agent.page_cache.stats()}")
 
 
 if __name__ == "__main__":
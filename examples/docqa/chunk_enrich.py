@@ -0,0 +1,296 @@
+"""
+Batched, concurrent and resumable chunk enrichment for a DocChatAgent.
+
+With a `chunk_enrichment_config`, `DocChatAgent.enrich_chunks` makes one LLM
+call per chunk, `batch_size` calls at a time (each group waiting for its
+slowest call), and keeps nothing: for thousands of chunks enrichment is most
+of the ingestion time and cost, and a failure half way starts it over.
+`EnrichingDocChatAgent` instead:
+
+- packs up to `chunks_per_request` chunks into one LLM request (one system
+  message for all of them) and asks for a JSON list with one answer per
+  chunk; a reply that does not parse as that list is retried as two requests
+  of half the size, down to single chunks, which are sent exactly as
+  langroid sends them;
+- keeps up to `batch_size` requests in flight, starting the next one as soon
+  as any finishes;
+- caches each chunk's enrichment on disk (under `.langroid-enrich/`), keyed
+  by a hash of the model, the system message and the chunk's prompt, i.e.
+  `enrichment_prompt_fn(chunk)`, so a changed prompt or chunk misses. Entries
+  are appended as each request completes: interrupted ingestion resumes
+  where it stopped, and re-ingesting unchanged chunks makes no LLM calls;
+- counts chunks, requests, tokens and cost: `enrichment_stats()`.
+
+Use `BatchEnrichmentConfig` as the `chunk_enrichment_config`; with a plain
+`ChunkEnrichmentAgentConfig` chunks are sent one per request.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Tuple
+
+from langroid.agent.special.doc_chat_agent import (
+    ChunkEnrichmentAgentConfig,
+    DocChatAgent,
+    DocChatAgentConfig,
+)
+from langroid.language_models.base import LanguageModel, LLMMessage, Role
+from langroid.mytypes import Document
+from langroid.utils.output import status
+
+logger = logging.getLogger(__name__)
+
+ENRICH_DIR = ".langroid-enrich"
+
+PACKED_PROMPT = """
+Below are {n} numbered requests. Answer each of them separately, exactly as
+you would if it were the only one.
+Reply with ONLY a JSON list of {n} strings, the i-th string being your answer
+to request i, and NOTHING else.
+
+{requests}
+"""
+
+
+class BatchEnrichmentConfig(ChunkEnrichmentAgentConfig):
+    batch_size: int = 8  # most LLM requests in flight at once
+    chunks_per_request: int = 8
+    cache_dir: str = ENRICH_DIR
+
+
+def enrichment_key(model: str, system_message: str, prompt: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in [model, system_message, prompt]:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def pack_prompts(prompts: List[str]) -> str:
+    """One user message asking for all of `prompts` at once."""
+    if len(prompts) == 1:
+        return prompts[0]
+    requests = "\n\n".join(
+        f"REQUEST {i + 1}:\n{p.strip()}" for i, p in enumerate(prompts)
+    )
+    return PACKED_PROMPT.format(n=len(prompts), requests=requests)
+
+
+def unpack_answers(reply: str, n: int) -> List[str] | None:
+    """The `n` answers in a reply to `pack_prompts`, or None if it has not."""
+    if n == 1:
+        return [reply]
+    match = re.search(r"\[.*\]", reply, re.DOTALL)
+    if match is None:
+        return None
+    try:
+        answers = json.loads(match.group())
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != n:
+        return None
+    return [
+        "\n".join(str(x) for x in a) if isinstance(a, list) else str(a)
+        for a in answers
+    ]
+
+
+class EnrichmentCache:
+    """Append-only JSON-lines file of enrichments, keyed by `enrichment_key`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.entries: Dict[str, str] = {}
+        good = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # cut short by a crash: dropped
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry["text"]
+                    good += len(line)
+            os.truncate(path, good)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> str | None:
+        return self.entries.get(key)
+
+    def add(self, entries: Dict[str, str]) -> None:
+        new = {k: v for k, v in entries.items() if k not in self.entries}
+        if len(new) == 0:
+            return
+        with open(self.path, "a") as f:
+            for k, v in new.items():
+                f.write(json.dumps(dict(key=k, text=v)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries.update(new)
+
+
+class ChunkEnricher:
+    """Enriches chunk texts as described above, for one enrichment config."""
+
+    def __init__(self, config: ChunkEnrichmentAgentConfig):
+        self.config = config
+        llm_config = config.llm.model_copy()  # type: ignore
+        llm_config.stream = False  # concurrent calls can't share the console
+        llm = LanguageModel.create(llm_config)
+        if llm is None:
+            raise ValueError("LLM not set")
+        self.llm = llm
+        self.model = llm_config.chat_model or type(llm).__name__
+        self.chunks_per_request = max(1, getattr(config, "chunks_per_request", 1))
+        cache_dir = getattr(config, "cache_dir", ENRICH_DIR)
+        name = re.sub(r"[^\w.-]", "_", self.model)
+        self.cache = EnrichmentCache(os.path.join(cache_dir, f"{name}.jsonl"))
+        self.counts = dict(
+            chunks=0,
+            cached=0,
+            enriched=0,
+            requests=0,
+            failed_requests=0,
+            split_requests=0,
+            prompt_tokens=0,
+            completion_tokens=0,
+        )
+        self.cost = 0.0
+        self.seconds = 0.0
+
+    def enrich(self, texts: List[str]) -> List[str]:
+        """Enrichment of each text ("" where the LLM failed)."""
+        return asyncio.run(self.enrich_async(texts))
+
+    async def enrich_async(self, texts: List[str]) -> List[str]:
+        start = time.perf_counter()
+        system = self.config.system_message
+        prompts = [self.config.enrichment_prompt_fn(t) for t in texts]
+        keys = [enrichment_key(self.model, system, p) for p in prompts]
+        found: Dict[str, str] = {}
+        todo: Dict[str, str] = {}  # key -> prompt, each distinct prompt once
+        for k, p in zip(keys, prompts):
+            text = self.cache.get(k)
+            if text is not None:
+                found[k] = text
+            else:
+                todo.setdefault(k, p)
+        self.counts["chunks"] += len(texts)
+        self.counts["cached"] += sum(k in found for k in keys)
+
+        semaphore = asyncio.Semaphore(max(1, self.config.batch_size))
+        items = list(todo.items())
+        size = self.chunks_per_request
+        await asyncio.gather(
+            *(
+                self._enrich_items(items[i : i + size], semaphore, found)
+                for i in range(0, len(items), size)
+            )
+        )
+        self.seconds += time.perf_counter() - start
+        return [found.get(k, "") for k in keys]
+
+    async def _enrich_items(
+        self,
+        items: List[Tuple[str, str]],
+        semaphore: asyncio.Semaphore,
+        found: Dict[str, str],
+    ) -> None:
+        async with semaphore:
+            answers = await self._request([p for _, p in items])
+        if answers is None:
+            if len(items) == 1:
+                return  # left unenriched, and uncached, so a later run retries
+            self.counts["split_requests"] += 1
+            half = len(items) // 2
+            await asyncio.gather(
+                self._enrich_items(items[:half], semaphore, found),
+                self._enrich_items(items[half:], semaphore, found),
+            )
+            return
+        new = {k: a for (k, _), a in zip(items, answers)}
+        self.cache.add(new)
+        found.update(new)
+        self.counts["enriched"] += len(new)
+
+    async def _request(self, prompts: List[str]) -> List[str] | None:
+        messages = [
+            LLMMessage(role=Role.SYSTEM, content=self.config.system_message),
+            LLMMessage(role=Role.USER, content=pack_prompts(prompts)),
+        ]
+        self.counts["requests"] += 1
+        try:
+            response = await self.llm.achat(
+                messages, max_tokens=self.llm.config.model_max_output_tokens
+            )
+        except Exception as e:
+            self.counts["failed_requests"] += 1
+            logger.warning(f"Enrichment request for {len(prompts)} chunks: {e}")
+            return None
+        if response.usage is not None:
+            self.counts["prompt_tokens"] += response.usage.prompt_tokens
+            self.counts["completion_tokens"] += response.usage.completion_tokens
+            self.cost += response.usage.cost
+        if response.message is None:
+            self.counts["failed_requests"] += 1
+            return None
+        return unpack_answers(response.message, len(prompts))
+
+    def stats(self) -> Dict[str, float]:
+        return dict(
+            self.counts,
+            cost=self.cost,
+            seconds=self.seconds,
+            chunks_per_s=self.counts["chunks"] / max(self.seconds, 1e-9),
+        )
+
+
+class EnrichingDocChatAgent(DocChatAgent):
+    def __init__(self, config: DocChatAgentConfig):
+        # set before DocChatAgent.__init__, which may ingest docs
+        self._enricher: ChunkEnricher | None = None
+        super().__init__(config)
+
+    @property
+    def enricher(self) -> ChunkEnricher | None:
+        cfg = self.config.chunk_enrichment_config
+        if cfg is None:
+            return None
+        if self._enricher is None or self._enricher.config is not cfg:
+            self._enricher = ChunkEnricher(cfg)
+        return self._enricher
+
+    def enrich_chunks(self, docs: List[Document]) -> List[Document]:
+        enricher = self.enricher
+        if enricher is None:
+            return docs
+        with status("[cyan]Augmenting chunks..."):
+            enrichments = enricher.enrich([d.content for d in docs])
+        delimiter = enricher.config.delimiter
+        # combined as DocChatAgent.enrich_chunks does
+        return [
+            (
+                doc.model_copy(
+                    update={
+                        "content": f"{doc.content}{delimiter}{enrichment}",
+                        "metadata": doc.metadata.model_copy(
+                            update={"has_enrichment": True}
+                        ),
+                    }
+                )
+                if enrichment
+                else doc
+            )
+            for doc, enrichment in zip(docs, enrichments)
+        ]
+
+    def enrichment_stats(self) -> Dict[str, float]:
+        """Chunks enriched and cached, LLM requests, tokens, cost and speed."""
+        return {} if self._enricher is None else self._enricher.stats()
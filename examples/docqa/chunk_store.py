@@ -0,0 +1,50 @@
+"""
+Deleting chunks from a collection, and keeping per-chunk indexes in step.
+
+Langroid's `VectorStore` has no generic way to delete chunks by id, so
+`delete_chunks` does it for each store. Agents that keep their own index of
+the collection's chunks next to it (neighbor links, BM25 postings, dedup
+signatures) derive from `IndexedDocChatAgent` and override
+`on_chunks_deleted` to drop deleted chunks from that index, chaining with
+`super()`, so whoever deletes chunks (e.g. `ingest_incremental`) calls the
+one hook whatever indexes the agent combines.
+"""
+
+from typing import List, Sequence
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent
+from langroid.vector_store.base import VectorStore
+
+
+def delete_chunks(vecdb: VectorStore, ids: List[str]) -> None:
+    """Delete chunks by id; langroid's VectorStore has no generic method for it."""
+    if len(ids) == 0:
+        return
+    collection = vecdb.config.collection_name
+    match type(vecdb).__name__:
+        case "QdrantDB":
+            from qdrant_client.http.models import PointIdsList
+
+            points = [vecdb._to_int_or_uuid(i) for i in ids]  # type: ignore
+            vecdb.client.delete(  # type: ignore
+                collection_name=collection,
+                points_selector=PointIdsList(points=points),
+            )
+        case "ChromaDB":
+            vecdb.collection.delete(ids=ids)  # type: ignore
+        case "LanceDB":
+            quoted = ", ".join(f"'{i}'" for i in ids)
+            table = vecdb.client.open_table(collection)  # type: ignore
+            table.delete(f"id IN ({quoted})")
+        case _:
+            if not hasattr(vecdb, "delete_ids"):
+                raise NotImplementedError(
+                    f"Cannot delete chunks from {type(vecdb).__name__}; "
+                    "clear the collection and ingest again instead."
+                )
+            vecdb.delete_ids(ids)  # type: ignore
+
+
+class IndexedDocChatAgent(DocChatAgent):
+    def on_chunks_deleted(self, ids: Sequence[str]) -> None:
+        """Called after the chunks with these ids were deleted from the vecdb."""
@@ -0,0 +1,511 @@
+"""
+Near-duplicate chunk detection at ingestion time, with MinHash signatures and
+locality-sensitive hashing (LSH).
+
+Search-driven ingestion sees the same text again and again: overlapping
+pages, mirrors, syndicated articles, and pages fetched for several searches.
+DocChatAgent stores every copy, so the vector store grows with them and
+retrieval returns the same extract several times.
+
+`DedupDocChatAgent` keeps a `DedupIndex` per collection, saved under
+`.langroid-dedup/` by default. On ingestion each new chunk gets a MinHash
+signature of its word 3-gram shingles (one-permutation hashing into
+`N_BINS` bins, with empty bins densified), and LSH bands of the signature
+find the stored and earlier chunks it may duplicate. A candidate whose
+estimated Jaccard similarity is at least `dedup_threshold` makes the chunk
+a duplicate, which is not embedded or stored. With `dedup_mode="merge"` (the
+default) the chunk it duplicates takes on its `tags` and `source`, so a
+search for any of the tags still finds the text; with `"skip"` duplicates
+are dropped as they are.
+
+Signatures are computed with numpy for a whole batch at once;
+`dedup_benchmark.py` measures throughput and accuracy on 100k chunks.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
+from langroid.mytypes import DocMetaData, Document
+from langroid.utils.object_registry import ObjectRegistry
+from langroid.vector_store.base import VectorStore
+
+from examples.docqa.chunk_store import IndexedDocChatAgent, delete_chunks
+
+DEDUP_DIR = ".langroid-dedup"
+N_BINS = 128  # signature length
+SHINGLE = 3  # words per shingle
+EMPTY = np.uint32(0xFFFFFFFF)  # a bin no shingle hashed into
+
+WORD = re.compile(r"\w+")
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+# stable 64-bit hash of each word seen, as signatures are kept across runs
+_word_hashes: Dict[str, int] = {}
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a well-spread 64-bit hash of each element."""
+    x = (x ^ (x >> np.uint64(30))) * _M1
+    x = (x ^ (x >> np.uint64(27))) * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _word_hash(word: str) -> int:
+    h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+    if len(_word_hashes) > 1_000_000:
+        _word_hashes.clear()
+    _word_hashes[word] = h
+    return h
+
+
+def signatures(texts: Sequence[str]) -> np.ndarray:
+    """
+    MinHash signatures of the texts, as an (n, N_BINS) uint32 array; the
+    signature of a text without words is all EMPTY.
+    """
+    n = len(texts)
+    hashes = _word_hashes
+    words = [WORD.findall(t.lower()) for t in texts]
+    counts = np.array([len(w) for w in words], dtype=np.int64)
+    tokens = np.fromiter(
+        (hashes[w] if w in hashes else _word_hash(w) for ws in words for w in ws),
+        np.uint64,
+        int(counts.sum()),
+    )
+    tokens = np.append(tokens, np.zeros(SHINGLE - 1, np.uint64))
+    # texts shorter than a shingle have a single one, of all their words
+    n_shingles = np.where(counts > 0, np.maximum(counts - SHINGLE + 1, 1), 0)
+    starts = np.cumsum(counts) - counts
+    rows = np.repeat(np.arange(n), n_shingles)
+    first = np.repeat(starts - np.cumsum(n_shingles) + n_shingles, n_shingles)
+    pos = np.arange(len(rows)) + first
+    ends = np.repeat(starts + counts, n_shingles)
+    h = np.zeros(len(rows), np.uint64)
+    for j in range(SHINGLE):
+        word = np.where(pos + j < ends, tokens[pos + j], np.uint64(0))
+        h = _mix(h + word + _GOLDEN)
+    # one permutation: the top bits pick the bin, the low bits are the value
+    bins = (h >> np.uint64(64 - 7)).astype(np.int64)
+    values = np.minimum(h & np.uint64(0xFFFFFFFF), np.uint64(EMPTY - 1))
+    keys = (rows * N_BINS + bins).astype(np.uint64) << np.uint64(32) | values
+    keys.sort()
+    cell = keys >> np.uint64(32)
+    lowest = np.ones(len(keys), dtype=bool)
+    lowest[1:] = cell[1:] != cell[:-1]
+    sig = np.full(n * N_BINS, EMPTY, dtype=np.uint32)
+    low = keys[lowest] & np.uint64(0xFFFFFFFF)
+    sig[cell[lowest].astype(np.int64)] = low.astype(np.uint32)
+    return _densify(sig.reshape(n, N_BINS))
+
+
+def _densify(sig: np.ndarray) -> np.ndarray:
+    """
+    Fill each empty bin from the next non-empty one (rotation densification),
+    so that short texts still compare bin by bin.
+    """
+    sparse = (sig == EMPTY).any(axis=1) & (sig != EMPTY).any(axis=1)
+    if not sparse.any():
+        return sig
+    src = sig[sparse]
+    filled = src.copy()
+    for step in range(1, N_BINS):
+        empty = filled == EMPTY
+        if not empty.any():
+            break
+        shifted = np.roll(src, -step, axis=1)
+        take = empty & (shifted != EMPTY)
+        value = shifted[take].astype(np.uint64) + np.uint64(step * 0x9E3779B1)
+        filled[take] = (value % np.uint64(EMPTY)).astype(np.uint32)
+    sig[sparse] = filled
+    return sig
+
+
+def rows_per_band(threshold: float) -> int:
+    """
+    Signature rows per LSH band: the most rows (fewest false candidates) whose
+    S-curve still rises well below `threshold`, so few duplicates are missed.
+    """
+    best = 1
+    for rows in [2, 4, 8, 16]:
+        if (rows / N_BINS) ** (1 / rows) <= threshold - 0.05:
+            best = rows
+    return best
+
+
+def band_keys(sig: np.ndarray, rows: int) -> np.ndarray:
+    """(n, bands) uint64 hashes of each band of each signature."""
+    bands = sig.reshape(len(sig), N_BINS // rows, rows).astype(np.uint64)
+    h = np.zeros(bands.shape[:2], np.uint64)
+    for j in range(rows):
+        h = _mix(h + bands[:, :, j] + _GOLDEN)
+    return h
+
+
+def similarity(sig: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of a signature to each of `others`."""
+    return (others == sig).mean(axis=1)
+
+
+class DedupIndex:
+    """
+    MinHash signatures of the chunks of one collection, by row, with an LSH
+    table per band in memory. `signatures.bin` and `ids.txt` are appended to;
+    `manifest.json`, replaced last, says how many rows are complete and which
+    are deleted, so an interrupted update leaves the previous index in place.
+
+    A band bucket remembers the first chunk that hashed into it: a later chunk
+    in the same bucket is either a near-duplicate of that one (and never
+    added) or is found through its other bands.
+    """
+
+    def __init__(self, directory: str, threshold: float = 0.8):
+        self.directory = directory
+        self.threshold = threshold
+        self.rows = rows_per_band(threshold)
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.sig_path = os.path.join(directory, "signatures.bin")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self._load()
+
+    @staticmethod
+    def for_vecdb(vecdb: VectorStore, directory: str = DEDUP_DIR) -> str:
+        name = f"{type(vecdb).__name__.lower()}-{vecdb.config.collection_name}"
+        return os.path.join(directory, name)
+
+    def _load(self) -> None:
+        manifest = dict(n=0, deleted=[], bins=N_BINS)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        n = manifest["n"] if manifest["bins"] == N_BINS else 0
+        self.sig = np.empty((0, N_BINS), dtype=np.uint32)
+        self.ids: List[str] = []
+        if n > 0:
+            self.sig = np.fromfile(self.sig_path, np.uint32, n * N_BINS).reshape(
+                n, N_BINS
+            )
+            with open(self.ids_path) as f:
+                self.ids = f.read().splitlines()[:n]
+        # rows of an unfinished add, or of an index with other settings
+        self._truncate()
+        self.row_of = {id: row for row, id in enumerate(self.ids)}
+        self.deleted = np.zeros(n, dtype=bool)
+        self.deleted[manifest["deleted"] if n > 0 else []] = True
+        self._build_tables()
+
+    def _truncate(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.sig_path, "ab") as f:
+            f.truncate(self.sig.nbytes)
+        with open(self.ids_path, "w") as f:
+            f.writelines(i + "\n" for i in self.ids)
+
+    def _build_tables(self) -> None:
+        self.tables: List[Dict[int, int]] = [{} for _ in range(N_BINS // self.rows)]
+        live = np.flatnonzero(~self.deleted)
+        keys = band_keys(self.sig[live], self.rows)
+        for band, table in enumerate(self.tables):
+            for row, key in zip(live.tolist(), keys[:, band].tolist()):
+                table.setdefault(key, row)
+
+    def _save(self) -> None:
+        manifest = dict(
+            n=len(self.ids),
+            deleted=np.flatnonzero(self.deleted).tolist(),
+            bins=N_BINS,
+        )
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def __len__(self) -> int:
+        return int((~self.deleted).sum())
+
+    def __contains__(self, id: str) -> bool:
+        row = self.row_of.get(id)
+        return row is not None and not self.deleted[row]
+
+    def match(self, ids: Sequence[str], sig: np.ndarray) -> Dict[str, str]:
+        """
+        Find the near-duplicates among a batch of new chunks: maps the id of
+        each duplicate to the id of the chunk it duplicates, a stored chunk or
+        an earlier chunk of the batch. Nothing is added to the index.
+        """
+        keys = band_keys(sig, self.rows).tolist()
+        batch: List[Dict[int, int]] = [{} for _ in self.tables]
+        found: Dict[str, str] = {}
+        for i, id in enumerate(ids):
+            if sig[i, 0] == EMPTY:  # no words: never a duplicate
+                continue
+            stored, earlier = set(), set()
+            for band, key in enumerate(keys[i]):
+                row = self.tables[band].get(key)
+                if row is not None and not self.deleted[row]:
+                    stored.add(row)
+                row = batch[band].get(key)
+                if row is not None:
+                    earlier.add(row)
+            best, best_score = None, self.threshold
+            for rows, sigs, names in [
+                (stored, self.sig, self.ids),
+                (earlier, sig, ids),
+            ]:
+                if len(rows) == 0:
+                    continue
+                candidates = list(rows)
+                scores = similarity(sig[i], sigs[candidates])
+                top = int(np.argmax(scores))
+                if scores[top] >= best_score:
+                    best, best_score = names[candidates[top]], float(scores[top])
+            if best is not None:
+                found[id] = best
+                continue
+            for band, key in enumerate(keys[i]):
+                batch[band].setdefault(key, i)
+        return found
+
+    def add(self, ids: Sequence[str], sig: np.ndarray) -> None:
+        """Index new chunks (assumed not duplicates of each other)."""
+        new = [i for i, id in enumerate(ids) if id not in self]
+        if len(new) == 0:
+            return
+        first = len(self.ids)
+        sig = np.ascontiguousarray(sig[new], dtype=np.uint32)
+        with open(self.sig_path, "ab") as f:
+            f.write(sig.tobytes())
+        with open(self.ids_path, "a") as f:
+            f.writelines(ids[i] + "\n" for i in new)
+        self.sig = np.concatenate([self.sig, sig])
+        for row, i in enumerate(new, start=first):
+            self.row_of[ids[i]] = row  # re-added if deleted
+            self.ids.append(ids[i])
+        self.deleted = np.append(self.deleted, np.zeros(len(new), dtype=bool))
+        keys = band_keys(sig, self.rows).tolist()
+        for band, table in enumerate(self.tables):
+            for row, key in enumerate(keys, start=first):
+                table.setdefault(key[band], row)
+        self._save()
+
+    def discard(self, ids: Sequence[str]) -> None:
+        """Drop chunks, e.g. deleted from the collection."""
+        rows = [self.row_of[i] for i in ids if i in self]
+        if len(rows) == 0:
+            return
+        self.deleted[rows] = True
+        if self.deleted.sum() > len(self.deleted) / 4:
+            self.compact()
+            return
+        self._save()
+        self._build_tables()  # buckets held by the dropped rows
+
+    def compact(self) -> None:
+        """Rewrite the index without the deleted rows."""
+        keep = ~self.deleted
+        sig, ids = self.sig[keep], [id for id, k in zip(self.ids, keep) if k]
+        self.clear()  # the manifest lists no rows while the files are rewritten
+        self.add(ids, sig)
+
+    def clear(self) -> None:
+        self.sig = self.sig[:0]
+        self.ids, self.row_of = [], {}
+        self.deleted = self.deleted[:0]
+        self._save()
+        self._truncate()
+        self._build_tables()
+
+
+class DedupDocChatAgentConfig(DocChatAgentConfig):
+    dedup_index_dir: str = DEDUP_DIR  # one index per collection in here
+    dedup_threshold: float = 0.8  # estimated Jaccard similarity of duplicates
+    dedup_mode: str = "merge"  # or "skip": drop duplicates, and their tags
+
+
+def _tags(metadata: DocMetaData) -> List[str]:
+    return list(getattr(metadata, "tags", None) or [])
+
+
+def _add_source(sources: str, source: str) -> str:
+    """Add a source to a `; `-separated list of them, unless already in it."""
+    parts = [s.strip() for s in sources.split("; ") if s.strip() != ""]
+    if source.strip() != "" and source.strip() not in parts:
+        parts.append(source.strip())
+    return "; ".join(parts)
+
+
+class DedupDocChatAgent(IndexedDocChatAgent):
+    def __init__(self, config: DedupDocChatAgentConfig):
+        # set before DocChatAgent.__init__, which may ingest docs
+        self._dedup_index: DedupIndex | None = None
+        # a replaced collection starts with an empty index
+        self._replace_dedup = config.vecdb is not None and (
+            config.vecdb.replace_collection
+        )
+        self.dedup_counts = dict(chunks=0, duplicates=0, merged=0)
+        super().__init__(config)
+        self.config: DedupDocChatAgentConfig = config
+
+    @property
+    def dedup_index(self) -> DedupIndex:
+        """The index of the current collection (the agent may switch them)."""
+        if self.vecdb is None:
+            raise ValueError("VecDB not set")
+        directory = DedupIndex.for_vecdb(self.vecdb, self.config.dedup_index_dir)
+        index = self._dedup_index
+        if (
+            index is None
+            or index.directory != directory
+            or index.threshold != self.config.dedup_threshold
+        ):
+            index = DedupIndex(directory, self.config.dedup_threshold)
+            if self._replace_dedup:
+                index.clear()
+                self._replace_dedup = False
+            self._dedup_index = index
+        return index
+
+    def clear(self) -> None:
+        if self.vecdb is not None:
+            self.dedup_index.clear()
+        super().clear()
+
+    def on_chunks_deleted(self, ids: Sequence[str]) -> None:
+        if self.vecdb is not None:
+            self.dedup_index.discard(ids)
+        super().on_chunks_deleted(ids)
+
+    def dedup_stats(self) -> Dict[str, Any]:
+        """Chunks seen by ingest_docs, and how many were duplicates."""
+        chunks = self.dedup_counts["chunks"]
+        return dict(
+            self.dedup_counts,
+            duplicate_rate=self.dedup_counts["duplicates"] / chunks if chunks else 0.0,
+        )
+
+    def _with_metadata(
+        self,
+        docs: List[Document],
+        metadata: (
+            List[Dict[str, Any]] | Dict[str, Any] | DocMetaData | List[DocMetaData]
+        ),
+    ) -> None:
+        """Update the docs' metadata in place, as `DocChatAgent.ingest_docs`."""
+        if isinstance(metadata, DocMetaData):
+            metadata = metadata.model_dump()
+        if isinstance(metadata, dict):
+            metadata = [metadata] * len(docs)
+        for d, m in zip(docs, metadata):
+            m_dict = m if isinstance(m, dict) else m.model_dump()
+            source = d.metadata.source
+            d.metadata = d.metadata.model_copy(update=m_dict)
+            d.metadata.source = _add_source(source, m_dict.get("source", ""))
+
+    def ingest_docs(
+        self,
+        docs: List[Document],
+        split: bool = True,
+        metadata: (
+            List[Dict[str, Any]] | Dict[str, Any] | DocMetaData | List[DocMetaData]
+        ) = [],
+    ) -> int:
+        """
+        As `DocChatAgent.ingest_docs`, but chunks that are near-duplicates of
+        stored chunks, or of earlier chunks in `docs`, are not ingested.
+        Returns the number of chunks ingested.
+        """
+        if self.vecdb is None or self.parser is None:
+            return super().ingest_docs(docs, split=split, metadata=metadata)
+        self._with_metadata(docs, metadata)
+        for d in docs:
+            if d.metadata.id in [None, ""]:
+                d.metadata.id = ObjectRegistry.new_id()
+        chunks = self.parser.split(docs) if split else docs
+        if len(chunks) == 0:
+            return 0
+        index = self.dedup_index
+        sig = signatures([c.content for c in chunks])
+        ids = [c.id() for c in chunks]
+        in_batch = {id: c for id, c in zip(ids, chunks)}
+        found = index.match(ids, sig)
+        originals = self._stored_originals(found, in_batch)
+        missing = {
+            id for id in found.values() if id not in in_batch and id not in originals
+        }
+        while len(missing) > 0:
+            # deleted from the vecdb behind the index's back: forget them
+            index.discard(list(missing))
+            found = index.match(ids, sig)
+            originals = self._stored_originals(found, in_batch)
+            missing = {
+                id
+                for id in found.values()
+                if id not in in_batch and id not in originals
+            }
+        if self.config.dedup_mode == "merge":
+            groups: Dict[str, List[Document]] = {}
+            for c in chunks:
+                if c.id() in found:
+                    groups.setdefault(found[c.id()], []).append(c)
+            for id, duplicates in groups.items():
+                if id in in_batch:
+                    self._merge(in_batch[id], duplicates)
+            self._update_stored(
+                [d for id, d in originals.items() if self._merge(d, groups[id])]
+            )
+        kept = [c for c in chunks if c.id() not in found]
+        for c in kept:  # neighbors now skip over the dropped chunks
+            c.metadata.window_ids = [
+                i for i in c.metadata.window_ids if i not in found
+            ]
+        self.dedup_counts["chunks"] += len(chunks)
+        self.dedup_counts["duplicates"] += len(found)
+        if len(kept) == 0:
+            return 0
+        n = super().ingest_docs(kept, split=False)
+        keep = [i for i, id in enumerate(ids) if id not in found]
+        index.add([ids[i] for i in keep], sig[keep])
+        return n
+
+    def _stored_originals(
+        self, found: Dict[str, str], in_batch: Dict[str, Document]
+    ) -> Dict[str, Document]:
+        """The stored chunks that new chunks duplicate, by id."""
+        assert self.vecdb is not None
+        ids = list({id for id in found.values() if id not in in_batch})
+        if len(ids) == 0:
+            return {}
+        return {d.id(): d for d in self.vecdb.get_documents_by_ids(ids)}
+
+    def _merge(self, chunk: Document, duplicates: List[Document]) -> bool:
+        """Add the duplicates' tags and sources to the chunk; True if changed."""
+        tags = _tags(chunk.metadata)
+        source = chunk.metadata.source
+        for d in duplicates:
+            tags += [t for t in _tags(d.metadata) if t not in tags]
+            for s in d.metadata.source.split("; "):
+                source = _add_source(source, s)
+        changed = tags != _tags(chunk.metadata) or source != chunk.metadata.source
+        if changed:
+            chunk.metadata = chunk.metadata.model_copy(
+                update=dict(tags=tags, source=source)
+            )
+        return changed
+
+    def _update_stored(self, chunks: List[Document]) -> None:
+        """Store chunks again, with their merged metadata."""
+        if len(chunks) == 0 or self.vecdb is None:
+            return
+        # no vector store here updates metadata alone, so they are re-embedded
+        delete_chunks(self.vecdb, [d.id() for d in chunks])
+        self.vecdb.add_documents(chunks)
+        by_id = {d.id(): d for d in chunks}
+        self.chunked_docs = [by_id.get(d.id(), d) for d in self.chunked_docs]
+        self.dedup_counts["merged"] += len(chunks)
@@ -0,0 +1,145 @@
+"""
+Throughput and accuracy of near-duplicate detection (dedup.py) on a large
+synthetic stream of chunks.
+
+Generates --chunks chunks of --words words: distinct chunks drawn from the
+vocabulary of the example text files, and, for --dup-share of them, copies of
+an earlier chunk with a share of their words replaced (--edits, one rate per
+copy in turn), as mirrors and syndicated pages are. The chunks are matched
+against, and added to, a `DedupIndex` in batches of --batch, as ingestion
+does, for each --thresholds value. Reported:
+
+- signatures/s: MinHash signatures computed, chunks per second;
+- match/s: LSH lookup, verification and adding to the index;
+- precision: flagged chunks whose exact Jaccard similarity (of word
+  3-gram shingles) to the chunk they were matched to is at least the
+  threshold;
+- recall: copies at least that similar to their original that were flagged.
+
+python3 -m examples.docqa.dedup_benchmark --chunks 100000
+"""
+
+import glob
+import random
+import re
+import tempfile
+import time
+from typing import List, Set, Tuple
+
+import numpy as np
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.dedup import SHINGLE, WORD, DedupIndex, signatures
+
+app = typer.Typer()
+
+
+def shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = WORD.findall(text.lower())
+    return {tuple(words[i : i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def jaccard(a: str, b: str) -> float:
+    sa, sb = shingles(a), shingles(b)
+    return len(sa & sb) / max(1, len(sa | sb))
+
+
+def make_chunks(
+    n: int, words: int, dup_share: float, edits: List[float], seed: int = 0
+) -> Tuple[List[str], List[int]]:
+    """Chunks, and for each the index of the chunk it copies (-1 if none)."""
+    rng = random.Random(seed)
+    vocab: List[str] = []
+    for path in sorted(glob.glob("examples/docqa/*.txt")):
+        with open(path) as f:
+            vocab += re.findall(r"\w+", f.read())
+    vocab = sorted(set(vocab))
+    texts: List[str] = []
+    sources: List[int] = []
+    for i in range(n):
+        if i > 0 and rng.random() < dup_share:
+            source = rng.randrange(i)
+            while sources[source] >= 0:  # copy an original
+                source = sources[source]
+            rate = edits[len(texts) % len(edits)]
+            copy = texts[source].split()
+            for j in rng.sample(range(len(copy)), int(rate * len(copy))):
+                copy[j] = rng.choice(vocab)
+            texts.append(" ".join(copy))
+            sources.append(source)
+        else:
+            texts.append(" ".join(rng.choices(vocab, k=words)))
+            sources.append(-1)
+    return texts, sources
+
+
+@app.command()
+def main(
+    n_chunks: int = typer.Option(100_000, "--chunks", "-n", help="chunks"),
+    words: int = typer.Option(150, "--words", "-w", help="words per chunk"),
+    dup_share: float = typer.Option(0.2, "--dup-share", help="share of copies"),
+    edits: str = typer.Option(
+        "0,0.01,0.03,0.05,0.1,0.2", "--edits", help="comma-separated edit rates"
+    ),
+    batch: int = typer.Option(1000, "--batch", "-b", help="chunks per ingestion"),
+    thresholds: str = typer.Option("0.7,0.8,0.9", "--thresholds", "-t"),
+) -> None:
+    rates = [float(e) for e in edits.split(",")]
+    texts, sources = make_chunks(n_chunks, words, dup_share, rates)
+    ids = [f"chunk-{i}" for i in range(n_chunks)]
+    copies = [i for i, s in enumerate(sources) if s >= 0]
+    similar = {i: jaccard(texts[i], texts[sources[i]]) for i in copies}
+
+    start = time.perf_counter()
+    sig = np.concatenate(
+        [signatures(texts[i : i + batch]) for i in range(0, n_chunks, batch)]
+    )
+    sig_seconds = time.perf_counter() - start
+
+    table = Table(
+        title=f"{n_chunks:,} chunks of {words} words, {len(copies):,} edited "
+        f"copies (edit rates {edits}), batches of {batch}"
+    )
+    for col in [
+        "threshold",
+        "signatures/s",
+        "match/s",
+        "flagged",
+        "precision",
+        "recall",
+    ]:
+        table.add_column(col, justify="right")
+    for threshold in [float(t) for t in thresholds.split(",")]:
+        found = {}
+        with tempfile.TemporaryDirectory(prefix="dedup-bench-") as directory:
+            index = DedupIndex(directory, threshold)
+            start = time.perf_counter()
+            for i in range(0, n_chunks, batch):
+                batch_ids, batch_sig = ids[i : i + batch], sig[i : i + batch]
+                matches = index.match(batch_ids, batch_sig)
+                keep = [j for j, id in enumerate(batch_ids) if id not in matches]
+                index.add([batch_ids[j] for j in keep], batch_sig[keep])
+                found.update(matches)
+            match_seconds = time.perf_counter() - start
+        row_of = {id: row for row, id in enumerate(ids)}
+        correct = sum(
+            jaccard(texts[row_of[dup]], texts[row_of[orig]]) >= threshold
+            for dup, orig in found.items()
+        )
+        should = [i for i in copies if similar[i] >= threshold]
+        caught = sum(ids[i] in found for i in should)
+        table.add_row(
+            f"{threshold:.2f}",
+            f"{n_chunks / sig_seconds:,.0f}",
+            f"{n_chunks / match_seconds:,.0f}",
+            f"{len(found):,}",
+            f"{correct / max(1, len(found)):.3f}",
+            f"{caught / max(1, len(should)):.3f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -39,15 +39,13 @@ from rich.table import Table
 import langroid as lr
 import langroid.language_models as lm
 from langroid.agent.batch import run_batch_function
-from langroid.agent.special.doc_chat_agent import (
-    ChunkEnrichmentAgentConfig,
-    DocChatAgent,
-    DocChatAgentConfig,
-)
 from langroid.parsing.parser import ParsingConfig
 from langroid.utils.configuration import Settings
 from langroid.vector_store.qdrantdb import QdrantDBConfig
 
+from examples.docqa.bm25_index import Bm25DocChatAgent, Bm25DocChatAgentConfig
+from examples.docqa.chunk_enrich import BatchEnrichmentConfig, EnrichingDocChatAgent
+
 app = typer.Typer()
 
 lr.utils.logging.setup_colored_logging()
@@ -55,6 +53,10 @@ lr.utils.logging.setup_colored_logging()
 ORGAN = "kidney"
 
 
+class HqDocChatAgent(EnrichingDocChatAgent, Bm25DocChatAgent):
+    """BM25 hybrid search over chunks enriched in packed, cached LLM requests."""
+
+
 def setup_vecdb(docker: bool, reset: bool, collection: str) -> QdrantDBConfig:
     """Configure vector database."""
     return QdrantDBConfig(
@@ -81,8 +83,9 @@ def run_document_chatbot(
     """
     llm_config = lm.OpenAIGPTConfig(chat_model=model)
     vecdb_config = setup_vecdb(docker=docker, reset=reset, collection=collection)
-    enrichment_config = ChunkEnrichmentAgentConfig(
-        batch_size=10,
+    enrichment_config = BatchEnrichmentConfig(
+        batch_size=10,  # requests in flight
+        chunks_per_request=10,
         system_message="""
         You are an experienced clinical physician, very well-versed in
         medical tests and their names.
@@ -109,13 +112,14 @@ def run_document_chatbot(
         """,
     )
 
-    config = DocChatAgentConfig(
+    config = Bm25DocChatAgentConfig(
         llm=llm_config,
         vecdb=vecdb_config,
         hypothetical_answer=False,
         rerank_diversity=False,
         rerank_periphery=False,
-        use_reciprocal_rank_fusion=False,
+        # fuse BM25 (from the persisted index) and vector results
+        use_reciprocal_rank_fusion=True,
         n_similar_chunks=10,
         n_relevant_chunks=10,
         parsing=ParsingConfig(
@@ -128,7 +132,7 @@ def run_document_chatbot(
         relevance_extractor_config=None,
     )
 
-    doc_agent = DocChatAgent(config=config)
+    doc_agent = HqDocChatAgent(config=config)
     medical_tests = """
     BUN, Creatinine, GFR, ALT, AST, ALP, Albumin, Bilirubin, CBC, eGFR, PTH, 
     Uric Acid, Ammonia, Protein/Creatinine Ratio, Total Protein, LDH, SPEP, CRP, 
@@ -146,6 +150,13 @@ def run_document_chatbot(
         for doc in doc_agent.chunked_docs:
             print(doc.content)
             print("---")
+        stats = doc_agent.enrichment_stats()
+        print(
+            f"[cyan]Enriched {stats['chunks']:.0f} chunks "
+            f"({stats['cached']:.0f} cached) in {stats['requests']:.0f} LLM "
+            f"requests, {stats['chunks_per_s']:.1f} chunks/s, "
+            f"${stats['cost']:.4f}"
+        )
 
     user_query = f"Which tests are related to {ORGAN} function?"
 
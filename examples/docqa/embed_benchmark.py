@@ -0,0 +1,105 @@
+"""
+Embedding throughput and cache hit rate with embedding_cache.py.
+
+Embeds a set of synthetic chunks (some repeated, as overlapping pages are)
+with the local HashEmbeddings model, made to behave like a remote API with
+--delay seconds per request plus --delay-per-text per text, in three ways:
+
+- plain: the model's own embedding function, one batch at a time;
+- cached, cold: CachedEmbeddings with an empty cache (adaptive batches,
+  concurrent requests);
+- cached, warm: the same chunks again, from a fresh CachedEmbeddings that
+  reopens the on-disk cache.
+
+python3 -m examples.docqa.embed_benchmark --chunks 20000
+"""
+
+import random
+import tempfile
+import time
+
+import numpy as np
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.embedding_cache import CachedEmbeddings
+from examples.docqa.hash_embeddings import HashEmbeddings
+
+app = typer.Typer()
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+@app.command()
+def main(
+    n_chunks: int = typer.Option(20_000, "--chunks", "-n", help="chunks to embed"),
+    dup_rate: float = typer.Option(
+        0.2, "--dup-rate", "-d", help="share of chunks that repeat an earlier one"
+    ),
+    dims: int = typer.Option(256, "--dims", help="embedding dimensions"),
+    delay: float = typer.Option(0.1, "--delay", help="seconds per request"),
+    delay_per_text: float = typer.Option(
+        0.0005, "--delay-per-text", help="seconds per text in a request"
+    ),
+    batch_size: int = typer.Option(
+        64, "--batch-size", "-b", help="batch size for plain embedding"
+    ),
+    concurrency: int = typer.Option(
+        4, "--concurrency", "-c", help="requests in flight when cached"
+    ),
+) -> None:
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(n_chunks):
+        if chunks and rng.random() < dup_rate:
+            chunks.append(rng.choice(chunks))
+        else:
+            chunks.append(" ".join(rng.choice(WORDS) for _ in range(100)))
+    cache_dir = tempfile.mkdtemp(prefix="embed-cache-")
+
+    def model() -> HashEmbeddings:
+        return HashEmbeddings(dims=dims, delay=delay, delay_per_text=delay_per_text)
+
+    table = Table(title=f"embedding {n_chunks} chunks ({dup_rate:.0%} repeats)")
+    for col in ["run", "seconds", "embeddings/s", "requests", "hit rate"]:
+        table.add_column(col, justify="right")
+
+    plain = model()
+    fn = plain.embedding_fn()
+    start = time.perf_counter()
+    expected = []
+    for i in range(0, n_chunks, batch_size):
+        expected.extend(fn(chunks[i : i + batch_size]))
+    seconds = time.perf_counter() - start
+    table.add_row(
+        f"plain, batches of {batch_size}",
+        f"{seconds:.2f}",
+        f"{n_chunks / seconds:.0f}",
+        str(plain.n_calls),
+        "-",
+    )
+
+    for label in ["cached, cold", "cached, warm"]:
+        cached = CachedEmbeddings(
+            model(), "hash", cache_dir=cache_dir, max_concurrency=concurrency
+        )
+        start = time.perf_counter()
+        vectors = cached.embedding_fn()(chunks)
+        seconds = time.perf_counter() - start
+        if not np.allclose(np.asarray(vectors), np.asarray(expected), atol=1e-6):
+            print(f"[red]{label}: vectors differ from the plain run!")
+        stats = cached.stats()
+        table.add_row(
+            label,
+            f"{seconds:.2f}",
+            f"{n_chunks / seconds:.0f}",
+            str(stats["requests"]),
+            f"{stats['hit_rate']:.1%}",
+        )
+    print(table)
+    print(f"[dim]cache dir: {cache_dir}")
+
+
+if __name__ == "__main__":
+    app()
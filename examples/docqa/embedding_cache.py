@@ -0,0 +1,248 @@
+"""
+On-disk embedding cache, with batched and concurrent embedding of misses.
+
+Re-ingesting the same chunks (another collection, another vector store, a
+changed file whose other chunks are unchanged) normally pays to embed them
+all again. `CachedEmbeddings` wraps any langroid EmbeddingModel and keeps
+every vector it computes, keyed by (model, dims, hash of the chunk text):
+
+- the vectors are float32 rows appended to one `.f32` file per model, read
+  through a memory map, so a cache of millions of vectors costs no RAM
+  until rows are used; a `.keys` file holds the 16-byte text hashes in the
+  same order;
+- texts that are not cached are embedded in batches whose size adapts to
+  the observed latency (halving when a batch fails), with up to
+  `max_concurrency` batches in flight for remote embedding APIs.
+
+Use it as the vector store's embedding model:
+
+    vecdb_config.embedding_model = CachedEmbeddings.from_config(embed_cfg)
+
+One process should write a given cache directory at a time.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Tuple
+
+import numpy as np
+
+from langroid.embedding_models.base import EmbeddingModel, EmbeddingModelsConfig
+
+CACHE_DIR = ".langroid-embeddings"
+KEY_BYTES = 16
+# local models gain nothing from concurrent calls
+LOCAL_MODEL_TYPES = {"sentence-transformer", "fastembed"}
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Append-only store of float32 vectors, keyed by text hash."""
+
+    def __init__(self, path: str, dims: int):
+        self.dims = dims
+        self.vectors_path = path + ".f32"
+        self.keys_path = path + ".keys"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for p in [self.vectors_path, self.keys_path]:
+            open(p, "ab").close()
+        with open(self.keys_path, "rb") as f:
+            keys = f.read()
+        row_bytes = 4 * dims
+        # vectors are written before their keys, so after a crash there may be
+        # rows without keys (ignored) but never keys without rows
+        n = min(
+            len(keys) // KEY_BYTES, os.path.getsize(self.vectors_path) // row_bytes
+        )
+        self.rows = {keys[i * KEY_BYTES : (i + 1) * KEY_BYTES]: i for i in range(n)}
+        os.truncate(self.keys_path, n * KEY_BYTES)
+        os.truncate(self.vectors_path, n * row_bytes)
+        self.matrix = self._map(n)
+        self.lock = threading.Lock()
+
+    def _map(self, n: int) -> np.ndarray:
+        if n == 0:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        return np.memmap(
+            self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dims)
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        row = self.rows.get(key)
+        return None if row is None else self.matrix[row]
+
+    def add(self, keys: List[bytes], vectors: List[List[float]]) -> None:
+        with self.lock:
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self.rows]
+            if len(new) == 0:
+                return
+            block = np.asarray([v for _, v in new], dtype=np.float32)
+            with open(self.vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(k for k, _ in new))
+            n = len(self.rows)
+            for i, (k, _) in enumerate(new):
+                self.rows[k] = n + i
+            self.matrix = self._map(len(self.rows))
+
+
+class CachedEmbeddings(EmbeddingModel):
+    def __init__(
+        self,
+        model: EmbeddingModel,
+        model_key: str,
+        cache_dir: str = CACHE_DIR,
+        batch_size: int = 64,
+        max_batch_size: int = 512,
+        max_concurrency: int = 4,
+        target_latency: float = 2.0,
+    ):
+        """
+        Args:
+            model: the embedding model to cache.
+            model_key: identifies the model (and its settings) in the cache.
+            cache_dir: where the cache files are kept.
+            batch_size: texts in the first request; adapted from then on.
+            max_batch_size: largest batch to grow to.
+            max_concurrency: most requests in flight at once.
+            target_latency: batches grow while requests take less than this
+                (seconds), and shrink when they take more than twice this.
+        """
+        super().__init__()
+        self.model = model
+        self.model_key = model_key
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.inner_fn = model.embedding_fn()
+        self.cache: EmbeddingCache | None = None  # opened once dims are known
+        self.counts = dict(
+            hits=0, misses=0, embedded=0, requests=0, failed_requests=0
+        )
+        self.embed_seconds = 0.0
+
+    @classmethod
+    def from_config(
+        cls, config: EmbeddingModelsConfig, **kwargs: Any
+    ) -> "CachedEmbeddings":
+        """Cache for the model described by a langroid embeddings config."""
+        name = getattr(config, "model_name", "") or getattr(config, "api_base", "")
+        key = f"{config.model_type}-{name}".replace("/", "_").replace(":", "_")
+        if config.model_type in LOCAL_MODEL_TYPES:
+            kwargs.setdefault("max_concurrency", 1)
+        return cls(EmbeddingModel.create(config), key, **kwargs)
+
+    @property
+    def embedding_dims(self) -> int:
+        return self.model.embedding_dims
+
+    def embedding_fn(self):  # type: ignore
+        return self.embed
+
+    def _open_cache(self, dims: int) -> EmbeddingCache:
+        if self.cache is None:
+            path = os.path.join(self.cache_dir, f"{self.model_key}-{dims}")
+            self.cache = EmbeddingCache(path, dims)
+        return self.cache
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(t) for t in texts]
+        dims = self.model.embedding_dims
+        cache = self._open_cache(dims) if dims > 0 else self.cache
+        out: List[Any] = [None] * len(texts)
+        missing: Dict[bytes, str] = {}  # each distinct text embedded once
+        for i, k in enumerate(keys):
+            v = cache.get(k) if cache is not None else None
+            if v is None:
+                missing.setdefault(k, texts[i])
+            else:
+                out[i] = v.tolist()
+        n_misses = sum(o is None for o in out)
+        self.counts["hits"] += len(texts) - n_misses
+        self.counts["misses"] += n_misses
+        self.counts["embedded"] += len(missing)
+        if len(missing) > 0:
+            new_keys = list(missing)
+            vectors = self._embed_uncached([missing[k] for k in new_keys])
+            cache = self._open_cache(len(vectors[0]))
+            cache.add(new_keys, vectors)
+            by_key = dict(zip(new_keys, vectors))
+            for i, k in enumerate(keys):
+                if out[i] is None:
+                    out[i] = list(by_key[k])
+        return out
+
+    def _request(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        start = time.perf_counter()
+        vectors = self.inner_fn(texts)
+        return vectors, time.perf_counter() - start
+
+    def _adapt(self, seconds: float, size: int) -> None:
+        if seconds < self.target_latency and size >= self.batch_size:
+            self.batch_size = min(self.max_batch_size, 2 * self.batch_size)
+        elif seconds > 2 * self.target_latency:
+            self.batch_size = max(1, self.batch_size // 2)
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        results: List[Any] = [None] * len(texts)
+        retry: Deque[Tuple[int, int]] = deque()  # (start, end) of failed halves
+        pos = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending: Dict[Future, Tuple[int, int]] = {}
+            while pos < len(texts) or retry or pending:
+                while len(pending) < self.max_concurrency and (
+                    retry or pos < len(texts)
+                ):
+                    if retry:
+                        lo, hi = retry.popleft()
+                    else:
+                        lo, hi = pos, min(len(texts), pos + self.batch_size)
+                        pos = hi
+                    pending[pool.submit(self._request, texts[lo:hi])] = (lo, hi)
+                    self.counts["requests"] += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    lo, hi = pending.pop(future)
+                    try:
+                        vectors, seconds = future.result()
+                    except Exception:
+                        self.counts["failed_requests"] += 1
+                        if hi - lo == 1:
+                            raise
+                        # e.g. too many tokens for one request: try halves
+                        mid = (lo + hi) // 2
+                        retry.extend([(lo, mid), (mid, hi)])
+                        self.batch_size = max(1, min(self.batch_size, mid - lo))
+                        continue
+                    results[lo:hi] = vectors
+                    self._adapt(seconds, hi - lo)
+        self.embed_seconds += time.perf_counter() - start
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self.counts["hits"], self.counts["misses"]
+        return dict(
+            self.counts,
+            cached_vectors=len(self.cache) if self.cache is not None else 0,
+            hit_rate=hits / (hits + misses) if hits + misses else 0.0,
+            batch_size=self.batch_size,
+            embeddings_per_sec=(
+                self.counts["embedded"] / self.embed_seconds
+                if self.embed_seconds
+                else 0.0
+            ),
+        )
@@ -0,0 +1,180 @@
+"""
+Time and LLM requests to enrich chunks at ingestion, with chunk_enrich.py vs.
+DocChatAgent's own `enrich_chunks`, against a local mock LLM.
+
+The mock LLM answers a request after --latency seconds (times a random factor
+in 0.5-1.5) plus --per-chunk seconds for each chunk in it; one in
+--garble-every packed replies is cut short, so it must be split and retried.
+--chunks chunks are enriched with at most --concurrency requests in flight:
+
+- langroid: `DocChatAgent.enrich_chunks`, one chunk per request;
+- 1 per request: `EnrichingDocChatAgent`, one chunk per request;
+- packed: `EnrichingDocChatAgent`, --pack chunks per request;
+- resumed: packed, after a run that stopped half way (the first half of the
+  chunks is already in the on-disk cache);
+- re-ingested: packed, all chunks already cached.
+
+"prompt chars" counts system and user message characters sent to the LLM, a
+proxy for prompt tokens; results are checked to match langroid's.
+
+python3 -m examples.docqa.enrich_benchmark --chunks 500
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import (
+    ChunkEnrichmentAgentConfig,
+    DocChatAgent,
+    DocChatAgentConfig,
+)
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.mytypes import DocMetaData, Document
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.chunk_enrich import BatchEnrichmentConfig, EnrichingDocChatAgent
+
+app = typer.Typer()
+
+SYSTEM_MESSAGE = """
+You are an experienced clinical physician. For the medical test named, list
+up to 3 ORGANS whose function it is most closely associated with, ONE PER
+LINE, and say nothing else.
+"""
+
+
+def prompt_fn(test: str) -> str:
+    return f"Which ORGAN(S) is the medical test named '{test}' associated with?"
+
+
+def organs(test: str) -> str:
+    h = hashlib.sha256(test.encode()).digest()
+    return "\n".join(f"organ-{b % 20}" for b in h[: 1 + h[3] % 3])
+
+
+def mock_enricher(
+    latency: float, per_chunk: float, garble_every: int, sent: Dict[str, int]
+) -> Callable[[str], Awaitable[Optional[str]]]:
+    rng = random.Random(0)
+
+    async def respond(msg: str) -> Optional[str]:
+        tests = re.findall(r"named '(.*?)'", msg)
+        sent["requests"] += 1
+        sent["chars"] += len(msg) + len(SYSTEM_MESSAGE)
+        await asyncio.sleep(latency * (0.5 + rng.random()) + per_chunk * len(tests))
+        if "REQUEST 1:" not in msg:
+            return organs(tests[0])
+        answers = [organs(t) for t in tests]
+        if garble_every > 0 and rng.randrange(garble_every) == 0:
+            return json.dumps(answers)[: -len(answers[-1])]
+        return json.dumps(answers)
+
+    return respond
+
+
+@app.command()
+def main(
+    n_chunks: int = typer.Option(500, "--chunks", "-n", help="chunks to enrich"),
+    latency: float = typer.Option(
+        0.3, "--latency", "-l", help="mean seconds per request"
+    ),
+    per_chunk: float = typer.Option(
+        0.02, "--per-chunk", help="extra seconds per chunk in a request"
+    ),
+    concurrency: int = typer.Option(
+        10, "--concurrency", "-c", help="max requests in flight"
+    ),
+    pack: int = typer.Option(10, "--pack", "-p", help="chunks per packed request"),
+    garble_every: int = typer.Option(
+        10, "--garble-every", help="about 1 in this many packed replies is cut short"
+    ),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    docs = [
+        Document(
+            content=f"TEST-{i}",
+            metadata=DocMetaData(source="tests", id=str(i), is_chunk=True),
+        )
+        for i in range(n_chunks)
+    ]
+    sent = dict(requests=0, chars=0)
+    llm = MockLMConfig(
+        response_fn_async=mock_enricher(latency, per_chunk, garble_every, sent)
+    )
+
+    def enrichment(**kwargs: object) -> dict:
+        return dict(
+            llm=llm,
+            system_message=SYSTEM_MESSAGE,
+            enrichment_prompt_fn=prompt_fn,
+            batch_size=concurrency,
+            **kwargs,
+        )
+
+    table = Table(
+        title=f"enriching {n_chunks} chunks, {latency}s + {per_chunk}s/chunk "
+        f"per request, {concurrency} in flight"
+    )
+    for col in ["method", "seconds", "chunks/s", "requests", "prompt chars"]:
+        table.add_column(col, justify="right")
+
+    def run(name: str, agent: DocChatAgent, chunks: List[Document]) -> List[str]:
+        sent.update(requests=0, chars=0)
+        start = time.perf_counter()
+        enriched = [d.content for d in agent.enrich_chunks(chunks)]
+        seconds = time.perf_counter() - start
+        table.add_row(
+            name,
+            f"{seconds:.2f}",
+            f"{len(chunks) / seconds:,.0f}",
+            str(sent["requests"]),
+            f"{sent['chars']:,}",
+        )
+        return enriched
+
+    reference = run(
+        "langroid",
+        DocChatAgent(
+            DocChatAgentConfig(
+                llm=llm,
+                vecdb=None,
+                chunk_enrichment_config=ChunkEnrichmentAgentConfig(**enrichment()),
+            )
+        ),
+        docs,
+    )
+
+    def agent(cache_dir: str, chunks_per_request: int) -> EnrichingDocChatAgent:
+        config = BatchEnrichmentConfig(
+            **enrichment(cache_dir=cache_dir, chunks_per_request=chunks_per_request)
+        )
+        return EnrichingDocChatAgent(
+            DocChatAgentConfig(llm=llm, vecdb=None, chunk_enrichment_config=config)
+        )
+
+    with tempfile.TemporaryDirectory(prefix="enrich-bench-") as directory:
+        results = [
+            run("1 per request", agent(f"{directory}/single", 1), docs),
+            run(f"{pack} per request", agent(f"{directory}/packed", pack), docs),
+        ]
+        # a run that got half way, then a new one on all the chunks
+        agent(f"{directory}/resumed", pack).enrich_chunks(docs[: n_chunks // 2])
+        results.append(run("resumed", agent(f"{directory}/resumed", pack), docs))
+        results.append(run("re-ingested", agent(f"{directory}/packed", pack), docs))
+    for enriched in results:
+        assert enriched == reference
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,168 @@
+"""
+End-to-end latency of relevance extraction + summary, with parallel_extract.py
+vs. DocChatAgent's own `get_verbatim_extracts`, against a local mock LLM.
+
+The mock LLM answers each extraction call after --latency seconds (times a
+random factor in 0.5-1.5, and 4x for one chunk in --slow-every, a straggler),
+picking some segments, or none for one chunk in --irrelevant-every; the
+summary call takes --summary-latency seconds. For each number of retrieved
+chunks, extraction + summary runs:
+
+- langroid: `get_verbatim_extracts` then `get_summary_answer`;
+- sequential: parallel_extract.py with max_concurrency=1;
+- parallel: parallel_extract.py with --concurrency;
+- parallel + timeout: same, summarizing --straggler-timeout seconds after the
+  first relevant extract instead of waiting for stragglers.
+
+python3 -m examples.docqa.extract_benchmark --chunks 5,10,20
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Callable, List, Optional
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.agent.special.relevance_extractor_agent import (
+    RelevanceExtractorAgentConfig,
+)
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.mytypes import DocMetaData, Document
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.parallel_extract import answer_from_passages_async
+
+app = typer.Typer()
+
+SENTENCES = [
+    "Giraffes are the tallest living terrestrial animals.",
+    "They are found across the savannas of Africa.",
+    "A giraffe's neck has seven vertebrae, like most mammals.",
+    "Their diet consists mainly of acacia leaves.",
+    "Calves can stand within an hour of birth.",
+    "Lions are the main predators of adult giraffes.",
+]
+
+
+def make_passages(n: int) -> List[Document]:
+    return [
+        Document(
+            content=f"This is chunk {i}. "
+            + " ".join(SENTENCES[(i + j) % len(SENTENCES)] for j in range(4)),
+            metadata=DocMetaData(source=f"chunk-{i}", id=str(i)),
+        )
+        for i in range(n)
+    ]
+
+
+def mock_extractor(
+    latency: float, slow_every: int, irrelevant_every: int
+) -> Callable[[str], object]:
+    async def respond(msg: str) -> Optional[str]:
+        # depends only on the passage, so all methods see the same answers
+        passage = " ".join(msg.split("PASSAGE:")[-1].split("QUERY:")[0].split())
+        h = int.from_bytes(hashlib.sha256(passage.encode()).digest()[:4], "big")
+        delay = latency * (0.5 + (h % 1000) / 1000)
+        if slow_every > 0 and h % slow_every == 0:
+            delay *= 4
+        await asyncio.sleep(delay)
+        if irrelevant_every > 0 and (h >> 8) % irrelevant_every == 0:
+            segments = "NO_ANSWER"
+        else:
+            segments = "1,3"
+        return json.dumps(dict(request="extract_segments", segment_list=segments))
+
+    return respond
+
+
+def mock_summarizer(latency: float) -> Callable[[str], Optional[str]]:
+    def respond(msg: str) -> Optional[str]:
+        time.sleep(latency)
+        return "Giraffes are tall [^1]."
+
+    return respond
+
+
+@app.command()
+def main(
+    chunks: str = typer.Option(
+        "5,10,20", "--chunks", "-n", help="comma-separated numbers of chunks"
+    ),
+    latency: float = typer.Option(
+        0.5, "--latency", "-l", help="mean seconds per extraction call"
+    ),
+    summary_latency: float = typer.Option(
+        1.0, "--summary-latency", "-s", help="seconds for the summary call"
+    ),
+    slow_every: int = typer.Option(
+        10, "--slow-every", help="about 1 in this many calls is 4x slower"
+    ),
+    irrelevant_every: int = typer.Option(
+        4, "--irrelevant-every", help="about 1 in this many chunks has no extract"
+    ),
+    concurrency: int = typer.Option(
+        8, "--concurrency", "-c", help="max concurrent extraction calls"
+    ),
+    straggler_timeout: float = typer.Option(
+        0.5, "--straggler-timeout", "-t", help="seconds to wait after first extract"
+    ),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    extractor_llm = MockLMConfig(
+        response_fn_async=mock_extractor(latency, slow_every, irrelevant_every)
+    )
+    agent = DocChatAgent(
+        DocChatAgentConfig(
+            llm=MockLMConfig(response_fn=mock_summarizer(summary_latency)),
+            relevance_extractor_config=RelevanceExtractorAgentConfig(
+                llm=extractor_llm
+            ),
+            vecdb=None,
+        )
+    )
+    query = "How tall are giraffes?"
+
+    table = Table(title=f"extraction + summary, {latency}s per extraction call")
+    for col in ["chunks", "method", "seconds", "extracts", "first extract s"]:
+        table.add_column(col, justify="right")
+    for n in [int(c) for c in chunks.split(",")]:
+        passages = make_passages(n)
+
+        start = time.perf_counter()
+        extracts = agent.get_verbatim_extracts(query, passages)
+        agent.get_summary_answer(query, extracts)
+        seconds = time.perf_counter() - start
+        table.add_row(str(n), "langroid", f"{seconds:.2f}", str(len(extracts)), "")
+
+        runs = [
+            ("sequential", 1, None),
+            (f"parallel x{concurrency}", concurrency, None),
+            (f"+ timeout {straggler_timeout}s", concurrency, straggler_timeout),
+        ]
+        for name, max_concurrency, timeout in runs:
+            arrivals: List[float] = []
+            start = time.perf_counter()
+            asyncio.run(
+                answer_from_passages_async(
+                    agent,
+                    query,
+                    passages,
+                    max_concurrency=max_concurrency,
+                    on_extract=lambda i, d: arrivals.append(time.perf_counter()),
+                    straggler_timeout=timeout,
+                )
+            )
+            seconds = time.perf_counter() - start
+            first = f"{arrivals[0] - start:.2f}" if arrivals else "-"
+            table.add_row("", name, f"{seconds:.2f}", str(len(arrivals)), first)
+        table.add_section()
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
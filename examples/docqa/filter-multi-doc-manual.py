@@ -35,6 +35,8 @@ from langroid.pydantic_v1 import Field
 from langroid.utils.configuration import Settings, set_global
 from langroid.vector_store.lancedb import LanceDBConfig
 
+from examples.docqa.metadata_filter import F, compile_for
+
 app = typer.Typer()
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -221,7 +223,8 @@ def main(
     print(f"[blue]You chose {metadata[musician].name}")
     # this filter setting will be used by the LanceDocChatAgent
     # to restrict the docs searched from the vector-db
-    config.filter = f"metadata.name = '{metadata[musician].name}'"
+    name = metadata[musician].name
+    config.filter = compile_for(agent.vecdb, F("metadata.name") == name)
 
     print("[blue]Reqdy for your questions...")
     task = lr.Task(
@@ -8,7 +8,6 @@ Single agent to chat with multiple docs, with filtering based on user query.
 
 """
 
-import json
 import os
 from typing import Optional
 
@@ -28,6 +27,8 @@ from langroid.utils.pydantic_utils import temp_update
 from langroid.vector_store.lancedb import LanceDBConfig
 from langroid.vector_store.qdrantdb import QdrantDBConfig
 
+from examples.docqa.metadata_filter import F, compile_for
+
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 VECDB = "qdrant"  # or "lance"
@@ -68,15 +69,9 @@ class FilterDocAgent(lr.agent.special.DocChatAgent):
 
     def query_plan(self, msg: QueryPlanTool) -> str:
         """Handle query plan tool"""
-        # Note the filter syntax depends on the type of underlying vector-db
-        if VECDB == "lance":
-            name_filter = f"metadata.name=='{msg.name}'"  # SQL-like syntax
-        else:
-            # for qdrant use this:
-            name_filter_dict = dict(
-                should=[dict(key="metadata.name", match=dict(value=msg.name))]
-            )
-            name_filter = json.dumps(name_filter_dict)
+        # compiled to the filter syntax of the underlying vector-db
+        # (SQL-like for lance, JSON for qdrant)
+        name_filter = compile_for(self.vecdb, F("metadata.name") == msg.name)
         with temp_update(self.config, {"filter": name_filter}):
             # restrict the document-set used for keyword and other non-vector
             # similarity
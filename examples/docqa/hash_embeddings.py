@@ -0,0 +1,51 @@
+"""
+Deterministic, local stand-in for an embedding model, for benchmarks.
+
+Each text maps to a fixed unit vector derived from its hash, so the same
+text always gets the same embedding and nothing is downloaded or sent over
+the network. `delay` (per call) and `delay_per_text` add latency, to mimic
+a remote embedding API; `n_calls` and `n_texts` count the work done.
+
+Plug it into any vector store via its config, e.g.
+
+    QdrantDBConfig(embedding_model=HashEmbeddings(dims=64), ...)
+"""
+
+import hashlib
+import time
+from typing import List
+
+import numpy as np
+
+from langroid.embedding_models.base import EmbeddingModel
+
+
+class HashEmbeddings(EmbeddingModel):
+    def __init__(
+        self, dims: int = 64, delay: float = 0.0, delay_per_text: float = 0.0
+    ):
+        super().__init__()
+        self.dims = dims
+        self.delay = delay
+        self.delay_per_text = delay_per_text
+        self.n_calls = 0
+        self.n_texts = 0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        self.n_calls += 1
+        self.n_texts += len(texts)
+        if self.delay > 0 or self.delay_per_text > 0:
+            time.sleep(self.delay + self.delay_per_text * len(texts))
+        vecs = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+            v = np.random.default_rng(seed).standard_normal(self.dims)
+            vecs.append((v / np.linalg.norm(v)).tolist())
+        return vecs
+
+    def embedding_fn(self):  # type: ignore
+        return self.embed
+
+    @property
+    def embedding_dims(self) -> int:
+        return self.dims
@@ -0,0 +1,132 @@
+"""
+Full vs. incremental re-ingestion of a folder, using ingest_manifest.py.
+
+Creates a folder of text files, ingests it, then re-runs the ingestion after
+no change, after touching some files (new mtime, same content), after
+editing some, and after deleting some. Embeddings come from the local
+HashEmbeddings model, with --embed-delay seconds per call to stand in for a
+remote embedding API, and the vector store is a local Qdrant in a temp dir,
+so nothing leaves the machine:
+
+python3 -m examples.docqa.ingest_benchmark --files 1000
+
+A second run over an unchanged folder should cost about as much as listing
+(and, for touched files, hashing) the files, with no embedding calls. Runs
+that do ingest something also pay for DocChatAgent.ingest_docs re-indexing
+all chunks for its keyword search, which grows with the collection.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.hash_embeddings import HashEmbeddings
+from examples.docqa.ingest_manifest import IngestManifest, ingest_incremental
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.parsing.parser import ParsingConfig, Splitter
+from langroid.utils.configuration import Settings, set_global
+from langroid.vector_store.qdrantdb import QdrantDBConfig
+
+app = typer.Typer()
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+def write_file(path: str, rng: random.Random, n_words: int) -> None:
+    with open(path, "w") as f:
+        f.write(" ".join(rng.choice(WORDS) for _ in range(n_words)))
+
+
+@app.command()
+def main(
+    n_files: int = typer.Option(1000, "--files", "-n", help="files in the folder"),
+    n_words: int = typer.Option(400, "--words", "-w", help="words per file"),
+    n_changed: int = typer.Option(
+        10, "--changed", "-c", help="files touched/edited/deleted per phase"
+    ),
+    embed_delay: float = typer.Option(
+        0.05, "--embed-delay", "-ed", help="seconds per embedding call"
+    ),
+) -> None:
+    set_global(Settings(cache=False, stream=False))
+    rng = random.Random(0)
+    tmp = tempfile.mkdtemp(prefix="ingest-bench-")
+    folder = os.path.join(tmp, "docs")
+    os.makedirs(folder)
+    files = [os.path.join(folder, f"doc-{i:05d}.txt") for i in range(n_files)]
+    for path in files:
+        write_file(path, rng, n_words)
+
+    embedder = HashEmbeddings(dims=64, delay=embed_delay)
+    agent = DocChatAgent(
+        DocChatAgentConfig(
+            llm=MockLMConfig(),
+            parsing=ParsingConfig(splitter=Splitter.TOKENS, chunk_size=200),
+            vecdb=QdrantDBConfig(
+                cloud=False,
+                collection_name="ingest-bench",
+                storage_path=os.path.join(tmp, "qdrant"),
+                embedding_model=embedder,
+            ),
+        )
+    )
+    manifest = IngestManifest(os.path.join(tmp, "manifest.json"))
+
+    def touch(paths):
+        for p in paths:
+            os.utime(p, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+
+    def edit(paths):
+        for p in paths:
+            write_file(p, rng, n_words)
+
+    def delete(paths):
+        for p in paths:
+            os.remove(p)
+
+    phases = [
+        ("first run", None),
+        ("no change", None),
+        (f"touch {n_changed}", lambda: touch(files[:n_changed])),
+        (f"edit {n_changed}", lambda: edit(files[n_changed : 2 * n_changed])),
+        (f"delete {n_changed}", lambda: delete(files[-n_changed:])),
+    ]
+    table = Table(title=f"ingesting a folder of {n_files} files")
+    for col in [
+        "phase",
+        "seconds",
+        "unchanged",
+        "added",
+        "updated",
+        "removed",
+        "chunks",
+        "embedding calls",
+    ]:
+        table.add_column(col, justify="right")
+    for label, change in phases:
+        if change is not None:
+            change()
+        calls = embedder.n_calls
+        stats = ingest_incremental(agent, folder, manifest=manifest)
+        table.add_row(
+            label,
+            f"{stats['seconds']:.2f}",
+            str(stats["unchanged"]),
+            str(stats["added"]),
+            str(stats["updated"]),
+            str(stats["removed"]),
+            str(stats["chunks"]),
+            str(embedder.n_calls - calls),
+        )
+    print(table)
+    print(f"[dim]working dir: {tmp}")
+
+
+if __name__ == "__main__":
+    app()
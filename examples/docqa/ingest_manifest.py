@@ -0,0 +1,260 @@
+"""
+Incremental ingestion for a DocChatAgent, driven by a persistent manifest.
+
+`DocChatAgent.ingest_doc_paths` parses, chunks and embeds everything it is
+given, every time. `ingest_incremental` instead remembers, per source (a file
+or a URL), what was ingested: size, mtime, content hash, a hash of the
+settings that shaped its chunks (parsing config and embedding model), and the
+ids of those chunks. Running it again over the same file, folder or URL:
+
+- skips unchanged sources (when size and mtime match, even the hashing),
+- deletes the old chunks of changed sources and ingests them again,
+- deletes the chunks of files that were removed from an ingested folder.
+
+There is one manifest (a JSON file) per vector-store collection, under
+`.langroid-manifests/` by default.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.mytypes import Document
+from langroid.parsing.url_loader import URLLoader
+from langroid.parsing.urls import is_url
+from langroid.vector_store.base import VectorStore
+
+from examples.docqa.chunk_store import IndexedDocChatAgent, delete_chunks
+from examples.docqa.page_cache import PageCache
+from examples.docqa.parallel_ingest import ingest_files_parallel
+from examples.docqa.web_fetch import load_urls
+
+MANIFEST_DIR = ".langroid-manifests"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            h.update(block)
+    return h.hexdigest()
+
+
+def settings_hash(config: DocChatAgentConfig) -> str:
+    """
+    Hash of everything that determines a source's chunks and their vectors:
+    if it changes, all sources are ingested again.
+    """
+    embedding = config.vecdb.embedding if config.vecdb is not None else None
+    settings = dict(
+        parsing=config.parsing.model_dump(mode="json"),
+        add_fields_to_content=config.add_fields_to_content,
+        embedding_type=getattr(embedding, "model_type", None),
+        embedding_model=getattr(embedding, "model_name", None),
+        embedding_dims=getattr(embedding, "dims", None),
+    )
+    text = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class IngestManifest:
+    """What was ingested into one collection, keyed by source (path or URL)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)["entries"]
+
+    @staticmethod
+    def for_vecdb(vecdb: VectorStore, directory: str = MANIFEST_DIR) -> str:
+        name = f"{type(vecdb).__name__.lower()}-{vecdb.config.collection_name}"
+        return os.path.join(directory, name + ".json")
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(version=1, entries=self.entries), f)
+        # atomic, so an interrupted run never leaves a half-written manifest
+        os.replace(tmp, self.path)
+
+
+def list_sources(path: str) -> List[str]:
+    """The URL, or the file, or all files under the folder, as manifest keys."""
+    if is_url(path):
+        return [path]
+    root = Path(path).resolve()
+    if not root.is_dir():
+        return [str(root)]
+    return sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+        if os.path.isfile(os.path.join(dirpath, name))
+    )
+
+
+def ingest_incremental(
+    agent: DocChatAgent,
+    paths: str | List[str],
+    manifest: IngestManifest | None = None,
+    force: bool = False,
+    workers: int | None = None,
+    page_cache: PageCache | None = None,
+) -> Dict[str, Any]:
+    """
+    Bring the agent's collection up to date with the given files, folders
+    or URLs, parsing and embedding only what is new or changed.
+
+    Args:
+        agent: DocChatAgent whose vecdb holds the collection.
+        paths: file path, folder path or URL, or a list of these.
+        manifest: manifest to use; by default the one for agent.vecdb.
+        force: ingest all given sources again, even if unchanged.
+        workers: processes for parsing files (see parallel_ingest.py);
+            default os.cpu_count().
+        page_cache: PageCache for URLs, so an unchanged page is not
+            downloaded again (or only revalidated) to find it unchanged.
+
+    Returns:
+        counts of unchanged/added/updated/removed sources, chunks ingested
+        and chunks deleted, and the elapsed seconds.
+    """
+    if agent.vecdb is None:
+        raise ValueError("VecDB not set")
+    start = time.perf_counter()
+    if isinstance(paths, str):
+        paths = [paths]
+    manifest = manifest or IngestManifest(IngestManifest.for_vecdb(agent.vecdb))
+    settings = settings_hash(agent.config)
+    stats = dict(unchanged=0, added=0, updated=0, removed=0, chunks=0, deleted=0)
+
+    stale_ids: List[str] = []
+    new_entries: Dict[str, Dict[str, Any]] = {}
+    files: List[str] = []  # new or changed, parsed in parallel below
+    docs: List[Document] = []  # of new or changed URLs
+    source_to_key: Dict[str, str] = {}
+
+    for path in paths:
+        keys = list_sources(path)
+        if os.path.isdir(path):
+            # files that were ingested from under this folder but are gone
+            prefix = str(Path(path).resolve()) + os.sep
+            present = set(keys)
+            gone = [
+                k for k in manifest.entries if k.startswith(prefix) and k not in present
+            ]
+            for key in gone:
+                stale_ids.extend(manifest.entries.pop(key)["ids"])
+                stats["removed"] += 1
+
+        for key in keys:
+            old = manifest.entries.get(key)
+            if old is not None and (force or old["settings"] != settings):
+                # ingested with other settings (or forced): redo from scratch
+                stale_ids.extend(manifest.entries.pop(key)["ids"])
+                old = None
+            if is_url(key):
+                if page_cache is None:
+                    key_docs = URLLoader(
+                        urls=[key],
+                        parsing_config=agent.config.parsing,
+                        crawler_config=agent.config.crawler_config,
+                    ).load()  # type: ignore
+                else:
+                    key_docs = load_urls(
+                        [key],
+                        agent.config.parsing,
+                        agent.config.crawler_config,
+                        cache=page_cache,
+                    )
+                digest = hashlib.sha256(
+                    "\n".join(d.content for d in key_docs).encode()
+                ).hexdigest()
+                entry = dict(settings=settings, sha256=digest)
+            else:
+                if not os.path.exists(key):
+                    if key in manifest.entries:
+                        stale_ids.extend(manifest.entries.pop(key)["ids"])
+                        stats["removed"] += 1
+                    continue
+                st = os.stat(key)
+                entry = dict(settings=settings, size=st.st_size, mtime=st.st_mtime_ns)
+                if (
+                    old is not None
+                    and old["size"] == st.st_size
+                    and old["mtime"] == st.st_mtime_ns
+                ):
+                    stats["unchanged"] += 1
+                    continue
+                entry["sha256"] = content_hash(key)
+            if old is not None and old["sha256"] == entry["sha256"]:
+                # e.g. only touched: keep the chunks, remember the new mtime
+                old.update(entry)
+                stats["unchanged"] += 1
+                continue
+            if old is not None:
+                stale_ids.extend(old["ids"])
+                stats["updated"] += 1
+            else:
+                stats["added"] += 1
+            new_entries[key] = dict(entry, ids=[])
+            if is_url(key):
+                for d in key_docs:
+                    source_to_key[d.metadata.source] = key
+                docs.extend(key_docs)
+            else:
+                files.append(key)
+
+    # Old chunks go first, and the manifest forgets them before anything new
+    # is ingested: a failure below then only means those sources are
+    # ingested on the next run, never that they have duplicate chunks.
+    delete_chunks(agent.vecdb, stale_ids)
+    if isinstance(agent, IndexedDocChatAgent):
+        agent.on_chunks_deleted(stale_ids)
+    stats["deleted"] = len(stale_ids)
+    for key in new_entries:
+        manifest.entries.pop(key, None)
+    manifest.save()
+    if len(files) > 0:
+        ids = ingest_files_parallel(agent, files, workers=workers)
+        for key in files:
+            if key in ids:
+                new_entries[key]["ids"] = ids[key]
+                stats["chunks"] += len(ids[key])
+            else:
+                del new_entries[key]  # failed to parse: retried next run
+    if len(docs) > 0:
+        # with a filter, ingest_docs reloads chunked_docs from the vecdb
+        # instead of appending the new chunks, which we need for their ids
+        filter, agent.config.filter = agent.config.filter, None
+        n_before = len(agent.chunked_docs)
+        try:
+            stats["chunks"] += agent.ingest_docs(docs, split=agent.config.split)
+        finally:
+            agent.config.filter = filter
+        for chunk in agent.chunked_docs[n_before:]:
+            key = source_to_key.get(chunk.metadata.source)
+            if key is not None:
+                new_entries[key]["ids"].append(chunk.id())
+    if len(new_entries) > 0:
+        manifest.entries.update(new_entries)
+        manifest.save()
+    if len(docs) > 0 and agent.config.filter is not None:
+        agent.setup_documents(filter=agent.config.filter)
+    elif len(stale_ids) > 0:
+        # drop deleted chunks from the agent's lexical-search state
+        stale = set(stale_ids)
+        agent.chunked_docs = [d for d in agent.chunked_docs if d.id() not in stale]
+        agent.chunked_docs_clean = [
+            d for d in agent.chunked_docs_clean if d.id() not in stale
+        ]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
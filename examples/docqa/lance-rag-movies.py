@@ -15,12 +15,17 @@ This system combines:
 - Full Text Search using LanceDB (search on document content)
 - Pandas-like dataframe calculations (e.g. "highest rated", "most votes", etc.)
 
+The movies are ingested in batches with a checkpoint (see lance_ingest.py):
+if ingestion is interrupted, running the script again picks up where it
+stopped, and once a genre is ingested, later runs reuse it.
+
 Run like this:
     python examples/docqa/lance-rag-movies.py
 
 Optional arguments:
 -nc : turn off caching (i.e. don't retrieve cached LLM responses)
 -d: debug mode, to show all intermediate results
+--reset: delete the ingested movies and start over
 """
 
 import pandas as pd
@@ -29,13 +34,14 @@ from rich import print
 from rich.prompt import Prompt
 
 from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
-from langroid.agent.special.lance_doc_chat_agent import LanceDocChatAgent
 from langroid.agent.special.lance_rag.lance_rag_task import LanceRAGTaskCreator
 from langroid.embedding_models.models import OpenAIEmbeddingsConfig
 from langroid.utils.configuration import Settings, set_global
 from langroid.utils.system import rmdir
 from langroid.vector_store.lancedb import LanceDBConfig
 
+from examples.docqa.lance_ingest import ingest_csv, make_lance_agent
+
 app = typer.Typer()
 
 
@@ -44,6 +50,7 @@ def main(
     debug: bool = typer.Option(False, "--debug", "-d", help="debug mode"),
     model: str = typer.Option("", "--model", "-m", help="model name"),
     nocache: bool = typer.Option(False, "--nocache", "-nc", help="don't use cache"),
+    reset: bool = typer.Option(False, "--reset", help="ingest the movies again"),
 ) -> None:
     # Global settings: debug, cache
     set_global(
@@ -59,13 +66,8 @@ def main(
 
     # Get movies data
     ldb_dir = ".lancedb/data/imdb-reviews"
-    rmdir(ldb_dir)
-    ldb_cfg = LanceDBConfig(
-        cloud=False,
-        collection_name="chat-lance-imdb",
-        storage_path=ldb_dir,
-        embedding=embed_cfg,
-    )
+    if reset:
+        rmdir(ldb_dir)
 
     print(
         """
@@ -76,7 +78,7 @@ def main(
         description, votes, director.
         
         To keep things speedy, we'll restrict the dataset to movies
-        of a specific genre that you can choose.
+        of a specific genre that you can choose (or All of them).
         """
     )
     genre = Prompt.ask(
@@ -102,50 +104,66 @@ def main(
             "Thriller",
             "War",
             "Western",
+            "All",
         ],
     )
+    ldb_cfg = LanceDBConfig(
+        cloud=False,
+        collection_name=f"chat-lance-imdb-{genre.lower()}",
+        storage_path=ldb_dir,
+        embedding=embed_cfg,
+    )
     cfg = DocChatAgentConfig(
         vecdb=ldb_cfg,
         add_fields_to_content=["movie", "genre", "certificate", "stars", "rating"],
         filter_fields=["genre", "certificate", "rating"],
+        # fuzzy matching would scan (and first preprocess) every movie
+        use_fuzzy_match=False,
     )
-    agent = LanceDocChatAgent(cfg)
+    agent = make_lance_agent(cfg)
 
-    # READ IN AND CLEAN THE DATA
-    df = pd.read_csv("examples/docqa/data/movies/IMDB.csv")
+    # CLEAN THE DATA, one batch of rows at a time
+    def clean(df):
+        # Clean the 'votes' column: remove commas and convert to integer,
+        # 0 if that fails (a batch may have been read as numbers already)
+        votes = df["votes"].astype(str).str.replace(",", "")
+        df["votes"] = pd.to_numeric(votes, errors="coerce").fillna(0).astype(int)
 
-    def clean_votes(value):
-        """Clean the votes column"""
-        # Remove commas and convert to integer, if fails return 0
-        try:
-            return int(value.replace(",", ""))
-        except ValueError:
-            return 0
+        # Clean the 'rating' column
+        df["rating"] = df["rating"].fillna(0.0).astype(float)
 
-    # Clean the 'votes' column
-    df["votes"] = df["votes"].fillna("0").apply(clean_votes)
+        # Replace missing values in all other columns with '??'
+        df = df.fillna("??")
+        df["description"] = df["description"].replace("", "unknown")
 
-    # Clean the 'rating' column
-    df["rating"] = df["rating"].fillna(0.0).astype(float)
+        # get the rows where the chosen genre is in the genre column
+        if genre != "All":
+            df = df[df["genre"].str.contains(genre)]
+        return df
 
-    # Replace missing values in all other columns with '??'
-    df.fillna("??", inplace=True)
-    df["description"].replace("", "unknown", inplace=True)
+    print(f"[blue]Loading {genre} movies, hang on...")
 
-    # get the rows where 'Crime' is in the genre column
-    df = df[df["genre"].str.contains(genre)]
+    def show_progress(stats):
+        print(
+            f"[blue]{stats['rows']:,.0f} movies loaded "
+            f"({stats['rows_per_sec']:,.0f} rows/s)",
+            end="\r",
+        )
 
+    # INGEST THE CSV into the LanceDocChatAgent, resuming if interrupted
+    metadata_cols = []
+    stats = ingest_csv(
+        agent,
+        "examples/docqa/data/movies/IMDB.csv",
+        content="description",
+        metadata=metadata_cols,
+        prepare=clean,
+        on_batch=show_progress,
+    )
     print(
-        f"""
-    [blue]There are {df.shape[0]} movies in {genre} genre, hang on while I load them...
-    """
+        f"[blue]{stats['rows']:,.0f} movies loaded, "
+        f"{stats['new_rows']:,.0f} of them in this run"
     )
-    # sample 1000 rows for faster testing
-    df = df.sample(1000)
-
-    # INGEST THE DataFrame into the LanceDocChatAgent
-    metadata_cols = []
-    agent.ingest_dataframe(df, content="description", metadata=metadata_cols)
     df_description = agent.df_description
 
     # inform user about the df_description, in blue
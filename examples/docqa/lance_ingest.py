@@ -0,0 +1,302 @@
+"""
+Streaming, resumable DataFrame ingestion for a LanceDocChatAgent.
+
+`LanceDocChatAgent.ingest_dataframe` takes the whole DataFrame at once: it
+embeds every row before writing any, holds all the vectors in memory (as
+Python lists, in a pandas column), and if it is interrupted nothing is kept.
+On the full IMDB dataset that is slow enough that `lance-rag-movies.py`
+used to ingest a sample of 1,000 rows.
+
+`ingest_dataframe_batches` instead takes the rows as a stream of DataFrames
+(`ingest_csv` reads a CSV file in batches of `batch_rows` rows) and for
+each batch:
+
+- applies the caller's `prepare` (cleaning, filtering) and the agent's
+  `add_fields_to_content`, as `ingest_dataframe` does;
+- embeds the content on one of `workers` threads, so several batches are
+  embedded at once while earlier ones are being written;
+- writes the rows, with their vectors as a fixed-size float32 column, to
+  the LanceDB table as one Arrow table, in order;
+- records in a checkpoint file (under `.langroid-checkpoints/`) that the
+  batch is done.
+
+Row ids are derived from (source, row number, content), so when an
+interrupted run is started again it skips the batches that were written,
+deletes whatever part of an interrupted batch got written, and carries on
+from there. The checkpoint also stores the source's fingerprint and the
+settings that shape the rows (parsing, embedding model, batch size); if
+any of them changed, ingestion starts over with an empty table.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
+from langroid.agent.special.lance_doc_chat_agent import LanceDocChatAgent
+from langroid.parsing.table_loader import describe_dataframe
+from langroid.utils.pydantic_utils import (
+    dataframe_to_document_model,
+    dataframe_to_documents,
+)
+from langroid.vector_store.lancedb import LanceDB
+
+from examples.docqa.chunk_store import delete_chunks
+from examples.docqa.ingest_manifest import settings_hash
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = ".langroid-checkpoints"
+ROW_ID_NAMESPACE = uuid.UUID("0b6f3c52-3a2e-4d6e-9f0c-2f4d8c1e7a90")
+
+
+def row_id(source: str, row: int, content: str) -> str:
+    return str(uuid.uuid5(ROW_ID_NAMESPACE, f"{source}\n{row}\n{content}"))
+
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def make_lance_agent(config: DocChatAgentConfig) -> LanceDocChatAgent:
+    """
+    A LanceDocChatAgent whose collection may already hold (part of) a
+    DataFrame: DocChatAgent would load such a table as plain Documents when
+    it is created, and fail, so the vector store is attached afterwards.
+    """
+    vecdb_config = config.vecdb
+    config.vecdb = None
+    agent = LanceDocChatAgent(config)
+    config.vecdb = vecdb_config
+    agent.vecdb = LanceDB(vecdb_config)  # type: ignore
+    return agent
+
+
+class IngestCheckpoint:
+    """How far ingestion into one collection got, saved after every batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    @staticmethod
+    def for_collection(collection: str, directory: str = CHECKPOINT_DIR) -> str:
+        return os.path.join(directory, f"lancedb-{collection}.json")
+
+    def matches(self, key: Dict[str, Any]) -> bool:
+        return all(self.state.get(k) == v for k, v in key.items())
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def _document_frame(
+    agent: LanceDocChatAgent,
+    df: pd.DataFrame,
+    source: str,
+    content: str,
+    metadata: List[str],
+) -> Tuple[pd.DataFrame, List[str]]:
+    """The rows of a batch as stored: a "content" column and a stable "id"."""
+    fields = [f for f in agent.config.add_fields_to_content if f in df.columns]
+    if len(fields) > 0:
+        prefix = df[fields[0]].astype(str).radd(f"{fields[0]}=")
+        for f in fields[1:]:
+            prefix = prefix + f",{f}=" + df[f].astype(str)
+        df = df.assign(**{content: prefix + ", content=" + df[content].astype(str)})
+    if content != "content":
+        df = df.rename(columns={content: "content"})
+    if "id" not in df.columns:
+        rows = df.index.to_numpy()
+        df = df.assign(
+            id=[row_id(source, int(r), c) for r, c in zip(rows, df["content"])]
+        )
+    return df.reset_index(drop=True), list(dict.fromkeys(metadata + ["id"]))
+
+
+def _arrow_batch(df: pd.DataFrame, vectors: List[List[float]]) -> Any:
+    import pyarrow as pa
+
+    array = np.asarray(vectors, dtype=np.float32)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    column = pa.FixedSizeListArray.from_arrays(
+        pa.array(array.ravel()), array.shape[1]
+    )
+    return table.append_column("vector", column)
+
+
+def ingest_dataframe_batches(
+    agent: LanceDocChatAgent,
+    batches: Iterable[pd.DataFrame],
+    source: str,
+    content: str = "content",
+    metadata: List[str] = [],
+    prepare: Callable[[pd.DataFrame], pd.DataFrame] | None = None,
+    workers: int = 4,
+    checkpoint_dir: str = CHECKPOINT_DIR,
+    on_batch: Callable[[Dict[str, float]], None] | None = None,
+) -> Dict[str, float]:
+    """
+    Embed and store a stream of DataFrames in the agent's LanceDB collection,
+    resuming an interrupted run over the same source.
+
+    Args:
+        agent: the LanceDocChatAgent to ingest into, e.g. from
+            `make_lance_agent`.
+        batches: the rows, in batches; their index must number the rows of
+            the source (as `pd.read_csv(..., chunksize=n)` does), and be the
+            same every time the source is ingested.
+        source: identifies the data, e.g. `file_fingerprint(path)`; a
+            checkpoint for a different source is discarded.
+        content: name of the text column to embed.
+        metadata: names of metadata columns.
+        prepare: applied to every batch first, e.g. to clean or filter rows;
+            it must do the same each run for resuming to be correct.
+        workers: batches embedded at the same time.
+        checkpoint_dir: where checkpoints are kept, one per collection.
+        on_batch: called with the running stats after each batch.
+
+    Returns:
+        stats: rows (stored in total), new_rows (embedded in this run),
+            skipped_rows (already stored by an earlier run), seconds and
+            rows_per_sec (new rows over seconds).
+    """
+    vecdb = agent.vecdb
+    collection = vecdb.config.collection_name
+    checkpoint = IngestCheckpoint(
+        IngestCheckpoint.for_collection(collection, checkpoint_dir)
+    )
+    key = dict(source=source, settings=settings_hash(agent.config))
+    if not (
+        checkpoint.matches(key) and collection in vecdb.list_collections(empty=True)
+    ):
+        vecdb.delete_collection(collection)
+        checkpoint.state = dict(key, batches_done=0, pending=None, rows=0)
+        checkpoint.save()
+    done = checkpoint.state["batches_done"]
+    stats = dict(
+        rows=float(checkpoint.state["rows"]),
+        new_rows=0.0,
+        skipped_rows=float(checkpoint.state["rows"]),
+        seconds=0.0,
+        rows_per_sec=0.0,
+    )
+    start = time.perf_counter()
+    frames: List[pd.DataFrame] = []  # all rows (without vectors), to describe
+    metadata_cols = list(dict.fromkeys(metadata + ["id"]))
+
+    def write(i: int, df: pd.DataFrame, vectors: Future | None) -> None:
+        if vectors is not None:
+            batch = _arrow_batch(df, vectors.result())
+            if checkpoint.state["pending"] == i:  # partly written before
+                delete_chunks(vecdb, df["id"].tolist())
+            checkpoint.state["pending"] = i
+            checkpoint.save()
+            if collection in vecdb.list_collections(empty=True):
+                table = vecdb.client.open_table(collection)
+                table.add(batch.cast(table.schema))
+            else:
+                vecdb.client.create_table(collection, data=batch, mode="overwrite")
+            checkpoint.state["rows"] += len(df)
+            stats["rows"] += len(df)
+            stats["new_rows"] += len(df)
+        checkpoint.state["batches_done"] = i + 1
+        checkpoint.state["pending"] = None
+        checkpoint.save()
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_sec"] = stats["new_rows"] / max(stats["seconds"], 1e-9)
+        if on_batch is not None:
+            on_batch(stats)
+
+    in_flight: Deque[Tuple[int, pd.DataFrame, Future | None]] = deque()
+    with ThreadPoolExecutor(workers, thread_name_prefix="embed") as pool:
+        for i, df in enumerate(batches):
+            if prepare is not None:
+                df = prepare(df)
+            df, metadata_cols = _document_frame(agent, df, source, content, metadata)
+            frames.append(df)
+            if i < done:
+                continue  # stored by an earlier run
+            vectors = None
+            if len(df) > 0:
+                vectors = pool.submit(vecdb.embedding_fn, df["content"].tolist())
+            in_flight.append((i, df, vectors))
+            if len(in_flight) >= workers:
+                write(*in_flight.popleft())
+        while len(in_flight) > 0:
+            write(*in_flight.popleft())
+
+    rows = pd.concat(frames, ignore_index=True)
+    if len(rows) == 0:
+        raise ValueError(f"No rows to ingest from {source}")
+    table = vecdb.client.open_table(collection)
+    table.create_fts_index("content", replace=True)
+    # what LanceDocChatAgent.ingest_dataframe sets up, for retrieval
+    vecdb.is_from_dataframe = True
+    vecdb.df_metadata_columns = metadata_cols
+    vecdb.config.document_class = dataframe_to_document_model(  # type: ignore
+        rows, content="content", metadata=metadata_cols
+    )
+    agent.from_dataframe = True
+    agent.df_description = describe_dataframe(
+        rows, filter_fields=agent.config.filter_fields, n_vals=10
+    )
+    docs = dataframe_to_documents(rows, content="content", metadata=metadata_cols)
+    for d in docs:
+        d.metadata.is_chunk = True
+    if agent.config.use_fuzzy_match:
+        agent.setup_documents(docs)
+    else:
+        # chunked_docs_clean is only needed by fuzzy matching, and takes
+        # longer to build than everything above on a large table
+        agent.chunked_docs = docs
+        agent.chunked_docs_clean = []
+    logger.info(
+        f"Ingested {stats['new_rows']:,.0f} rows into {collection} "
+        f"({stats['rows_per_sec']:,.0f} rows/s), "
+        f"{stats['skipped_rows']:,.0f} already there"
+    )
+    return stats
+
+
+def ingest_csv(
+    agent: LanceDocChatAgent,
+    path: str,
+    content: str = "content",
+    metadata: List[str] = [],
+    prepare: Callable[[pd.DataFrame], pd.DataFrame] | None = None,
+    batch_rows: int = 2000,
+    workers: int = 4,
+    checkpoint_dir: str = CHECKPOINT_DIR,
+    on_batch: Callable[[Dict[str, float]], None] | None = None,
+) -> Dict[str, float]:
+    """
+    `ingest_dataframe_batches` over a CSV file, read `batch_rows` rows at a
+    time; a changed file (size or mtime) or batch size is ingested afresh.
+    """
+    return ingest_dataframe_batches(
+        agent,
+        pd.read_csv(path, chunksize=batch_rows),
+        source=f"{file_fingerprint(path)}:{batch_rows}",
+        content=content,
+        metadata=metadata,
+        prepare=prepare,
+        workers=workers,
+        checkpoint_dir=checkpoint_dir,
+        on_batch=on_batch,
+    )
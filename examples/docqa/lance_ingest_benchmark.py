@@ -0,0 +1,168 @@
+"""
+Rows/sec of DataFrame ingestion into LanceDB with lance_ingest.py vs.
+`LanceDocChatAgent.ingest_dataframe`, and the cost of resuming an
+interrupted ingest.
+
+Writes a synthetic CSV of --rows rows with the columns of the IMDB movies
+dataset, and embeds with the local HashEmbeddings model, which sleeps
+--call-ms per call and --text-ms per text to stand in for a remote
+embedding API. Runs:
+
+- langroid: `pd.read_csv` then `LanceDocChatAgent.ingest_dataframe`
+  (which includes preprocessing every row for lexical search);
+- streaming, N workers: `ingest_csv` with N batches embedded at once;
+- interrupted + resumed: `ingest_csv` stopped half way (an exception from
+  `on_batch`), then run again: rows embedded by the second run, and whether
+  the table ends up with each row exactly once.
+
+Needs lancedb (pip install "langroid[lancedb]"):
+
+python3 -m examples.docqa.lance_ingest_benchmark --rows 20000
+"""
+
+import random
+import tempfile
+import time
+from typing import Dict
+
+import pandas as pd
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
+from langroid.agent.special.lance_doc_chat_agent import LanceDocChatAgent
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.utils.configuration import Settings, set_global
+from langroid.vector_store.lancedb import LanceDBConfig
+
+from examples.docqa.hash_embeddings import HashEmbeddings
+from examples.docqa.lance_ingest import ingest_csv, make_lance_agent
+
+app = typer.Typer()
+
+GENRES = ["Action", "Comedy", "Crime", "Drama", "Horror", "Romance", "Sci-Fi"]
+WORDS = "a detective hunts killer family secret town war love heist city".split()
+
+
+def write_movies_csv(path: str, n: int) -> None:
+    rng = random.Random(0)
+    pd.DataFrame(
+        dict(
+            movie=[f"Movie {i}" for i in range(n)],
+            genre=[", ".join(rng.sample(GENRES, 2)) for _ in range(n)],
+            runtime=[f"{rng.randint(80, 180)} min" for _ in range(n)],
+            certificate=[rng.choice(["PG", "PG-13", "R"]) for _ in range(n)],
+            rating=[round(rng.uniform(1, 10), 1) for _ in range(n)],
+            stars=[f"Star {rng.randint(0, 999)}" for _ in range(n)],
+            description=[" ".join(rng.choices(WORDS, k=30)) for _ in range(n)],
+            votes=[rng.randint(0, 100_000) for _ in range(n)],
+            director=[f"Director {rng.randint(0, 499)}" for _ in range(n)],
+        )
+    ).to_csv(path, index=False)
+
+
+class Interrupt(Exception):
+    pass
+
+
+@app.command()
+def main(
+    n_rows: int = typer.Option(20_000, "--rows", "-n", help="rows in the CSV"),
+    batch_rows: int = typer.Option(1000, "--batch-rows", "-b", help="rows/batch"),
+    workers: str = typer.Option("1,4", "--workers", "-w", help="comma-separated"),
+    call_ms: float = typer.Option(50, "--call-ms", help="latency per embed call"),
+    text_ms: float = typer.Option(0.05, "--text-ms", help="latency per text"),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    tmp = tempfile.mkdtemp(prefix="lance-ingest-")
+    csv = f"{tmp}/movies.csv"
+    write_movies_csv(csv, n_rows)
+    embedding = HashEmbeddings(
+        dims=128, delay=call_ms / 1000, delay_per_text=text_ms / 1000
+    )
+
+    def make_agent(name: str) -> LanceDocChatAgent:
+        return make_lance_agent(
+            DocChatAgentConfig(
+                llm=MockLMConfig(),
+                vecdb=LanceDBConfig(
+                    collection_name=name,
+                    storage_path=f"{tmp}/lancedb",
+                    embedding_model=embedding,
+                    # one embedding call per 256 rows, as with OpenAI's default
+                    batch_size=256,
+                ),
+                add_fields_to_content=["movie", "genre", "certificate", "rating"],
+                filter_fields=["genre", "certificate", "rating"],
+                use_fuzzy_match=False,
+            )
+        )
+
+    table = Table(title=f"{n_rows:,} rows, {batch_rows} rows/batch")
+    for col in ["method", "seconds", "rows/s", "rows embedded", "rows stored"]:
+        table.add_column(col, justify="right")
+
+    def add_row(name: str, agent: LanceDocChatAgent, stats: Dict[str, float]) -> None:
+        stored = agent.vecdb.client.open_table(agent.vecdb.config.collection_name)
+        ids = stored.to_arrow().column("id").to_pylist()
+        table.add_row(
+            name,
+            f"{stats['seconds']:.1f}",
+            f"{stats['new_rows'] / stats['seconds']:,.0f}",
+            f"{stats['new_rows']:,.0f}",
+            f"{len(ids):,}" + ("" if len(set(ids)) == len(ids) else " (dupes)"),
+        )
+
+    agent = make_agent("langroid")
+    start = time.perf_counter()
+    agent.ingest_dataframe(pd.read_csv(csv), content="description")
+    seconds = time.perf_counter() - start
+    add_row("langroid", agent, dict(seconds=seconds, new_rows=n_rows))
+
+    for w in [int(w) for w in workers.split(",")]:
+        agent = make_agent(f"streaming-{w}")
+        stats = ingest_csv(
+            agent,
+            csv,
+            content="description",
+            batch_rows=batch_rows,
+            workers=w,
+            checkpoint_dir=f"{tmp}/checkpoints",
+        )
+        add_row(f"streaming, {w} workers", agent, stats)
+
+    w = int(workers.split(",")[-1])
+
+    def stop_half_way(stats: Dict[str, float]) -> None:
+        if stats["rows"] >= n_rows / 2:
+            raise Interrupt()
+
+    agent = make_agent("resumed")
+    try:
+        ingest_csv(
+            agent,
+            csv,
+            content="description",
+            batch_rows=batch_rows,
+            workers=w,
+            checkpoint_dir=f"{tmp}/checkpoints",
+            on_batch=stop_half_way,
+        )
+    except Interrupt:
+        pass
+    agent = make_agent("resumed")
+    stats = ingest_csv(
+        agent,
+        csv,
+        content="description",
+        batch_rows=batch_rows,
+        workers=w,
+        checkpoint_dir=f"{tmp}/checkpoints",
+    )
+    add_row(f"resumed, {w} workers", agent, stats)
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
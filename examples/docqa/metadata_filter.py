@@ -0,0 +1,784 @@
+"""
+Metadata filters: one expression API for every vector store, compiled to
+each store's native filter, and evaluated in Python or from a columnar index.
+
+The docqa scripts write filters in the syntax of the vector store they use:
+
+- SQL-like, for LanceDB:
+    metadata.name = 'Beethoven' AND metadata.birth_year >= 1700
+  (=, ==, !=, <>, <, <=, >, >=, [NOT] IN (...), [NOT] LIKE '...',
+  IS [NOT] NULL, array_has(field, value), AND, OR, NOT and parentheses);
+- Qdrant JSON filters, e.g. from filter-multi-doc-query-plan.py:
+    {"should": [{"key": "metadata.name", "match": {"value": "Beethoven"}}]}
+  (must / should / must_not, match value/any/except/text, range, is_empty,
+  is_null, has_id);
+- Chroma JSON filters: {"name": "Beethoven"}, {"$and": [...]}, {"$or": [...]},
+  {"birth_year": {"$gte": 1700}} and $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin.
+
+`parse_filter` turns any of these into an expression (`Cond`, `And`, `Or`,
+`Not`), and expressions can also be built directly, independent of the store:
+
+    expr = (F("metadata.birth_year") >= 1700) & F("metadata.tags").has("piano")
+    where = compile_for(agent.vecdb, expr)  # Qdrant JSON, Chroma JSON or SQL
+
+`compile_for` compiles an expression once per store type (the result is
+cached). `compile_filter` turns a filter into a predicate over a document's
+dict (`doc.model_dump()`), and `MetadataIndex` evaluates it over the
+metadata of many documents at once, so an in-process store such as
+numpy_vecdb.py accepts the same filters as the store a script was written
+for. Field names are dotted paths; a name that is not found at the top level
+is looked up under `metadata`, so `name` and `metadata.name` both work. A
+list-valued field matches if any of its elements does (`!=` included).
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+_MISSING = object()
+
+COMPARISONS = ["==", "!=", "<", "<=", ">", ">="]
+# in / nin: any / none of the field's values are among the given ones;
+# like: SQL LIKE pattern; text: contains the text; has: a list field has the
+# value (== on lists, spelled the way SQL stores need it); empty: no values
+# (missing, None or []); null: None
+OPS = COMPARISONS + ["in", "nin", "like", "text", "has", "empty", "null"]
+
+
+class _Expr:
+    def __and__(self, other: "Expr") -> "Expr":
+        return And((self, other))  # type: ignore
+
+    def __or__(self, other: "Expr") -> "Expr":
+        return Or((self, other))  # type: ignore
+
+    def __invert__(self) -> "Expr":
+        return Not(self)  # type: ignore
+
+
+@dataclass(frozen=True)
+class Cond(_Expr):
+    key: str
+    op: str
+    value: Any = None
+
+    def __post_init__(self) -> None:
+        if self.op not in OPS:
+            raise ValueError(f"Unknown operator {self.op}")
+        if isinstance(self.value, (list, set)):  # hashable, so it can be cached
+            object.__setattr__(self, "value", tuple(self.value))
+
+    # so that e.g. `flag == True` and `flag == 1` are not the same cached filter
+    def _typed(self) -> Tuple[str, str, Any]:
+        value = self.value
+        if isinstance(value, tuple):
+            return self.key, self.op, tuple(_key(v) for v in value)
+        return self.key, self.op, _key(value)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Cond) and self._typed() == other._typed()
+
+    def __hash__(self) -> int:
+        return hash(self._typed())
+
+
+@dataclass(frozen=True)
+class And(_Expr):
+    args: Tuple["Expr", ...]
+
+
+@dataclass(frozen=True)
+class Or(_Expr):
+    args: Tuple["Expr", ...]
+
+
+@dataclass(frozen=True)
+class Not(_Expr):
+    arg: "Expr"
+
+
+Expr = Cond | And | Or | Not
+
+MATCH_ALL = And(())
+
+
+class F:
+    """A field, to build conditions: `F("metadata.birth_year") >= 1700`."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __eq__(self, value: Any) -> Cond:  # type: ignore
+        return Cond(self.key, "==", value)
+
+    def __ne__(self, value: Any) -> Cond:  # type: ignore
+        return Cond(self.key, "!=", value)
+
+    def __lt__(self, value: Any) -> Cond:
+        return Cond(self.key, "<", value)
+
+    def __le__(self, value: Any) -> Cond:
+        return Cond(self.key, "<=", value)
+
+    def __gt__(self, value: Any) -> Cond:
+        return Cond(self.key, ">", value)
+
+    def __ge__(self, value: Any) -> Cond:
+        return Cond(self.key, ">=", value)
+
+    def isin(self, values: Iterable[Any]) -> Cond:
+        return Cond(self.key, "in", tuple(values))
+
+    def notin(self, values: Iterable[Any]) -> Cond:
+        return Cond(self.key, "nin", tuple(values))
+
+    def like(self, pattern: str) -> Cond:
+        return Cond(self.key, "like", pattern)
+
+    def contains_text(self, text: str) -> Cond:
+        return Cond(self.key, "text", text)
+
+    def has(self, value: Any) -> Cond:
+        return Cond(self.key, "has", value)
+
+    def is_empty(self) -> Cond:
+        return Cond(self.key, "empty")
+
+    def is_null(self) -> Cond:
+        return Cond(self.key, "null")
+
+
+def all_of(exprs: Sequence[Expr]) -> Expr:
+    return exprs[0] if len(exprs) == 1 else And(tuple(exprs))
+
+
+def any_of(exprs: Sequence[Expr]) -> Expr:
+    return exprs[0] if len(exprs) == 1 else Or(tuple(exprs))
+
+
+def get_field(doc: Dict[str, Any], key: str) -> Any:
+    """Value at a dotted path in a document dict, or _MISSING."""
+    for root in [doc, doc.get("metadata")]:
+        value: Any = root
+        for part in key.split("."):
+            if not isinstance(value, dict) or part not in value:
+                value = _MISSING
+                break
+            value = value[part]
+        if value is not _MISSING:
+            return value
+    return _MISSING
+
+
+def _values(doc: Dict[str, Any], key: str) -> List[Any]:
+    value = get_field(doc, key)
+    if value is _MISSING or value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _key(value: Any) -> Tuple[bool, Any]:
+    """A value as equality sees it: booleans are not numbers, so True != 1
+    (as in Qdrant and LanceDB), while 1 == 1.0 still holds."""
+    return isinstance(value, bool), value
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    try:
+        match op:
+            case "=" | "==":
+                return bool(_key(a) == _key(b))
+            case "!=" | "<>":
+                return bool(_key(a) != _key(b))
+            case "<":
+                return bool(a < b)
+            case "<=":
+                return bool(a <= b)
+            case ">":
+                return bool(a > b)
+            case ">=":
+                return bool(a >= b)
+    except TypeError:  # e.g. comparing a str field with a number
+        return False
+    raise ValueError(f"Unknown operator {op}")
+
+
+def like_regex(pattern: str) -> re.Pattern:
+    return re.compile(
+        "".join(
+            ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+        ),
+        re.DOTALL,
+    )
+
+
+def value_test(cond: Cond) -> Callable[[Any], bool]:
+    """Test of a single value of the field, for the conditions that have one."""
+    op, value = cond.op, cond.value
+    if op in COMPARISONS:
+        return lambda v: _compare(op, v, value)
+    if op == "has":
+        return lambda v: _compare("==", v, value)
+    if op in ["in", "nin"]:
+        keys = {_key(v) for v in value}
+        return lambda v: _key(v) in keys
+    if op == "like":
+        regex = like_regex(value)
+        return lambda v: regex.fullmatch(str(v)) is not None
+    if op == "text":
+        return lambda v: value in str(v)
+    raise ValueError(f"No value test for {op}")
+
+
+def to_predicate(expr: Expr) -> Predicate:
+    """Predicate over document dicts."""
+    if isinstance(expr, And):
+        preds = [to_predicate(e) for e in expr.args]
+        return lambda d: all(p(d) for p in preds)
+    if isinstance(expr, Or):
+        preds = [to_predicate(e) for e in expr.args]
+        return lambda d: any(p(d) for p in preds)
+    if isinstance(expr, Not):
+        pred = to_predicate(expr.arg)
+        return lambda d: not pred(d)
+    key = expr.key
+    if expr.op == "empty":
+        return lambda d: len(_values(d, key)) == 0
+    if expr.op == "null":
+        return lambda d: get_field(d, key) is None
+    test = value_test(expr)
+    if expr.op == "nin":
+        return lambda d: not any(test(v) for v in _values(d, key))
+    return lambda d: any(test(v) for v in _values(d, key))
+
+
+# ---------------------------------------------------------------- SQL-like
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<str>'(?:[^']|'')*'|"(?:[^"\\]|\\.)*")
+        |(?P<num>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+        |(?P<op>==|!=|<>|<=|>=|=|<|>|\(|\)|,)
+        |(?P<word>[A-Za-z_][\w.]*|`[^`]+`)
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(where: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    where = where.rstrip()
+    while pos < len(where):
+        m = _TOKEN.match(where, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f"Cannot parse filter at: {where[pos:]!r}")
+        pos = m.end()
+        kind = m.lastgroup or ""
+        text = m.group(kind)
+        match kind:
+            case "str":
+                if text[0] == "'":
+                    tokens.append(("value", text[1:-1].replace("''", "'")))
+                else:
+                    tokens.append(("value", json.loads(text)))
+            case "num":
+                num = float(text)
+                tokens.append(("value", int(num) if num.is_integer() else num))
+            case "op":
+                tokens.append(("op", text))
+            case _:
+                upper = text.upper()
+                if upper in {"AND", "OR", "NOT", "IN", "IS", "LIKE"}:
+                    tokens.append(("kw", upper))
+                elif upper in {"TRUE", "FALSE"}:
+                    tokens.append(("value", upper == "TRUE"))
+                elif upper == "NULL":
+                    tokens.append(("kw", "NULL"))
+                else:
+                    tokens.append(("field", text.strip("`")))
+    return tokens
+
+
+class _SqlParser:
+    def __init__(self, where: str):
+        self.tokens = _tokenize(where)
+        self.pos = 0
+
+    def peek(self) -> Tuple[str, Any]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ("end", None)
+
+    def take(self, kind: str, value: Any = None) -> Any:
+        tok = self.peek()
+        if tok[0] != kind or (value is not None and tok[1] != value):
+            raise ValueError(f"Expected {value or kind}, got {tok[1]!r} in filter")
+        self.pos += 1
+        return tok[1]
+
+    def accept(self, kind: str, value: Any) -> bool:
+        if self.peek() == (kind, value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> Expr:
+        expr = self.or_expr()
+        if self.peek()[0] != "end":
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in filter")
+        return expr
+
+    def or_expr(self) -> Expr:
+        exprs = [self.and_expr()]
+        while self.accept("kw", "OR"):
+            exprs.append(self.and_expr())
+        return any_of(exprs)
+
+    def and_expr(self) -> Expr:
+        exprs = [self.not_expr()]
+        while self.accept("kw", "AND"):
+            exprs.append(self.not_expr())
+        return all_of(exprs)
+
+    def not_expr(self) -> Expr:
+        if self.accept("kw", "NOT"):
+            return Not(self.not_expr())
+        if self.accept("op", "("):
+            expr = self.or_expr()
+            self.take("op", ")")
+            return expr
+        return self.condition()
+
+    def condition(self) -> Expr:
+        key = self.take("field")
+        if key.lower() == "array_has" and self.accept("op", "("):
+            key = self.take("field")
+            self.take("op", ",")
+            value = self.take("value")
+            self.take("op", ")")
+            return Cond(key, "has", value)
+        if self.accept("kw", "IS"):
+            negate = self.accept("kw", "NOT")
+            self.take("kw", "NULL")
+            cond = Cond(key, "empty")
+            return Not(cond) if negate else cond
+        negate = self.accept("kw", "NOT")
+        if self.accept("kw", "IN"):
+            self.take("op", "(")
+            options = [self.take("value")]
+            while self.accept("op", ","):
+                options.append(self.take("value"))
+            self.take("op", ")")
+            return Cond(key, "nin" if negate else "in", tuple(options))
+        if self.accept("kw", "LIKE"):
+            cond = Cond(key, "like", self.take("value"))
+            return Not(cond) if negate else cond
+        if negate:
+            raise ValueError("NOT must be followed by IN or LIKE in filter")
+        op = self.take("op")
+        op = {"=": "==", "<>": "!="}.get(op, op)
+        if op not in COMPARISONS:
+            raise ValueError(f"Unexpected {op!r} in filter")
+        return Cond(key, op, self.take("value"))
+
+
+# ---------------------------------------------------------------- JSON
+
+_CHROMA_OPS = {
+    "$eq": "==",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+    "$in": "in",
+    "$nin": "nin",
+}
+_RANGE_OPS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _qdrant_condition(cond: Dict[str, Any]) -> Expr:
+    if any(k in cond for k in ["must", "should", "must_not"]):
+        return _qdrant_filter(cond)
+    if "has_id" in cond:
+        return Cond("metadata.id", "in", tuple(str(i) for i in cond["has_id"]))
+    if "is_empty" in cond:
+        return Cond(cond["is_empty"]["key"], "empty")
+    if "is_null" in cond:
+        return Cond(cond["is_null"]["key"], "null")
+    key = cond["key"]
+    if "match" in cond:
+        match = cond["match"]
+        if "value" in match:
+            return Cond(key, "==", match["value"])
+        if "any" in match:
+            return Cond(key, "in", tuple(match["any"]))
+        if "except" in match:
+            return Cond(key, "nin", tuple(match["except"]))
+        if "text" in match:
+            return Cond(key, "text", match["text"])
+    if "range" in cond:
+        bounds = cond["range"].items()
+        return all_of([Cond(key, _RANGE_OPS[k], b) for k, b in bounds if b is not None])
+    raise ValueError(f"Unsupported Qdrant filter condition: {cond}")
+
+
+def _qdrant_filter(spec: Dict[str, Any]) -> Expr:
+    exprs = [_qdrant_condition(c) for c in spec.get("must") or []]
+    should = [_qdrant_condition(c) for c in spec.get("should") or []]
+    if len(should) > 0:
+        exprs.append(any_of(should))
+    exprs += [Not(_qdrant_condition(c)) for c in spec.get("must_not") or []]
+    return MATCH_ALL if len(exprs) == 0 else all_of(exprs)
+
+
+def _chroma_filter(spec: Dict[str, Any]) -> Expr:
+    exprs: List[Expr] = []
+    for key, cond in spec.items():
+        if key == "$and":
+            exprs.append(all_of([_chroma_filter(c) for c in cond]))
+        elif key == "$or":
+            exprs.append(any_of([_chroma_filter(c) for c in cond]))
+        elif isinstance(cond, dict):
+            for op, value in cond.items():
+                if op not in _CHROMA_OPS:
+                    raise ValueError(f"Unsupported Chroma filter operator {op}")
+                exprs.append(Cond(key, _CHROMA_OPS[op], value))
+        else:
+            exprs.append(Cond(key, "==", cond))
+    return MATCH_ALL if len(exprs) == 0 else all_of(exprs)
+
+
+def parse_filter(where: str | None) -> Expr:
+    """Expression for a SQL-like or Qdrant/Chroma JSON filter."""
+    if where is None or where.strip() == "":
+        return MATCH_ALL
+    if where.lstrip().startswith("{"):
+        spec = json.loads(where)
+        if any(k in spec for k in ["must", "should", "must_not"]):
+            return _qdrant_filter(spec)
+        return _chroma_filter(spec)
+    return _SqlParser(where).parse()
+
+
+def compile_filter(where: str | None) -> Predicate:
+    """Predicate over document dicts for a SQL-like or Qdrant/Chroma JSON filter."""
+    return to_predicate(parse_filter(where))
+
+
+# ---------------------------------------------------------------- compilers
+
+
+def _sql_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    raise ValueError(f"Cannot write {value!r} in a SQL filter")
+
+
+def to_sql(expr: Expr) -> str:
+    """SQL-like filter, as LanceDB (and numpy_vecdb.py) take."""
+    if isinstance(expr, (And, Or)):
+        if len(expr.args) == 0:
+            raise ValueError("Empty AND/OR in a SQL filter")
+        joiner = " AND " if isinstance(expr, And) else " OR "
+        return joiner.join(
+            f"({to_sql(e)})" if isinstance(e, (And, Or)) else to_sql(e)
+            for e in expr.args
+        )
+    if isinstance(expr, Not):
+        return f"NOT ({to_sql(expr.arg)})"
+    key, op, value = expr.key, expr.op, expr.value
+    match op:
+        case "in" | "nin":
+            values = ", ".join(_sql_value(v) for v in value)
+            return f"{key} {'NOT ' if op == 'nin' else ''}IN ({values})"
+        case "like":
+            return f"{key} LIKE {_sql_value(value)}"
+        case "text":
+            if "%" in value or "_" in value:
+                raise ValueError(f"Cannot match text {value!r} with LIKE")
+            return f"{key} LIKE {_sql_value('%' + value + '%')}"
+        case "has":
+            return f"array_has({key}, {_sql_value(value)})"
+        case "empty" | "null":
+            return f"{key} IS NULL"
+    return f"{key} {'=' if op == '==' else op} {_sql_value(value)}"
+
+
+def _qdrant_cond(expr: Expr) -> Dict[str, Any]:
+    if isinstance(expr, And):
+        return dict(must=[_qdrant_cond(e) for e in expr.args])
+    if isinstance(expr, Or):
+        return dict(should=[_qdrant_cond(e) for e in expr.args])
+    if isinstance(expr, Not):
+        return dict(must_not=[_qdrant_cond(expr.arg)])
+    key, op, value = expr.key, expr.op, expr.value
+    match op:
+        case "==" | "has":
+            return dict(key=key, match=dict(value=value))
+        case "!=":
+            return dict(must_not=[dict(key=key, match=dict(value=value))])
+        case "in":
+            return dict(key=key, match=dict(any=list(value)))
+        case "nin":
+            return dict(key=key, match={"except": list(value)})
+        case "text":
+            return dict(key=key, match=dict(text=value))
+        case "like":
+            inner = value[1:-1]
+            if not (value.startswith("%") and value.endswith("%")) or any(
+                c in inner for c in "%_"
+            ):
+                raise ValueError(f"Qdrant cannot match LIKE {value!r}")
+            return dict(key=key, match=dict(text=inner))
+        case "empty":
+            return dict(is_empty=dict(key=key))
+        case "null":
+            return dict(is_null=dict(key=key))
+    range_op = {v: k for k, v in _RANGE_OPS.items()}[op]
+    return dict(key=key, range={range_op: value})
+
+
+def to_qdrant(expr: Expr) -> Dict[str, Any]:
+    """Qdrant filter, as a dict (json.dumps it for DocChatAgent's `filter`)."""
+    cond = _qdrant_cond(expr)
+    if any(k in cond for k in ["must", "should", "must_not"]):
+        return cond
+    return dict(must=[cond])
+
+
+_NEGATED = {
+    "==": "!=",
+    "!=": "==",
+    "<": ">=",
+    ">=": "<",
+    ">": "<=",
+    "<=": ">",
+    "in": "nin",
+    "nin": "in",
+}
+
+
+def to_chroma(expr: Expr, negate: bool = False) -> Dict[str, Any]:
+    """Chroma `where` filter; Chroma has no NOT, so negations are pushed down."""
+    if isinstance(expr, Not):
+        return to_chroma(expr.arg, not negate)
+    if isinstance(expr, (And, Or)):
+        parts = [to_chroma(e, negate) for e in expr.args]
+        if len(parts) == 1:
+            return parts[0]
+        is_and = isinstance(expr, And) != negate
+        return {"$and" if is_and else "$or": parts}
+    op = _NEGATED.get(expr.op, "") if negate else expr.op
+    chroma_op = {v: k for k, v in _CHROMA_OPS.items()}.get(op)
+    if chroma_op is None:
+        raise ValueError(f"Chroma filters cannot express {'NOT ' * negate}{expr}")
+    value = list(expr.value) if isinstance(expr.value, tuple) else expr.value
+    return {expr.key.removeprefix("metadata."): {chroma_op: value}}
+
+
+@lru_cache(maxsize=1024)
+def _compile(store: str, expr: Expr) -> str | None:
+    if expr == MATCH_ALL:
+        return None
+    match store:
+        case "QdrantDB":
+            return json.dumps(to_qdrant(expr))
+        case "ChromaDB":
+            return json.dumps(to_chroma(expr))
+    return to_sql(expr)  # LanceDB, and the in-process stores here
+
+
+def compile_for(vecdb: Any, expr: Expr) -> str | None:
+    """
+    The filter string for `expr` in the syntax of `vecdb` (a VectorStore, or
+    None for SQL), to set as DocChatAgent's `filter`; None matches everything.
+    """
+    return _compile(type(vecdb).__name__, expr)
+
+
+# ---------------------------------------------------------------- index
+
+
+class _Column:
+    """The values of one field, by row: each distinct value's rows, and the
+    numbers sorted, for ranges."""
+
+    def __init__(self) -> None:
+        self.postings: Dict[Any, List[int]] = {}  # _key(value) -> rows, in order
+        self.value_rows: List[int] = []  # a row per value, for counts
+        self.null_rows: List[int] = []
+        self.numbers: List[float] = []
+        self.number_rows: List[int] = []
+        self.indexable = True  # False once a value is a dict or a list in a list
+        self._cache: Dict[Any, np.ndarray] = {}
+
+    def add(self, row: int, value: Any) -> None:
+        self._cache.clear()
+        if value is None:
+            self.null_rows.append(row)
+            return
+        for v in value if isinstance(value, list) else [value]:
+            if isinstance(v, (dict, list)):
+                self.indexable = False
+                continue
+            self.postings.setdefault(_key(v), []).append(row)
+            self.value_rows.append(row)
+            if isinstance(v, (int, float)):
+                self.numbers.append(float(v))
+                self.number_rows.append(row)
+
+    def _cached(self, key: Any, make: Callable[[], np.ndarray]) -> np.ndarray:
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    def rows_of(self, value: Any) -> np.ndarray:
+        return self._cached(
+            ("value", _key(value)),
+            lambda: np.unique(np.array(self.postings.get(_key(value), []), np.int64)),
+        )
+
+    def rows_where(self, test: Callable[[Any], bool]) -> np.ndarray:
+        """Rows with a value passing `test`, testing each distinct value once."""
+        parts = [
+            np.array(r, np.int64) for (_, v), r in self.postings.items() if test(v)
+        ]
+        return np.unique(np.concatenate(parts + [np.empty(0, np.int64)]))
+
+    def counts(self, n: int, rows: np.ndarray | None = None) -> np.ndarray:
+        """Number of values of each row (of `rows`, a row per value, if given)."""
+        if rows is None:
+            rows = self._cached(
+                "value_rows", lambda: np.array(self.value_rows, np.int64)
+            )
+        return np.bincount(rows, minlength=n)
+
+    def sorted_numbers(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The field's numbers, sorted (NaN left out), and their rows."""
+        if "numbers" not in self._cache:
+            numbers = np.array(self.numbers, dtype=np.float64)
+            rows = np.array(self.number_rows, dtype=np.int64)
+            keep = ~np.isnan(numbers)
+            order = np.argsort(numbers[keep], kind="stable")
+            self._cache["numbers"] = numbers[keep][order]
+            self._cache["number_rows"] = rows[keep][order]
+        return self._cache["numbers"], self._cache["number_rows"]
+
+
+class MetadataIndex:
+    """
+    Columnar index of the fields of a collection's documents, by row, to
+    evaluate filter expressions without reading or parsing the documents.
+
+    Each field (a dotted path; lists are indexed by element) keeps the rows
+    of each distinct value, its numbers sorted, and its None rows. `rows`
+    returns the matching rows as a sorted array, built from the postings of
+    the values the filter names: equality, IN and ranges cost about as much
+    as the rows they match, and AND intersects from the smallest side. LIKE
+    and text matches test each distinct value once. Expressions the index
+    cannot answer exactly (e.g. on `content`, or on a field with nested
+    values) return None, for the caller to test documents one by one.
+    """
+
+    UNINDEXED = {"content"}
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.columns: Dict[str, _Column] = {}
+        self.branches: Set[str] = set()  # paths holding dicts
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _add_field(self, row: int, path: str, value: Any) -> None:
+        if isinstance(value, dict):
+            self.branches.add(path)
+            for k, v in value.items():
+                self._add_field(row, f"{path}.{k}", v)
+            return
+        self.columns.setdefault(path, _Column()).add(row, value)
+
+    def add(self, docs: Sequence[Dict[str, Any]]) -> None:
+        """Index documents (as dicts), as the next rows."""
+        for row, doc in enumerate(docs, start=self.n):
+            for key, value in doc.items():
+                if key not in self.UNINDEXED:
+                    self._add_field(row, key, value)
+        self.n += len(docs)
+
+    def _column(self, key: str) -> _Column | None:
+        """The field's column (as `get_field` resolves it), None if unindexed."""
+        paths = [key, "metadata." + key]
+        if any(p.split(".")[0] in self.UNINDEXED or p in self.branches for p in paths):
+            return None
+        found = [self.columns[p] for p in paths if p in self.columns]
+        if len(found) > 1:
+            return None  # depends on the row which one applies
+        column = found[0] if len(found) == 1 else _Column()
+        return column if column.indexable else None
+
+    def rows(self, expr: Expr) -> np.ndarray | None:
+        """Sorted rows matching the expression, or None if not answerable."""
+        all_rows = np.arange(self.n)
+        if isinstance(expr, (And, Or)):
+            parts = []
+            for e in expr.args:
+                rows = self.rows(e)
+                if rows is None:
+                    return None
+                parts.append(rows)
+            if len(parts) == 0:
+                return all_rows
+            if isinstance(expr, Or):
+                return np.unique(np.concatenate(parts))
+            parts.sort(key=len)
+            result = parts[0]
+            for rows in parts[1:]:
+                result = np.intersect1d(result, rows, assume_unique=True)
+            return result
+        if isinstance(expr, Not):
+            rows = self.rows(expr.arg)
+            return None if rows is None else np.setdiff1d(all_rows, rows, True)
+        column = self._column(expr.key)
+        if column is None:
+            return None
+        op, value = expr.op, expr.value
+        try:
+            hash(value)
+        except TypeError:
+            return None
+        match op:
+            case "==" | "has":
+                return column.rows_of(value)
+            case "in" | "nin":
+                rows = np.unique(
+                    np.concatenate(
+                        [column.rows_of(v) for v in value] + [np.empty(0, np.int64)]
+                    )
+                )
+                return rows if op == "in" else np.setdiff1d(all_rows, rows, True)
+            case "!=":
+                # rows with a value other than `value`
+                equal = np.array(column.postings.get(_key(value), []), np.int64)
+                counts = column.counts(self.n)
+                return np.flatnonzero(counts > column.counts(self.n, equal))
+            case "empty":
+                return np.flatnonzero(column.counts(self.n) == 0)
+            case "null":
+                return np.unique(np.array(column.null_rows, np.int64))
+            case "<" | "<=" | ">" | ">=" if isinstance(value, (int, float)):
+                numbers, rows = column.sorted_numbers()
+                side = "left" if op in ["<", ">="] else "right"
+                i = int(np.searchsorted(numbers, float(value), side=side))
+                return np.unique(rows[:i] if op in ["<", "<="] else rows[i:])
+        return column.rows_where(value_test(expr))
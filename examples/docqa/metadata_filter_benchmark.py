@@ -0,0 +1,126 @@
+"""
+Cost of filtered search in numpy_vecdb.py, answering filters from the
+columnar metadata index (`MetadataIndex`) vs. testing every document, for
+selective and broad filters.
+
+Builds a collection of --docs documents with musician-like metadata (name,
+birth_year, genre, tags) and random vectors, then for each filter
+(written with the `F` expression API and compiled to SQL, as for LanceDB):
+
+- scan ms: reading and testing every document, as without the index;
+- index ms: evaluating the filter on the index;
+- search ms: index filter plus a top-10 search over the matching rows;
+  "no filter" searches the whole collection, for comparison.
+
+Results are checked to be the same both ways.
+
+python3 -m examples.docqa.metadata_filter_benchmark --docs 100000
+"""
+
+import random
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.metadata_filter import F, compile_for
+from examples.docqa.numpy_vecdb import Collection
+
+app = typer.Typer()
+
+GENRES = ["classical", "jazz", "rock", "pop", "folk", "blues", "soul", "metal"]
+
+
+@app.command()
+def main(
+    n_docs: int = typer.Option(100_000, "--docs", "-n", help="documents"),
+    dims: int = typer.Option(64, "--dims", "-d", help="vector dimensions"),
+    n_queries: int = typer.Option(20, "--queries", "-q", help="searches per filter"),
+) -> None:
+    rng = random.Random(0)
+    docs = []
+    for i in range(n_docs):
+        name = f"musician-{rng.randrange(1000)}"
+        metadata = dict(
+            id=str(i),
+            source=f"{name}.txt",
+            name=name,
+            birth_year=rng.randrange(1500, 2000),
+            genre=rng.choice(GENRES),
+            tags=rng.sample([f"tag-{t}" for t in range(40)], rng.randint(1, 3)),
+        )
+        docs.append(dict(content=f"Chunk {i} about {name}.", metadata=metadata))
+    vectors = np.random.default_rng(0).standard_normal((n_docs, dims))
+    queries = np.random.default_rng(1).standard_normal((n_queries, dims))
+
+    directory = tempfile.TemporaryDirectory(prefix="filter-bench-")
+    coll = Collection(directory.name, dims)
+    for i in range(0, n_docs, 10_000):
+        coll.add(
+            [d["metadata"]["id"] for d in docs[i : i + 10_000]],
+            vectors[i : i + 10_000].astype(np.float32),
+            docs[i : i + 10_000],
+        )
+    del docs
+    start = time.perf_counter()
+    coll.metadata_index()
+    build_seconds = time.perf_counter() - start
+
+    filters = [
+        ("one name", F("metadata.name") == "musician-7"),
+        ("one tag", F("metadata.tags").has("tag-3")),
+        (
+            "genre & era",
+            (F("metadata.genre") == "jazz") & (F("metadata.birth_year") >= 1900),
+        ),
+        (
+            "50 years",
+            (F("metadata.birth_year") >= 1700) & (F("metadata.birth_year") < 1750),
+        ),
+        ("not rock/pop", ~F("metadata.genre").isin(["rock", "pop"])),
+        ("since 1550", F("metadata.birth_year") >= 1550),
+    ]
+    table = Table(
+        title=f"filtered search over {n_docs:,} docs "
+        f"(metadata index built in {build_seconds:.2f}s)"
+    )
+    for col in ["filter", "matches", "scan ms", "index ms", "search ms"]:
+        table.add_column(col, justify="right")
+
+    def search_ms(rows: Optional[np.ndarray]) -> float:
+        start = time.perf_counter()
+        for q in queries:
+            coll.index.search(q, 10, rows=rows)
+        return 1000 * (time.perf_counter() - start) / n_queries
+
+    table.add_row("no filter", f"{len(coll):,}", "-", "-", f"{search_ms(None):.2f}")
+    for name, expr in filters:
+        where = compile_for(None, expr)
+        assert where is not None
+        timings = {}
+        for indexed in [False, True]:
+            coll.index_metadata = indexed
+            coll._filter_rows.clear()
+            start = time.perf_counter()
+            rows = coll.filter_rows(where)
+            timings[indexed] = (1000 * (time.perf_counter() - start), rows)
+        (scan_ms, scanned), (index_ms, rows) = timings[False], timings[True]
+        assert np.array_equal(scanned, rows), name
+        filtered_ms = search_ms(rows)
+        table.add_row(
+            name,
+            f"{len(rows):,} ({len(rows) / len(coll):.1%})",
+            f"{scan_ms:.1f}",
+            f"{index_ms:.2f}",
+            f"{index_ms + filtered_ms:.2f}",
+        )
+    print(table)
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,178 @@
+"""
+Latency of neighbor-window retrieval with neighbor_index.py vs. DocChatAgent's
+own `add_context_window`, on a synthetic collection.
+
+Builds a collection of --chunks chunks (--chunks-per-doc per document, with
+window ids as the parser stores them), embedded with the local HashEmbeddings
+model, then for each number k of neighbors on either side of a match,
+searches --queries random queries and expands their --hits matches into
+windows:
+
+- langroid: `DocChatAgent.add_context_window` (one `get_documents_by_ids`
+  call per window);
+- index: `NeighborDocChatAgent`, chunk texts from the agent's in-memory chunks;
+- index, cold: same, with no chunks in memory, so texts are fetched from the
+  vector store in one call.
+
+Both stores here run in-process, so --rtt milliseconds are added to every
+`get_documents_by_ids` call, standing in for the network round trip to a
+database server (use --rtt 0 to leave them out).
+
+python3 -m examples.docqa.neighbor_benchmark --chunks 50000 --vecdb qdrant
+"""
+
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.mytypes import DocMetaData, Document
+from langroid.parsing.parser import Parser, ParsingConfig
+from langroid.utils.configuration import Settings, set_global
+from langroid.vector_store.base import VectorStore
+from langroid.vector_store.qdrantdb import QdrantDB, QdrantDBConfig
+
+from examples.docqa.hash_embeddings import HashEmbeddings
+from examples.docqa.neighbor_index import (
+    NeighborDocChatAgent,
+    NeighborDocChatAgentConfig,
+)
+from examples.docqa.numpy_vecdb import NumpyVectorStore, NumpyVectorStoreConfig
+
+app = typer.Typer()
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+def make_chunks(n: int, per_doc: int, n_neighbor_ids: int) -> List[Document]:
+    rng = np.random.default_rng(0)
+    chunks = []
+    for d in range(0, n, per_doc):
+        doc_id = f"doc-{d // per_doc}"
+        for i in range(min(per_doc, n - d)):
+            words = " ".join(rng.choice(WORDS, 40))
+            chunks.append(
+                Document(
+                    content=f"{doc_id} chunk {i}: {words} ",
+                    metadata=DocMetaData(source=doc_id, id=doc_id, is_chunk=True),
+                )
+            )
+    Parser(ParsingConfig(n_neighbor_ids=n_neighbor_ids)).add_window_ids(chunks)
+    return chunks
+
+
+def make_vecdb(kind: str, dims: int) -> VectorStore:
+    path = tempfile.mkdtemp(prefix="neighbor-bench-")
+    embedding = HashEmbeddings(dims=dims)
+    if kind == "numpy":
+        return NumpyVectorStore(
+            NumpyVectorStoreConfig(
+                collection_name="neighbors",
+                storage_path=path,
+                embedding_model=embedding,
+            )
+        )
+    return QdrantDB(
+        QdrantDBConfig(
+            cloud=False,
+            collection_name="neighbors",
+            storage_path=path,
+            replace_collection=True,
+            embedding_model=embedding,
+        )
+    )
+
+
+@app.command()
+def main(
+    n_chunks: int = typer.Option(50_000, "--chunks", "-n", help="chunks to index"),
+    per_doc: int = typer.Option(100, "--chunks-per-doc", help="chunks per doc"),
+    vecdb_kind: str = typer.Option(
+        "qdrant", "--vecdb", "-v", help="qdrant (local) or numpy"
+    ),
+    n_queries: int = typer.Option(50, "--queries", "-q", help="queries per k"),
+    hits: int = typer.Option(5, "--hits", help="matches per query"),
+    max_k: int = typer.Option(5, "--max-k", "-k", help="largest k to try"),
+    rtt: float = typer.Option(
+        1.0, "--rtt", help="ms added to each vector-store lookup (network)"
+    ),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    chunks = make_chunks(n_chunks, per_doc, n_neighbor_ids=max_k)
+    vecdb = make_vecdb(vecdb_kind, dims=64)
+    start = time.perf_counter()
+    for i in range(0, len(chunks), 1000):
+        vecdb.add_documents(chunks[i : i + 1000])
+    add_seconds = time.perf_counter() - start
+
+    config = NeighborDocChatAgentConfig(
+        llm=MockLMConfig(),
+        vecdb=None,
+        neighbor_index_dir=tempfile.mkdtemp(prefix="neighbor-index-"),
+    )
+    stock = DocChatAgent(config)
+    stock.vecdb = vecdb
+    agent = NeighborDocChatAgent(config)
+    agent.vecdb = vecdb
+    start = time.perf_counter()
+    agent.neighbor_index.add(chunks)  # as setup_documents does on ingestion
+    index_seconds = time.perf_counter() - start
+    agent.chunked_docs = chunks
+    print(
+        f"{len(chunks):,} chunks: added to {vecdb_kind} in {add_seconds:.1f}s, "
+        f"neighbor index built in {index_seconds:.2f}s"
+    )
+
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(WORDS, 8)) for _ in range(n_queries)]
+    results = [vecdb.similar_texts_with_scores(q, k=hits) for q in queries]
+    if rtt > 0:
+        # both stores run in-process: add what a call to a database server costs
+        get_documents_by_ids = vecdb.get_documents_by_ids
+
+        def get_documents_by_ids_remote(ids: List[str]) -> List[Document]:
+            time.sleep(rtt / 1000)
+            return get_documents_by_ids(ids)
+
+        vecdb.get_documents_by_ids = get_documents_by_ids_remote  # type: ignore
+
+    table = Table(
+        title=f"window expansion, {hits} matches/query, {vecdb_kind}, rtt {rtt}ms"
+    )
+    for col in ["k", "method", "ms/query", "windows/query", "speedup"]:
+        table.add_column(col, justify="right")
+    in_memory = agent.chunked_docs
+    for k in range(1, max_k + 1):
+        config.n_neighbor_chunks = k
+        runs = [
+            ("langroid", stock, None),
+            ("index", agent, in_memory),
+            ("index, cold", agent, []),
+        ]
+        base = 0.0
+        for name, a, docs in runs:
+            if docs is not None:
+                a.chunked_docs = docs
+            start = time.perf_counter()
+            n_windows = sum(len(a.add_context_window(r)) for r in results)
+            ms = 1000 * (time.perf_counter() - start) / n_queries
+            base = base or ms
+            table.add_row(
+                str(k) if name == "langroid" else "",
+                name,
+                f"{ms:.2f}",
+                f"{n_windows / n_queries:.1f}",
+                f"{base / ms:.1f}x",
+            )
+        table.add_section()
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,318 @@
+"""
+Neighbor windows for retrieved chunks, from an adjacency index instead of
+vector-store lookups.
+
+With `n_neighbor_chunks` > 0, DocChatAgent expands each retrieved chunk into a
+window of the chunks around it: it takes the ids from the chunk's
+`metadata.window_ids` and fetches each window's chunks from the vector store
+with `get_documents_by_ids`, one round trip per window, then merges
+overlapping windows by comparing every pair.
+
+`NeighborDocChatAgent` instead keeps a `NeighborIndex`: for every chunk of the
+collection, the row of the chunk before and after it in its document, as an
+int32 array, built when chunks are ingested and saved next to the collection
+(under `.langroid-neighbors/` by default). A window is a walk along these links, so
+it is not limited to the `n_neighbor_ids` stored in the metadata; windows that
+overlap or touch are merged in one pass; and chunk texts come from the chunks
+the agent already holds in memory, with any others fetched in a single
+`get_documents_by_ids` call. Chunks ingested before the index existed still
+get their windows the old way.
+"""
+
+import copy
+import json
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from langroid.agent.special.doc_chat_agent import DocChatAgentConfig
+from langroid.mytypes import Document
+from langroid.utils.object_registry import ObjectRegistry
+from langroid.vector_store.base import VectorStore
+
+from examples.docqa.chunk_store import IndexedDocChatAgent
+
+NEIGHBOR_DIR = ".langroid-neighbors"
+
+PREV, NEXT = 0, 1
+
+
+class NeighborIndex:
+    """
+    Links between consecutive chunks of the same document, by row:
+    `links[row] = (previous row, next row)`, -1 at either end of a document.
+    `links.bin` and `ids.txt` are appended to; `manifest.json`, replaced last,
+    says how many rows are complete and holds the links of earlier rows that
+    a later add changed, so an interrupted update leaves the previous index
+    in place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.links_path = os.path.join(directory, "links.bin")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self._load()
+
+    @staticmethod
+    def for_vecdb(vecdb: VectorStore, directory: str = NEIGHBOR_DIR) -> str:
+        name = f"{type(vecdb).__name__.lower()}-{vecdb.config.collection_name}"
+        return os.path.join(directory, name)
+
+    def _load(self) -> None:
+        manifest = dict(n=0, relinked={})
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        n = manifest["n"]
+        self.links = np.empty((0, 2), dtype=np.int32)
+        self.ids: List[str] = []
+        if n > 0:
+            self.links = np.fromfile(self.links_path, np.int32, n * 2).reshape(n, 2)
+            with open(self.ids_path) as f:
+                self.ids = f.read().splitlines()[:n]
+        self._truncate()  # rows of an unfinished add
+        # json object keys are strings
+        self.relinked = {int(r): tuple(l) for r, l in manifest["relinked"].items()}
+        for row, link in self.relinked.items():
+            self.links[row] = link
+        self.row_of = {id: row for row, id in enumerate(self.ids)}
+
+    def _truncate(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.links_path, "ab") as f:
+            f.truncate(self.links.nbytes)
+        with open(self.ids_path, "w") as f:
+            f.writelines(i + "\n" for i in self.ids)
+
+    def _save(self) -> None:
+        manifest = dict(
+            n=len(self.ids),
+            relinked={str(r): [int(p), int(n)] for r, (p, n) in self.relinked.items()},
+        )
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def _append(self, ids: Sequence[str], links: np.ndarray) -> None:
+        with open(self.links_path, "ab") as f:
+            f.write(np.ascontiguousarray(links, dtype=np.int32).tobytes())
+        with open(self.ids_path, "a") as f:
+            f.writelines(i + "\n" for i in ids)
+
+    def _rewrite(self, ids: List[str], links: np.ndarray) -> None:
+        """Replace all rows (e.g. renumbered, or with the relinked rows folded in)."""
+        self.clear()  # the manifest lists no rows while the files are rewritten
+        self._append(ids, links)
+        self.ids, self.links = ids, links
+        self.row_of = {id: row for row, id in enumerate(ids)}
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.row_of
+
+    def add(self, chunks: Sequence[Document]) -> None:
+        """
+        Index chunks, linking each to its neighbors in `metadata.window_ids`.
+        Only the new rows are written; links that changed on rows already
+        indexed go in the manifest until they are a quarter of the index.
+        """
+        chunks = [c for c in chunks if c.metadata.is_chunk]
+        if len(chunks) == 0:
+            return
+        first = len(self.ids)
+        new = []
+        for c in chunks:
+            if c.id() not in self.row_of:
+                self.row_of[c.id()] = len(self.ids)
+                self.ids.append(c.id())
+                new.append(c.id())
+        links = np.full((len(self.ids), 2), -1, dtype=np.int32)
+        links[:first] = self.links
+        for c in chunks:
+            window = c.metadata.window_ids
+            if c.id() not in window:
+                continue
+            pos = window.index(c.id())
+            row = self.row_of[c.id()]
+            if pos > 0 and window[pos - 1] in self.row_of:
+                links[row, PREV] = self.row_of[window[pos - 1]]
+            if pos < len(window) - 1 and window[pos + 1] in self.row_of:
+                links[row, NEXT] = self.row_of[window[pos + 1]]
+        changed = np.flatnonzero((links[:first] != self.links).any(axis=1))
+        for row in changed.tolist():
+            self.relinked[row] = tuple(links[row].tolist())
+        self._append(new, links[first:])
+        self.links = links
+        if len(self.relinked) > len(self.ids) / 4:
+            self._rewrite(self.ids, self.links)
+        else:
+            self._save()
+
+    def discard(self, ids: Sequence[str]) -> None:
+        """Drop chunks (e.g. deleted from the collection), unlinking them."""
+        rows = [self.row_of[i] for i in ids if i in self.row_of]
+        if len(rows) == 0:
+            return
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[rows] = False
+        new_row = np.full(len(self.ids) + 1, -1, dtype=np.int32)  # [-1] -> -1
+        new_row[:-1][keep] = np.arange(int(keep.sum()), dtype=np.int32)
+        self._rewrite(
+            [id for id, k in zip(self.ids, keep) if k], new_row[self.links[keep]]
+        )
+
+    def clear(self) -> None:
+        self.ids, self.links, self.row_of = [], self.links[:0], {}
+        self.relinked = {}
+        self._save()
+        self._truncate()
+
+    def windows(self, hits: Sequence[str], neighbors: int) -> List[List[str]]:
+        """
+        Ids of the chunk windows around `hits` (chunk ids, best first), up to
+        `neighbors` chunks on each side; windows that overlap or touch are
+        merged. Windows are ordered by their best hit.
+        """
+        links = self.links
+        covered = set()
+        starts = []
+        for id in hits:
+            row = self.row_of[id]
+            starts.append(row)
+            covered.add(row)
+            for side in (PREV, NEXT):
+                r = row
+                for _ in range(neighbors):
+                    r = int(links[r, side])
+                    if r < 0:
+                        break
+                    covered.add(r)
+        windows: List[List[str]] = []
+        done = set()
+        for row in starts:
+            if row in done:
+                continue
+            while links[row, PREV] >= 0 and int(links[row, PREV]) in covered:
+                row = int(links[row, PREV])
+            window = []
+            while row >= 0 and row in covered and row not in done:
+                window.append(row)
+                done.add(row)
+                row = int(links[row, NEXT])
+            windows.append([self.ids[r] for r in window])
+        return windows
+
+
+class NeighborDocChatAgentConfig(DocChatAgentConfig):
+    neighbor_index_dir: str = NEIGHBOR_DIR  # one index per collection in here
+
+
+class NeighborDocChatAgent(IndexedDocChatAgent):
+    def __init__(self, config: NeighborDocChatAgentConfig):
+        # set before DocChatAgent.__init__, which may ingest docs
+        self._neighbor_index: NeighborIndex | None = None
+        # a replaced collection starts with an empty index
+        self._replace_index = config.vecdb is not None and (
+            config.vecdb.replace_collection
+        )
+        self._chunk_map: Tuple[int, int, Dict[str, Document]] = (0, 0, {})
+        super().__init__(config)
+        self.config: NeighborDocChatAgentConfig = config
+
+    @property
+    def neighbor_index(self) -> NeighborIndex:
+        """The index of the current collection (the agent may switch them)."""
+        if self.vecdb is None:
+            raise ValueError("VecDB not set")
+        directory = NeighborIndex.for_vecdb(
+            self.vecdb, self.config.neighbor_index_dir
+        )
+        if self._neighbor_index is None or self._neighbor_index.directory != directory:
+            self._neighbor_index = NeighborIndex(directory)
+            if self._replace_index:
+                self._neighbor_index.clear()
+                self._replace_index = False
+        return self._neighbor_index
+
+    def setup_documents(
+        self,
+        docs: List[Document] = [],
+        filter: str | None = None,
+    ) -> None:
+        # called with the chunks after every ingestion
+        if len(docs) > 0 and self.vecdb is not None:
+            self.neighbor_index.add(docs)
+        super().setup_documents(docs, filter=filter)
+
+    def clear(self) -> None:
+        if self.vecdb is not None:
+            self.neighbor_index.clear()
+        super().clear()
+
+    def on_chunks_deleted(self, ids: Sequence[str]) -> None:
+        if self.vecdb is not None:
+            self.neighbor_index.discard(ids)
+        super().on_chunks_deleted(ids)
+
+    def _chunks_by_id(self) -> Dict[str, Document]:
+        """Id -> chunk, for the chunks held in `self.chunked_docs`."""
+        n, list_id, chunks = self._chunk_map
+        if n != len(self.chunked_docs) or list_id != id(self.chunked_docs):
+            chunks = {d.id(): d for d in self.chunked_docs}
+            self._chunk_map = (len(self.chunked_docs), id(self.chunked_docs), chunks)
+        return chunks
+
+    def add_context_window(
+        self,
+        docs_scores: List[Tuple[Document, float]],
+    ) -> List[Tuple[Document, float]]:
+        if self.vecdb is None or self.config.n_neighbor_chunks == 0:
+            return docs_scores
+        if len(docs_scores) == 0:
+            return []
+        if set(docs_scores[0][0].model_fields) != {"content", "metadata"}:
+            # as in DocChatAgent: other fields can't be combined into a window
+            return docs_scores
+        index = self.neighbor_index
+        indexed = [(d, s) for d, s in docs_scores if d.id() in index]
+        others = [(d, s) for d, s in docs_scores if d.id() not in index]
+        if len(indexed) == 0:
+            return super().add_context_window(docs_scores)
+
+        best: Dict[str, Tuple[Document, float]] = {}
+        for d, s in indexed:
+            if d.id() not in best or s > best[d.id()][1]:
+                best[d.id()] = (d, s)
+        hits = sorted(best, key=lambda i: -best[i][1])
+        windows = index.windows(hits, self.config.n_neighbor_chunks)
+
+        in_memory = self._chunks_by_id()
+        chunks = {id: d for id, (d, _) in best.items()}
+        for id in (id for w in windows for id in w if id not in chunks):
+            if id in in_memory:
+                chunks[id] = in_memory[id]
+        missing = [id for w in windows for id in w if id not in chunks]
+        if len(missing) > 0:  # one round trip for all windows
+            chunks.update({d.id(): d for d in self.vecdb.get_documents_by_ids(missing)})
+
+        results = []
+        for window in windows:
+            window = [id for id in window if id in chunks]  # deleted meanwhile
+            score = max(best[id][1] for id in window if id in best)
+            metadata = copy.deepcopy(chunks[window[0]].metadata)
+            metadata.window_ids = window
+            document = Document(
+                content="".join(chunks[id].content for id in window),
+                metadata=metadata,
+            )
+            # make a fresh id since content is in general different
+            document.metadata.id = ObjectRegistry.new_id()
+            results.append((document, score))
+        if len(others) > 0:
+            results += super().add_context_window(others)
+        return results
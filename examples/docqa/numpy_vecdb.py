@@ -0,0 +1,633 @@
+"""
+In-process vector store: a NumPy matrix, memory-mapped from disk.
+
+For small and medium collections a vector database service (or even local
+Qdrant) is mostly overhead. `NumpyVectorStore` keeps each collection in a
+directory under `storage_path`:
+
+- vectors.f32: unit-normalized float32 rows, appended and memory-mapped, so
+  opening a collection reads nothing until it is searched;
+- docs.jsonl / ids.txt: each row's document (as JSON) and id;
+- deleted.txt: rows deleted since the last compaction;
+- meta.json: the vectors' dimensions and the compaction generation;
+- compact.json: only while a compaction swaps in its rewritten files;
+- ivf.centroids.npy / ivf.lists.i32 / ivf.json: the optional IVF index.
+
+Search is exact (one matrix-vector product) until a collection reaches
+`ivf_min_vectors`; from then on (with `index="auto"`) an inverted-file index
+is trained, with k-means centroids splitting the rows into about sqrt(n)
+lists, and a query only scores the rows in the `ivf_probe` lists whose
+centroids are closest to it (the IVF index keeps the vectors in list order
+in memory, a second copy next to the memory map). Filters (SQL-like or
+Qdrant/Chroma JSON, see metadata_filter.py) select rows first, from a
+columnar index of the documents' fields built in memory on the first filter
+(`MetadataIndex`); a selective filter is then searched exactly over just
+those rows.
+
+Langroid's `VectorStore.create` does not know this store, so create the
+agent without a vecdb and set it afterwards (as docqa/chat.py does):
+
+    agent = DocChatAgent(config)  # with config.vecdb = None
+    agent.vecdb = NumpyVectorStore(NumpyVectorStoreConfig(...))
+
+One process should write a given collection at a time.
+"""
+
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+
+from examples.docqa.metadata_filter import MetadataIndex, parse_filter, to_predicate
+from langroid.mytypes import Document
+from langroid.vector_store.base import VectorStore, VectorStoreConfig
+
+logger = logging.getLogger(__name__)
+
+# a filter matching at most this share of the rows is searched exactly
+EXACT_SEARCH_SHARE = 0.1
+
+
+class NumpyVectorStoreConfig(VectorStoreConfig):
+    collection_name: str | None = "temp"
+    storage_path: str = ".numpy-vecdb/data"
+    # "flat": always exact search; "ivf": IVF index whatever the size;
+    # "auto": exact search below ivf_min_vectors vectors, IVF from then on
+    index: Literal["auto", "flat", "ivf"] = "auto"
+    ivf_min_vectors: int = 50_000
+    ivf_lists: int = 0  # 0: about sqrt(#vectors)
+    ivf_probe: int = 64  # lists scored per query
+    # answer filters from an in-memory index of the documents' fields,
+    # instead of reading and testing every document
+    index_metadata: bool = True
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, chunk: int = 65_536) -> np.ndarray:
+    return np.concatenate(
+        [
+            np.argmax(x[i : i + chunk] @ centroids.T, axis=1).astype(np.int32)
+            for i in range(0, len(x), chunk)
+        ]
+        or [np.zeros(0, dtype=np.int32)]
+    )
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: k unit centroids for unit rows x."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(x[rng.choice(len(x), k, replace=False)])
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=k) == 0
+        # restart empty lists from random rows
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Append-only file of unit float32 vectors, searched exactly or via IVF.
+    Rows are numbered in insertion order; deleted rows are masked out until
+    `compact` rewrites the file.
+    """
+
+    def __init__(self, directory: str, dims: int):
+        self.dims = dims
+        self.path = os.path.join(directory, "vectors.f32")
+        self.centroids_path = os.path.join(directory, "ivf.centroids.npy")
+        self.lists_path = os.path.join(directory, "ivf.lists.i32")
+        self.ivf_info_path = os.path.join(directory, "ivf.json")
+        open(self.path, "ab").close()
+        self.n = os.path.getsize(self.path) // (4 * dims)
+        self.matrix = self._map()
+        self.live = np.ones(self.n, dtype=bool)
+        self.n_dead = 0
+        self.centroids: np.ndarray | None = None
+        self.assign = np.zeros(0, dtype=np.int32)  # IVF list of each row
+        self.n_trained = 0  # live rows when the IVF index was trained
+        # IVF lists: rows sorted by list, list offsets, and the rows' vectors
+        # in that order, so each list is scored as one contiguous block
+        self._lists: Tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+        self._n_listed = 0  # rows added later are scored exactly
+        if os.path.exists(self.ivf_info_path):
+            with open(self.ivf_info_path) as f:
+                self.n_trained = json.load(f)["n_trained"]
+            self.centroids = np.load(self.centroids_path)
+            assign = np.fromfile(self.lists_path, dtype=np.int32)[: self.n]
+            self.assign = np.concatenate(
+                [assign, _nearest(self.matrix[len(assign) :], self.centroids)]
+            )
+
+    def _map(self) -> np.ndarray:
+        if self.n == 0:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        return np.memmap(
+            self.path, dtype=np.float32, mode="r", shape=(self.n, self.dims)
+        )
+
+    def truncate(self, n: int) -> None:
+        """Drop rows from n on (e.g. vectors written before a crash)."""
+        os.truncate(self.path, n * 4 * self.dims)
+        self.n = n
+        self.matrix = self._map()
+        self.live = self.live[:n]
+        self.assign = self.assign[:n]
+        self.n_dead = int(n - self.live.sum())
+        self._lists = None
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append vectors (normalized here); returns their row numbers."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dims)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        with open(self.path, "ab") as f:
+            f.write(vectors.tobytes())
+        rows = np.arange(self.n, self.n + len(vectors))
+        self.n += len(vectors)
+        self.matrix = self._map()
+        self.live = np.concatenate([self.live, np.ones(len(vectors), dtype=bool)])
+        if self.centroids is not None:
+            assign = _nearest(vectors, self.centroids)
+            with open(self.lists_path, "ab") as f:
+                f.write(assign.tobytes())
+            self.assign = np.concatenate([self.assign, assign])
+        return rows
+
+    def delete(self, rows: Sequence[int]) -> None:
+        rows = np.asarray(rows, dtype=np.int64)
+        self.n_dead += int(self.live[rows].sum())
+        self.live[rows] = False
+
+    def train(self, n_lists: int = 0) -> None:
+        """(Re)build the IVF index over the live rows."""
+        live_rows = np.flatnonzero(self.live)
+        n_lists = n_lists or max(1, int(np.sqrt(len(live_rows))))
+        n_lists = min(n_lists, len(live_rows))
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(live_rows, min(len(live_rows), 64 * n_lists), replace=False)
+        )
+        self.centroids = kmeans(np.asarray(self.matrix[sample]), n_lists)
+        self.assign = _nearest(self.matrix, self.centroids)
+        self.n_trained = len(live_rows)
+        if os.path.exists(self.ivf_info_path):
+            os.remove(self.ivf_info_path)
+        np.save(self.centroids_path, self.centroids)
+        self.assign.tofile(self.lists_path)
+        # written last: the index is only used once this exists
+        with open(self.ivf_info_path, "w") as f:
+            json.dump(dict(n_trained=self.n_trained), f)
+        self._lists = None
+
+    def lists(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        n_new = self.n - self._n_listed
+        if self._lists is None or n_new > max(1000, self._n_listed // 10):
+            assert self.centroids is not None
+            rows = np.argsort(self.assign, kind="stable")
+            offsets = np.searchsorted(
+                self.assign[rows], np.arange(len(self.centroids) + 1)
+            )
+            vectors = np.empty((len(rows), self.dims), dtype=np.float32)
+            for i in range(0, len(rows), 65_536):
+                vectors[i : i + 65_536] = self.matrix[rows[i : i + 65_536]]
+            self._lists = (rows, offsets, vectors)
+            self._n_listed = self.n
+        return self._lists
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        n_probe: int = 0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k live rows most similar (cosine) to query, and their scores.
+
+        Args:
+            query: query vector.
+            k: number of results.
+            rows: only consider these rows (all live rows if None).
+            n_probe: IVF lists to score; 0 means exact search.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if n_probe > 0 and self.centroids is not None:
+            list_rows, offsets, list_vectors = self.lists()
+            probe = top_k(self.centroids @ query, n_probe)
+            blocks = [slice(offsets[i], offsets[i + 1]) for i in probe]
+            parts = [(list_rows[b], list_vectors[b] @ query) for b in blocks]
+            if self.n > self._n_listed:
+                new = np.arange(self._n_listed, self.n)
+                parts.append((new, self.matrix[self._n_listed :] @ query))
+            candidates = np.concatenate([c for c, _ in parts])
+            scores = np.concatenate([s for _, s in parts])
+            allowed = self.live
+            if rows is not None:
+                allowed = np.zeros(self.n, dtype=bool)
+                allowed[rows] = True
+                allowed &= self.live
+            keep = allowed[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+            best = top_k(scores, k)
+            return candidates[best], scores[best]
+        elif rows is not None:
+            candidates = np.asarray(rows)
+            candidates = candidates[self.live[candidates]]
+        elif self.n_dead > 0:
+            candidates = np.flatnonzero(self.live)
+        else:
+            scores = self.matrix @ query
+            best = top_k(scores, k)
+            return best, scores[best]
+        scores = self.matrix[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def write_compacted(self, keep: np.ndarray) -> List[str]:
+        """
+        Write just the `keep` rows (and their IVF lists) to a `.tmp` file
+        next to each of the index's files; returns the paths they replace.
+        """
+        with open(self.path + ".tmp", "wb") as f:
+            for i in range(0, len(keep), 65_536):
+                f.write(np.asarray(self.matrix[keep[i : i + 65_536]]).tobytes())
+        if self.centroids is None:
+            return [self.path]
+        self.assign[keep].tofile(self.lists_path + ".tmp")
+        return [self.path, self.lists_path]
+
+    def compacted(self, keep: np.ndarray) -> None:
+        """Switch to the files from `write_compacted` once they are in place."""
+        self.n = len(keep)
+        self.matrix = self._map()
+        self.live = np.ones(self.n, dtype=bool)
+        self.n_dead = 0
+        if self.centroids is not None:
+            self.assign = self.assign[keep]
+            self._lists = None
+
+
+class Collection:
+    """Documents and their vectors, in one directory."""
+
+    def __init__(self, directory: str, dims: int, index_metadata: bool = True):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.compact_path = os.path.join(directory, "compact.json")
+        self.docs_path = os.path.join(directory, "docs.jsonl")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.deleted_path = os.path.join(directory, "deleted.txt")
+        self.generation = 0  # number of compactions so far
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            dims = meta["dims"]
+            self.generation = meta.get("generation", 0)
+        else:
+            self._write_json(self.meta_path, dict(dims=dims, generation=0))
+        self.dims = dims
+        self._recover_compaction()
+        self.index = VectorIndex(directory, dims)
+        for p in [self.docs_path, self.ids_path, self.deleted_path]:
+            open(p, "ab").close()
+        with open(self.ids_path) as f:
+            self.ids = f.read().splitlines()
+        self.offsets = self._line_offsets()
+        # vectors, then docs, then ids are appended: after a crash, drop the
+        # tail rows that did not make it into all three files
+        n = min(self.index.n, len(self.offsets) - 1, len(self.ids))
+        if n < max(self.index.n, len(self.offsets) - 1, len(self.ids)):
+            self.index.truncate(n)
+            self.offsets = self.offsets[: n + 1]
+            os.truncate(self.docs_path, int(self.offsets[-1]))
+            self.ids = self.ids[:n]
+            with open(self.ids_path, "w") as f:
+                f.writelines(i + "\n" for i in self.ids)
+        with open(self.deleted_path) as f:
+            deleted = [r for r in map(int, f.read().split()) if r < n]
+        self.index.delete(deleted)
+        self.row_of = {
+            id: row for row, id in enumerate(self.ids) if self.index.live[row]
+        }
+        self._filter_rows: Dict[str, np.ndarray] = {}  # where -> matching rows
+        self.index_metadata = index_metadata
+        self._metadata: MetadataIndex | None = None  # built on the first filter
+
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def _recover_compaction(self) -> None:
+        """
+        Bring the files back in line after a crash during `compact`. With
+        compact.json present all rewritten files were complete, so finish
+        swapping them in; without it, drop whatever was partly written.
+        """
+        if os.path.exists(self.compact_path):
+            self._finish_compaction()
+            return
+        for path in [
+            os.path.join(self.directory, "vectors.f32"),
+            os.path.join(self.directory, "ivf.lists.i32"),
+            self.docs_path,
+            self.ids_path,
+        ]:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+
+    def _finish_compaction(self) -> None:
+        """Swap in the files listed in compact.json (again, if need be)."""
+        with open(self.compact_path) as f:
+            manifest = json.load(f)
+        if manifest["generation"] > self.generation:
+            for name in manifest["files"]:
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path + ".tmp"):
+                    os.replace(path + ".tmp", path)
+            # its rows are numbered before the compaction
+            open(self.deleted_path, "w").close()
+            self.generation = manifest["generation"]
+            self._write_json(
+                self.meta_path, dict(dims=self.dims, generation=self.generation)
+            )
+        os.remove(self.compact_path)
+
+    def _line_offsets(self) -> np.ndarray:
+        with open(self.docs_path, "rb") as f:
+            data = np.frombuffer(f.read(), dtype=np.uint8)
+        ends = np.flatnonzero(data == ord("\n")) + 1
+        return np.concatenate([[0], ends]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def add(self, ids: List[str], vectors: np.ndarray, docs: List[Dict]) -> None:
+        """Add (or replace, by id) documents as dicts with their vectors."""
+        self.delete([id for id in ids if id in self.row_of])
+        rows = self.index.add(vectors)
+        lines = [(json.dumps(d) + "\n").encode() for d in docs]
+        with open(self.docs_path, "ab") as f:
+            f.write(b"".join(lines))
+        with open(self.ids_path, "a") as f:
+            f.writelines(i + "\n" for i in ids)
+        ends = self.offsets[-1] + np.cumsum([len(line) for line in lines])
+        self.offsets = np.concatenate([self.offsets, ends])
+        self.ids.extend(ids)
+        self.row_of.update(zip(ids, rows.tolist()))
+        if self._metadata is not None:
+            self._metadata.add(docs)
+        self._filter_rows.clear()
+
+    def delete(self, ids: List[str]) -> int:
+        rows = [self.row_of.pop(id) for id in ids if id in self.row_of]
+        if len(rows) == 0:
+            return 0
+        self.index.delete(rows)
+        with open(self.deleted_path, "a") as f:
+            f.writelines(f"{r}\n" for r in rows)
+        self._filter_rows.clear()
+        if self.index.n_dead > max(1000, len(self)):
+            self.compact()
+        return len(rows)
+
+    def compact(self) -> None:
+        """
+        Rewrite vectors, docs and ids without the deleted rows. Every new file
+        is written to a `.tmp` file first; compact.json, written once they are
+        all complete, lists them, and only then are they swapped in. A crash
+        at any point thus leaves either the old or (after `_finish_compaction`
+        on the next open) the new rows in all files, never a mix.
+        """
+        keep = np.flatnonzero(self.index.live)
+        paths = self.index.write_compacted(keep)
+        with open(self.docs_path, "rb") as src, open(
+            self.docs_path + ".tmp", "wb"
+        ) as dst:
+            for row in keep:
+                src.seek(self.offsets[row])
+                dst.write(src.read(self.offsets[row + 1] - self.offsets[row]))
+        ids = [self.ids[r] for r in keep]
+        with open(self.ids_path + ".tmp", "w") as f:
+            f.writelines(i + "\n" for i in ids)
+        paths += [self.docs_path, self.ids_path]
+        self._write_json(
+            self.compact_path,
+            dict(
+                generation=self.generation + 1,
+                files=[os.path.basename(p) for p in paths],
+            ),
+        )
+        self._finish_compaction()
+        self.index.compacted(keep)
+        self.ids = ids
+        self.offsets = self._line_offsets()
+        self.row_of = {id: row for row, id in enumerate(self.ids)}
+        self._filter_rows.clear()
+        self._metadata = None
+
+    def docs(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        out = []
+        with open(self.docs_path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                size = self.offsets[row + 1] - self.offsets[row]
+                out.append(json.loads(f.read(size)))
+        return out
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.index.live)
+
+    def metadata_index(self) -> MetadataIndex:
+        """Index of the documents' fields, built from docs.jsonl on first use."""
+        if self._metadata is None:
+            self._metadata = MetadataIndex()
+            for start in range(0, len(self.ids), 10_000):
+                rows = range(start, min(start + 10_000, len(self.ids)))
+                self._metadata.add(self.docs(rows))
+        return self._metadata
+
+    def filter_rows(self, where: str) -> np.ndarray:
+        """Live rows whose document matches a filter (cached until a write)."""
+        if where not in self._filter_rows:
+            expr = parse_filter(where)
+            rows = None
+            if self.index_metadata:
+                rows = self.metadata_index().rows(expr)
+            if rows is not None:
+                rows = rows[self.index.live[rows]]
+            else:  # the index cannot answer it: test every document
+                pred = to_predicate(expr)
+                live = self.live_rows()
+                rows = [row for row, doc in zip(live, self.docs(live)) if pred(doc)]
+            self._filter_rows[where] = np.asarray(rows, dtype=np.int64)
+        return self._filter_rows[where]
+
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, config: NumpyVectorStoreConfig | None = None):
+        config = config if config is not None else NumpyVectorStoreConfig()
+        super().__init__(config)
+        self.config: NumpyVectorStoreConfig = config
+        self.collection: Collection | None = None
+        if self.config.collection_name is not None:
+            self.create_collection(
+                self.config.collection_name, replace=self.config.replace_collection
+            )
+
+    def _dir(self, collection_name: str) -> str:
+        return os.path.join(self.config.storage_path, collection_name)
+
+    def _count(self, collection_name: str) -> int:
+        if self.collection is not None and collection_name == (
+            self.config.collection_name
+        ):
+            return len(self.collection)
+        counts = []
+        for name in ["ids.txt", "deleted.txt"]:
+            with open(os.path.join(self._dir(collection_name), name), "rb") as f:
+                counts.append(f.read().count(b"\n"))
+        return counts[0] - counts[1]
+
+    def list_collections(self, empty: bool = False) -> List[str]:
+        if not os.path.isdir(self.config.storage_path):
+            return []
+        names = [
+            name
+            for name in sorted(os.listdir(self.config.storage_path))
+            if os.path.exists(os.path.join(self._dir(name), "meta.json"))
+        ]
+        return [n for n in names if empty or self._count(n) > 0]
+
+    def create_collection(self, collection_name: str, replace: bool = False) -> None:
+        self.config.collection_name = collection_name
+        if replace and os.path.isdir(self._dir(collection_name)):
+            logger.warning(f"Replacing existing collection {collection_name}")
+            shutil.rmtree(self._dir(collection_name))
+        self.collection = Collection(
+            self._dir(collection_name),
+            self.embedding_model.embedding_dims,
+            index_metadata=self.config.index_metadata,
+        )
+
+    def set_collection(self, collection_name: str, replace: bool = False) -> None:
+        super().set_collection(collection_name, replace=replace)
+        if not replace:
+            self.create_collection(collection_name)
+
+    def delete_collection(self, collection_name: str) -> None:
+        shutil.rmtree(self._dir(collection_name), ignore_errors=True)
+        if collection_name == self.config.collection_name:
+            self.collection = None
+
+    def clear_empty_collections(self) -> int:
+        empty = [
+            n for n in self.list_collections(empty=True) if self._count(n) == 0
+        ]
+        for name in empty:
+            self.delete_collection(name)
+        return len(empty)
+
+    def clear_all_collections(self, really: bool = False, prefix: str = "") -> int:
+        if not really:
+            logger.warning("Not deleting all collections, set really=True to confirm")
+            return 0
+        names = [
+            n for n in self.list_collections(empty=True) if n.startswith(prefix)
+        ]
+        for name in names:
+            self.delete_collection(name)
+        return len(names)
+
+    def _collection(self) -> Collection:
+        if self.config.collection_name is None:
+            raise ValueError("No collection name set")
+        if self.collection is None:
+            self.create_collection(self.config.collection_name)
+        assert self.collection is not None
+        return self.collection
+
+    def add_documents(self, documents: Sequence[Document]) -> None:
+        super().maybe_add_ids(documents)
+        if len(documents) == 0:
+            return
+        vectors = np.asarray(
+            self.embedding_fn([d.content for d in documents]), dtype=np.float32
+        )
+        self._collection().add(
+            [d.id() for d in documents],
+            vectors,
+            [d.model_dump(mode="json") for d in documents],
+        )
+
+    def delete_ids(self, ids: List[str]) -> int:
+        """Delete documents by id; returns how many were found."""
+        return self._collection().delete(ids)
+
+    def _to_documents(self, docs: List[Dict[str, Any]]) -> List[Document]:
+        return [self.config.document_class.model_validate(d) for d in docs]
+
+    def get_all_documents(self, where: str = "") -> List[Document]:
+        coll = self._collection()
+        rows = coll.filter_rows(where) if where else coll.live_rows()
+        return self._to_documents(coll.docs(rows))
+
+    def get_documents_by_ids(self, ids: List[str]) -> List[Document]:
+        coll = self._collection()
+        rows = [coll.row_of[id] for id in ids if id in coll.row_of]
+        return self._to_documents(coll.docs(rows))
+
+    def _n_probe(self) -> int:
+        """IVF lists to search, training the index first if it is due."""
+        index = self._collection().index
+        n = len(self._collection())
+        use_ivf = self.config.index == "ivf" or (
+            self.config.index == "auto" and n >= self.config.ivf_min_vectors
+        )
+        if not use_ivf or n == 0:
+            return 0
+        # (re)train when there is no index yet or the collection has grown 4x
+        if index.centroids is None or n > 4 * index.n_trained:
+            index.train(self.config.ivf_lists)
+        return self.config.ivf_probe
+
+    def similar_texts_with_scores(
+        self,
+        text: str,
+        k: int = 1,
+        where: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        coll = self._collection()
+        if len(coll) == 0:
+            return []
+        query = np.asarray(self.embedding_fn([text])[0], dtype=np.float32)
+        n_probe = self._n_probe()
+        rows = coll.filter_rows(where) if where else None
+        if rows is not None and len(rows) <= EXACT_SEARCH_SHARE * len(coll):
+            n_probe = 0
+        best, scores = coll.index.search(query, k, rows=rows, n_probe=n_probe)
+        if n_probe > 0 and len(best) < k:
+            # the probed lists held too few (matching) rows
+            best, scores = coll.index.search(query, k, rows=rows)
+        docs = self._to_documents(coll.docs(best))
+        results = list(zip(docs, scores.tolist()))
+        self.show_if_debug(results)
+        return results
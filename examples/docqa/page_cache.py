@@ -0,0 +1,251 @@
+"""
+On-disk cache of fetched web pages, with conditional revalidation.
+
+The search agents fetch and parse the links a search returns, and the same
+links come back again and again, across questions and sessions. `PageCache`
+keeps, per URL:
+
+- the raw bytes of the response, its content type and encoding;
+- the Documents parsed from it, with the parser settings that produced them
+  (when those change, the page is parsed again from the raw bytes, without
+  fetching it);
+- its ETag and Last-Modified validators, and when it was fetched.
+
+A page fetched less than `ttl` seconds ago is used as is. After that it is
+revalidated: fetched with If-None-Match / If-Modified-Since, and a
+304 Not Modified response reuses the cached page. Pages without validators
+are fetched again. Responses marked `Cache-Control: no-store` are not kept.
+When the cache grows past `max_bytes`, the least recently used pages are
+evicted.
+
+Files live under `.langroid-pages/`: one `.body` and one `.json` (parsed
+Documents) per page, and an `index.json` of the entries, written by
+`save()`. One process should write a given cache directory at a time.
+
+`web_fetch.load_urls` and `web_fetch.fetch_and_ingest` take a PageCache.
+"""
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from langroid.mytypes import Document
+
+PAGE_CACHE_DIR = ".langroid-pages"
+
+
+@dataclass
+class Page:
+    """A downloaded page, and what the response said about caching it."""
+
+    body: bytes
+    content_type: str
+    encoding: str
+    etag: str = ""
+    last_modified: str = ""
+    store: bool = True  # False for Cache-Control: no-store
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+class PageCache:
+    def __init__(
+        self,
+        directory: str = PAGE_CACHE_DIR,
+        ttl: float = 3600.0,
+        max_bytes: int = 256 << 20,
+    ):
+        """
+        Args:
+            directory: where the pages are kept.
+            ttl: seconds a page is used without revalidating it.
+            max_bytes: total size of bodies and parsed pages to keep.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.counts = dict(hits=0, revalidated=0, refetched=0, misses=0, evicted=0)
+        index = os.path.join(directory, "index.json")
+        if os.path.exists(index):
+            with open(index) as f:
+                self.entries = json.load(f)["entries"]
+        # files of pages put after the last save, or evicted before it
+        known = set(self.entries)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                key, ext = os.path.splitext(name)
+                if ext in [".body", ".json"] and key not in known:
+                    os.remove(os.path.join(directory, name))
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _path(self, url: str, ext: str) -> str:
+        return os.path.join(self.directory, url_key(url) + ext)
+
+    def get(self, url: str) -> Dict[str, Any] | None:
+        """The entry for `url`, or None (a miss)."""
+        entry = self.entries.get(url_key(url))
+        if entry is None:
+            self.counts["misses"] += 1
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["fetched"] < self.ttl
+
+    def validators(self, entry: Dict[str, Any] | None) -> Dict[str, str]:
+        """Request headers to revalidate the entry with."""
+        headers: Dict[str, str] = {}
+        if entry is None or not os.path.exists(self._path(entry["url"], ".body")):
+            return headers
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def hit(self, url: str, revalidated: bool = False) -> None:
+        """Record that the cached page is being used: fresh, or after a 304."""
+        entry = self.entries.get(url_key(url), {})
+        entry["used"] = time.time()
+        if revalidated:
+            entry["fetched"] = entry["used"]
+        self.counts["revalidated" if revalidated else "hits"] += 1
+
+    def page(self, url: str) -> Page | None:
+        entry = self.entries.get(url_key(url))
+        if entry is None or not os.path.exists(self._path(url, ".body")):
+            return None
+        with open(self._path(url, ".body"), "rb") as f:
+            body = f.read()
+        return Page(
+            body,
+            entry["content_type"],
+            entry["encoding"],
+            entry["etag"],
+            entry["last_modified"],
+        )
+
+    def docs(self, url: str, parsed_with: str) -> List[Document] | None:
+        """The page's Documents, if parsed with the same settings."""
+        entry = self.entries.get(url_key(url))
+        if entry is None or entry["parsed_with"] != parsed_with:
+            return None
+        try:
+            with open(self._path(url, ".json")) as f:
+                return [Document.model_validate(d) for d in json.load(f)]
+        except FileNotFoundError:
+            return None
+
+    def put(
+        self,
+        url: str,
+        page: Page | None,
+        docs: List[Document],
+        parsed_with: str,
+    ) -> None:
+        """
+        Keep a fetched page and its Documents; `page` is None when only the
+        Documents are known (e.g. from a crawler), which are then fetched
+        again once stale.
+        """
+        key = url_key(url)
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.counts["refetched"] += 1
+        if page is not None and not page.store:
+            for ext in [".body", ".json"]:
+                if os.path.exists(self._path(url, ext)):
+                    os.remove(self._path(url, ext))
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        size = 0
+        if page is not None:
+            with open(self._path(url, ".body"), "wb") as f:
+                f.write(page.body)
+            size += len(page.body)
+        elif os.path.exists(self._path(url, ".body")):
+            os.remove(self._path(url, ".body"))
+        parsed = json.dumps([d.model_dump(mode="json") for d in docs])
+        with open(self._path(url, ".json"), "w") as f:
+            f.write(parsed)
+        size += len(parsed)
+        now = time.time()
+        self.entries[key] = dict(
+            url=url,
+            content_type=page.content_type if page is not None else "",
+            encoding=page.encoding if page is not None else "",
+            etag=page.etag if page is not None else "",
+            last_modified=page.last_modified if page is not None else "",
+            parsed_with=parsed_with,
+            fetched=now,
+            used=now,
+            size=size,
+        )
+        self._evict()
+
+    def put_docs(self, url: str, docs: List[Document], parsed_with: str) -> None:
+        """Replace the Documents of a cached page, parsed again from its body."""
+        entry = self.entries[url_key(url)]
+        parsed = json.dumps([d.model_dump(mode="json") for d in docs])
+        with open(self._path(url, ".json"), "w") as f:
+            f.write(parsed)
+        body = self._path(url, ".body")
+        entry["size"] = len(parsed) + (
+            os.path.getsize(body) if os.path.exists(body) else 0
+        )
+        entry["parsed_with"] = parsed_with
+        self._evict()
+
+    def _evict(self) -> None:
+        total = sum(e["size"] for e in self.entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries.pop(key)["size"]
+            for ext in [".body", ".json"]:
+                path = os.path.join(self.directory, key + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.counts["evicted"] += 1
+
+    def clear(self) -> None:
+        for key in list(self.entries):
+            for ext in [".body", ".json"]:
+                path = os.path.join(self.directory, key + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.entries = {}
+        self.save()
+
+    def save(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "index.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(dict(version=1, entries=self.entries), f)
+        os.replace(path + ".tmp", path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts since this cache was opened, and its size."""
+        lookups = sum(
+            self.counts[k] for k in ["hits", "revalidated", "refetched", "misses"]
+        )
+        return dict(
+            self.counts,
+            hit_rate=(
+                (self.counts["hits"] + self.counts["revalidated"]) / lookups
+                if lookups > 0
+                else 0.0
+            ),
+            pages=len(self.entries),
+            mb=sum(e["size"] for e in self.entries.values()) / 1e6,
+        )
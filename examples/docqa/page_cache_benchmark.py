@@ -0,0 +1,132 @@
+"""
+Fetch time and hit rates of web search results with and without the page
+cache (page_cache.py).
+
+Serves --pages generated articles with ETags from local hosts
+(web_fixture.py), each after one of the --delays. A sequence of --searches
+searches each returns --results of the pages, popular pages more often
+(Zipf-like), and the cache is reopened from disk every --per-session
+searches, as a new chat session would. Half way through, --changed of the
+pages are edited. Each search's pages are loaded with `load_urls`:
+
+- no cache;
+- ttl 1h: cached pages are used without asking the server, so edits are
+  only seen after an hour ("stale pages");
+- ttl 0: every cached page is revalidated; unchanged pages come back as
+  304 Not Modified and are not parsed again.
+
+python3 -m examples.docqa.page_cache_benchmark --pages 30 --searches 40
+"""
+
+import random
+import tempfile
+import time
+from typing import List
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.page_cache import PageCache
+from examples.docqa.web_fetch import load_urls
+from examples.docqa.web_fixture import make_pages, serve_pages
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    n_pages: int = typer.Option(30, "--pages", "-p", help="distinct pages"),
+    n_searches: int = typer.Option(40, "--searches", "-s", help="searches"),
+    n_results: int = typer.Option(5, "--results", "-r", help="pages per search"),
+    per_session: int = typer.Option(10, "--per-session", help="searches/session"),
+    changed: float = typer.Option(0.1, "--changed", help="share of pages edited"),
+    delays: str = typer.Option(
+        "0.05,0.2,0.5", "--delays", "-d", help="comma-separated page delays, s"
+    ),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(n_pages)]
+    searches: List[List[int]] = []
+    for _ in range(n_searches):
+        results: List[int] = []
+        while len(results) < n_results:
+            page = rng.choices(range(n_pages), weights)[0]
+            if page not in results:
+                results.append(page)
+        searches.append(results)
+    edited = rng.sample(range(n_pages), max(1, int(changed * n_pages)))
+
+    table = Table(
+        title=f"{n_searches} searches x {n_results} of {n_pages} pages, "
+        f"{len(edited)} edited half way"
+    )
+    for col in [
+        "method",
+        "s/search",
+        "hit rate",
+        "hits",
+        "304s",
+        "refetched",
+        "misses",
+        "stale pages",
+    ]:
+        table.add_column(col, justify="right")
+
+    reference: List[List[str]] = []
+    for name, ttl in [("no cache", None), ("ttl 1h", 3600.0), ("ttl 0", 0.0)]:
+        pages = make_pages(
+            n_pages,
+            words=1500,
+            delays=[float(d) for d in delays.split(",")],
+            etags=True,
+        )
+        directory = tempfile.mkdtemp(prefix="page-cache-bench-")
+        cache = None
+        counts = dict(hits=0, revalidated=0, refetched=0, misses=0)
+        contents: List[List[str]] = []
+        seconds = 0.0
+        with serve_pages(pages) as urls:
+            for i, results in enumerate(searches):
+                if i == n_searches // 2:
+                    for p in edited:
+                        pages[p].body = pages[p].body.replace(b"<p>", b"<p>Edited. ")
+                        pages[p].etag = f'"edited-{p}"'
+                if ttl is not None and i % per_session == 0:
+                    if cache is not None:
+                        for k in counts:
+                            counts[k] += cache.counts[k]
+                    cache = PageCache(directory, ttl=ttl)
+                start = time.perf_counter()
+                docs = load_urls(
+                    [urls[p] for p in results], cache=cache, allow_private=True
+                )
+                seconds += time.perf_counter() - start
+                contents.append([d.content for d in docs])
+        if cache is not None:
+            for k in counts:
+                counts[k] += cache.counts[k]
+        if ttl is None:
+            reference = contents
+        stale = sum(
+            a != b
+            for got, ref in zip(contents, reference)
+            for a, b in zip(got, ref)
+        )
+        lookups = max(1, sum(counts.values()))
+        hit_rate = (counts["hits"] + counts["revalidated"]) / lookups
+        table.add_row(
+            name,
+            f"{seconds / n_searches:.3f}",
+            "-" if ttl is None else f"{hit_rate:.0%}",
+            *(["-"] * 4 if ttl is None else [str(counts[k]) for k in counts]),
+            str(stale),
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,231 @@
+"""
+Concurrent relevance extraction for a DocChatAgent, streamed into the answer.
+
+`DocChatAgent.get_verbatim_extracts` runs a RelevanceExtractorAgent over each
+retrieved chunk via `run_batch_tasks`, which clones the extractor agent and
+its task once per chunk. Building an agent regenerates the JSON schema of its
+tools, which takes a good fraction of a second of CPU time, on the event
+loop, per chunk: with more than a few chunks that overhead, not the LLM,
+dominates. Here instead:
+
+- ONE extractor agent is built per query, and its LLM is called statelessly
+  (system message + one user prompt, no message history), so any number of
+  calls can be in flight at once;
+- at most `max_concurrency` calls run at a time;
+- blank chunks are skipped without an LLM call, and chunks with nothing
+  relevant (NO_ANSWER) are dropped as they complete;
+- extracts are yielded in completion order, so a caller can show them (or
+  start on them) while slower chunks are still being processed;
+- if no chunk has a relevant extract, the summary LLM call is skipped and
+  NO_ANSWER returned at once.
+
+The summary LLM call itself needs all its input up front, so "streaming into
+the summary" means: extracts go to an `on_extract` callback as they arrive,
+and the summary starts as soon as the last one is in, or, with
+`straggler_timeout`, that many seconds after the first relevant extract,
+dropping chunks that are still outstanding.
+"""
+
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from langroid.agent.chat_document import ChatDocMetaData, ChatDocument
+from langroid.agent.special.doc_chat_agent import DocChatAgent
+from langroid.agent.special.relevance_extractor_agent import (
+    RelevanceExtractorAgent,
+)
+from langroid.agent.tools.segment_extract_tool import SegmentExtractTool
+from langroid.language_models.base import LLMMessage, Role
+from langroid.mytypes import Document, Entity
+from langroid.parsing.utils import extract_numbered_segments, number_segments
+from langroid.utils.constants import NO_ANSWER
+
+PROMPT = """
+PASSAGE:
+{passage}
+
+QUERY: {query}
+"""
+
+
+def make_extractor(agent: DocChatAgent, query: str) -> RelevanceExtractorAgent | None:
+    """The agent's relevance extractor for `query`, or None if it has none."""
+    cfg = agent.config.relevance_extractor_config
+    if cfg is None:
+        return None
+    # a copy: get_verbatim_extracts mutates the agent's own config
+    cfg = cfg.model_copy()
+    cfg.llm = (cfg.llm or agent.config.llm).model_copy()  # type: ignore
+    cfg.llm.stream = False  # concurrent calls can't share the console
+    cfg.query = query
+    cfg.segment_length = agent.config.extraction_granularity
+    return RelevanceExtractorAgent(cfg)
+
+
+async def extract_passage(extractor: RelevanceExtractorAgent, passage: str) -> str:
+    """
+    Relevant segments of `passage`, or NO_ANSWER. Leaves the extractor's
+    message history alone, so it is safe to call concurrently.
+    """
+    if passage.strip() == "":
+        return NO_ANSWER
+    numbered = number_segments(passage, extractor.config.segment_length)
+    messages = [
+        extractor._create_system_and_tools_message(),
+        LLMMessage(
+            role=Role.USER,
+            content=PROMPT.format(passage=numbered, query=extractor.config.query),
+        ),
+    ]
+    for _ in range(2):  # one retry if the LLM forgets the tool
+        response = await extractor.llm_response_messages_async(messages)
+        tools = [
+            t
+            for t in extractor.get_tool_messages(response)
+            if isinstance(t, SegmentExtractTool)
+        ]
+        if len(tools) > 0:
+            spec = tools[0].segment_list
+            if spec is None or spec.strip() in ["", NO_ANSWER]:
+                return NO_ANSWER
+            try:
+                return extract_numbered_segments(numbered, spec).strip() or NO_ANSWER
+            except Exception:
+                return NO_ANSWER
+        messages += [
+            LLMMessage(role=Role.ASSISTANT, content=response.content),
+            LLMMessage(role=Role.USER, content=extractor.config.handle_llm_no_tool),
+        ]
+    return NO_ANSWER
+
+
+async def iter_verbatim_extracts(
+    agent: DocChatAgent,
+    query: str,
+    passages: List[Document],
+    max_concurrency: int = 8,
+) -> AsyncIterator[Tuple[int, Document]]:
+    """
+    Yield (rank, extract) for each passage with a relevant extract, in the
+    order they complete; rank is the passage's index in `passages`.
+    Outstanding LLM calls are cancelled if the caller stops iterating.
+    """
+    passages = agent.remove_chunk_enrichments(passages)
+    extractor = make_extractor(agent, query)
+    if extractor is None:  # no relevance extraction: passages as they are
+        for i, p in enumerate(passages):
+            yield i, p
+        return
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def extract(i: int) -> Tuple[int, str]:
+        async with semaphore:
+            return i, await extract_passage(extractor, passages[i].content)
+
+    pending = {
+        asyncio.ensure_future(extract(i))
+        for i, p in enumerate(passages)
+        if p.content.strip() != ""
+    }
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                i, text = future.result()
+                if text == NO_ANSWER or text.strip() == "":
+                    continue
+                # keep all other fields of the passage, as get_verbatim_extracts
+                extract_doc = passages[i].model_copy()
+                extract_doc.content = text
+                yield i, extract_doc
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+async def collect_extracts(
+    agent: DocChatAgent,
+    query: str,
+    passages: List[Document],
+    max_concurrency: int = 8,
+    on_extract: Optional[Callable[[int, Document], None]] = None,
+    straggler_timeout: float | None = None,
+) -> List[Document]:
+    """
+    Relevant extracts of `passages`, in rank order. With `straggler_timeout`,
+    stop waiting for the remaining passages that many seconds after the first
+    relevant extract arrived.
+    """
+    found: List[Tuple[int, Document]] = []
+    stream = iter_verbatim_extracts(agent, query, passages, max_concurrency)
+    deadline: float | None = None
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                i, doc = await asyncio.wait_for(stream.__anext__(), timeout)
+            except (StopAsyncIteration, asyncio.TimeoutError):
+                break
+            found.append((i, doc))
+            if on_extract is not None:
+                on_extract(i, doc)
+            if straggler_timeout is not None and deadline is None:
+                deadline = loop.time() + straggler_timeout
+    finally:
+        await stream.aclose()
+    return [doc for _, doc in sorted(found, key=lambda x: x[0])]
+
+
+async def answer_from_passages_async(
+    agent: DocChatAgent,
+    query: str,
+    passages: List[Document],
+    max_concurrency: int = 8,
+    on_extract: Optional[Callable[[int, Document], None]] = None,
+    straggler_timeout: float | None = None,
+) -> ChatDocument:
+    """
+    `get_verbatim_extracts` followed by `get_summary_answer`, with the
+    extraction run concurrently and the summary skipped if nothing is relevant.
+    """
+    extracts = await collect_extracts(
+        agent, query, passages, max_concurrency, on_extract, straggler_timeout
+    )
+    if len(extracts) == 0:
+        return ChatDocument(
+            content=NO_ANSWER,
+            metadata=ChatDocMetaData(source="None", sender=Entity.LLM),
+        )
+    return agent.get_summary_answer(query, extracts)
+
+
+def get_verbatim_extracts_parallel(
+    agent: DocChatAgent,
+    query: str,
+    passages: List[Document],
+    max_concurrency: int = 8,
+) -> List[Document]:
+    """Drop-in for `agent.get_verbatim_extracts(query, passages)`."""
+    return asyncio.run(collect_extracts(agent, query, passages, max_concurrency))
+
+
+def answer_from_passages(
+    agent: DocChatAgent,
+    query: str,
+    passages: List[Document],
+    max_concurrency: int = 8,
+    on_extract: Optional[Callable[[int, Document], None]] = None,
+    straggler_timeout: float | None = None,
+) -> ChatDocument:
+    """Sync version of `answer_from_passages_async`."""
+    return asyncio.run(
+        answer_from_passages_async(
+            agent, query, passages, max_concurrency, on_extract, straggler_timeout
+        )
+    )
@@ -0,0 +1,168 @@
+"""
+Parse and chunk files in a process pool, embedding chunks as they arrive.
+
+`DocChatAgent.ingest_doc_paths` parses a folder one file at a time (for
+PDFs with pymupdf4llm, the slow part) and only starts embedding once every
+file is chunked. `ingest_files_parallel` parses and splits files in worker
+processes, and the main process embeds and stores their chunks in batches
+while the workers carry on with the next files.
+
+Chunk ids are derived from (source, position, content) rather than random,
+so the same file always yields the same ids whichever worker parses it and
+in whatever order files finish; the `n_neighbor_ids` windows are rebuilt on
+these ids, so neighbor-window retrieval works as with `ingest_doc_paths`.
+"""
+
+import logging
+import os
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent
+from langroid.mytypes import Document
+from langroid.parsing.parser import Parser, ParsingConfig
+from langroid.parsing.repo_loader import RepoLoader
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c1f2e-6d5b-4c36-9a57-5b0c8e0f3a41")
+
+_parser: Parser | None = None  # one per worker process, reused across files
+
+
+def chunk_id(source: str, index: int, content: str) -> str:
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\n{index}\n{content}"))
+
+
+def parse_and_split(path: str, config: ParsingConfig) -> List[Document]:
+    """Chunks of one file, with deterministic ids and neighbor windows."""
+    global _parser
+    if _parser is None or _parser.config != config:
+        _parser = Parser(config)
+    docs = RepoLoader.get_documents(path, parser=_parser)
+    chunks = _parser.split(docs)
+    new_ids = {
+        c.metadata.id: chunk_id(path, i, c.content) for i, c in enumerate(chunks)
+    }
+    for c in chunks:
+        c.metadata.id = new_ids[c.metadata.id]
+        c.metadata.window_ids = [new_ids.get(w, w) for w in c.metadata.window_ids]
+    return chunks
+
+
+def iter_chunks(
+    paths: List[str], config: ParsingConfig, workers: int
+) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Yield (path, chunks) for each file as soon as it is parsed, in completion
+    order. At most 2 * workers files are in flight, so memory stays bounded
+    however many files there are. Files that fail to parse are logged and
+    skipped.
+    """
+    if workers <= 1:
+        for path in paths:
+            try:
+                yield path, parse_and_split(path, config)
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {e}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        todo = iter(paths)
+        pending: Dict[Future, str] = {}
+
+        def submit_next() -> None:
+            path = next(todo, None)
+            if path is not None:
+                pending[pool.submit(parse_and_split, path, config)] = path
+
+        for _ in range(2 * workers):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                submit_next()
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    logger.warning(f"Skipping {path}: {e}")
+
+
+def ingest_files_parallel(
+    agent: DocChatAgent,
+    paths: List[str],
+    workers: int | None = None,
+    batch_size: int | None = None,
+) -> Dict[str, List[str]]:
+    """
+    Parse, chunk, embed and store files, parsing in parallel.
+
+    Args:
+        agent: DocChatAgent to ingest into.
+        paths: file paths (expand folders first, e.g. with
+            ingest_manifest.list_sources).
+        workers: parsing processes; default os.cpu_count().
+        batch_size: chunks per embedding batch; default the vecdb's batch_size.
+
+    Returns:
+        the ids of the chunks stored for each file that was ingested.
+    """
+    if agent.vecdb is None:
+        raise ValueError("VecDB not set")
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or agent.vecdb.config.batch_size
+    max_chunks = agent.config.parsing.max_chunks
+    # Chunk enrichment and add_fields_to_content are applied by ingest_docs,
+    # which needs all chunks at once; otherwise chunks are embedded and
+    # stored batch by batch, while the workers are still parsing.
+    streaming = (
+        agent.config.chunk_enrichment_config is None
+        and len(agent.config.add_fields_to_content) == 0
+    )
+    ids: Dict[str, List[str]] = {}
+    source_to_path: Dict[str, str] = {}
+    all_chunks: List[Document] = []
+    batch: List[Document] = []
+    for path, chunks in iter_chunks(paths, agent.config.parsing, workers):
+        chunks = chunks[: max_chunks - len(all_chunks)]
+        ids[path] = [c.id() for c in chunks]
+        for c in chunks:
+            source_to_path[c.metadata.source] = path
+        all_chunks.extend(chunks)
+        batch.extend(chunks)
+        if streaming and len(batch) >= batch_size:
+            agent.vecdb.add_documents(batch)
+            batch = []
+        if len(all_chunks) >= max_chunks:
+            logger.warning(f"Reached max_chunks={max_chunks}, ingesting no more")
+            break
+    if len(all_chunks) == 0:
+        return ids
+    if streaming:
+        if len(batch) > 0:
+            agent.vecdb.add_documents(batch)
+        # as ingest_docs does, e.g. for summarize_docs
+        agent.original_docs.extend(all_chunks)
+        agent.original_docs_length = agent.doc_length(all_chunks)
+        # done once at the end: it re-indexes all chunks for keyword search
+        agent.setup_documents(all_chunks, filter=agent.config.filter)
+    else:
+        # ingest_docs may store other chunks than it is given (enriched ones,
+        # with new ids), so record the ids of the chunks it actually stored;
+        # with a filter it reloads chunked_docs instead of appending to it
+        filter, agent.config.filter = agent.config.filter, None
+        n_before = len(agent.chunked_docs)
+        try:
+            agent.ingest_docs(all_chunks, split=False)
+        finally:
+            agent.config.filter = filter
+        ids = {path: [] for path in ids}
+        for chunk in agent.chunked_docs[n_before:]:
+            path = source_to_path.get(chunk.metadata.source)
+            if path is not None:
+                ids[path].append(chunk.id())
+        if filter is not None:
+            agent.setup_documents(filter=filter)
+    return ids
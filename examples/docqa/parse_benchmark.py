@@ -0,0 +1,153 @@
+"""
+Wall-clock time to parse and chunk a folder of PDFs vs. number of processes,
+using parallel_ingest.py.
+
+Point it at a local corpus:
+
+python3 -m examples.docqa.parse_benchmark --folder ~/papers
+
+or let it generate a few hundred simple multi-page PDFs:
+
+python3 -m examples.docqa.parse_benchmark --pdfs 300
+
+It parses with the same settings as chat.py (pymupdf4llm, token splitter)
+for 1, 2, 4, ... up to --max-workers processes, and checks that every run
+yields exactly the same chunk ids.
+"""
+
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.parallel_ingest import iter_chunks
+from langroid.parsing.parser import ParsingConfig, PdfParsingConfig, Splitter
+
+app = typer.Typer()
+
+WORDS = (
+    "model data retrieval vector index query chunk embedding document agent "
+    "latency cache parser token window score batch store search answer"
+).split()
+
+
+def write_pdf(path: str, pages: List[List[str]]) -> None:
+    """A minimal PDF with one Helvetica text line per string, no library needed."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for lines in pages:
+        text = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(
+            "({}) '".format(
+                line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            )
+            for line in lines
+        ) + " ET"
+        stream = text.encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(kids),
+        len(kids),
+    )
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(n_pdfs: int, n_pages: int) -> str:
+    rng = random.Random(0)
+    folder = tempfile.mkdtemp(prefix="parse-bench-")
+    for i in range(n_pdfs):
+        pages = [
+            [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60)]
+            for _ in range(n_pages)
+        ]
+        write_pdf(os.path.join(folder, f"doc-{i:04d}.pdf"), pages)
+    return folder
+
+
+@app.command()
+def main(
+    folder: str = typer.Option("", "--folder", "-f", help="folder of PDFs"),
+    n_pdfs: int = typer.Option(
+        300, "--pdfs", "-n", help="PDFs to generate if no --folder"
+    ),
+    n_pages: int = typer.Option(5, "--pages", "-p", help="pages per generated PDF"),
+    max_workers: int = typer.Option(
+        os.cpu_count() or 1, "--max-workers", "-w", help="most processes to try"
+    ),
+) -> None:
+    folder = folder or make_corpus(n_pdfs, n_pages)
+    files = sorted(
+        os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".pdf")
+    )
+    config = ParsingConfig(
+        splitter=Splitter.TOKENS,
+        chunk_size=200,
+        overlap=50,
+        n_neighbor_ids=5,
+        pdf=PdfParsingConfig(library="pymupdf4llm"),
+    )
+
+    workers = [1]
+    while workers[-1] * 2 <= max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != max_workers:
+        workers.append(max_workers)
+
+    table = Table(title=f"parsing + chunking {len(files)} PDFs")
+    for col in ["processes", "seconds", "files/s", "chunks", "speedup"]:
+        table.add_column(col, justify="right")
+    baseline = None
+    reference_ids = None
+    for w in workers:
+        start = time.perf_counter()
+        ids = {
+            path: [c.id() for c in chunks]
+            for path, chunks in iter_chunks(files, config, w)
+        }
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        if reference_ids is None:
+            reference_ids = ids
+        elif ids != reference_ids:
+            print(f"[red]chunk ids differ between 1 and {w} processes!")
+        table.add_row(
+            str(w),
+            f"{seconds:.2f}",
+            f"{len(files) / seconds:.1f}",
+            str(sum(len(v) for v in ids.values())),
+            f"{baseline / seconds:.2f}x",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,274 @@
+"""
+Cross-encoder reranking that can be left on: batched, cached, and bounded by
+a latency budget.
+
+DocChatAgent's `rerank_with_cross_encoder` scores every (query, passage) pair
+with the cross-encoder on the calling thread, every time, however long it
+takes. That is slow enough on CPU that several configs here turn it off
+(`cross_encoder_reranking_model=""`). `RerankingDocChatAgent` instead hands
+the pairs to a `CrossEncoderReranker`, which
+
+- runs the model on its own worker thread, loading it in the background as
+  soon as the agent is created;
+- scores only pairs it has not seen, sorted by length so each batch of
+  `batch_size` pads little, and caches the scores by (query, passage text)
+  hash; passages are keyed by text rather than id since windows of
+  neighbor chunks get a fresh id each time they are built;
+- waits at most `rerank_budget` seconds: when scoring takes longer, the
+  passages keep their retrieval (vector) order, and the scores are cached
+  when they arrive, for the next time the same passages come up.
+
+DocChatAgent's retrieval is synchronous (`llm_response_async` runs
+`answer_from_docs` in a worker thread), so the agent reranks with the sync
+`rerank`, which blocks the calling thread for up to `rerank_budget`.
+`rerank_async` is for code that reranks from an event loop itself: it
+awaits the scores without blocking the loop.
+
+One reranker (model, thread and cache) is shared by all agents in the process
+that use the same model and device.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.mytypes import Document
+
+logger = logging.getLogger(__name__)
+
+Scorer = Callable[[List[Tuple[str, str]], int], Sequence[float]]
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def load_cross_encoder(model_name: str, device: str | None) -> Scorer:
+    """Scorer for a sentence-transformers CrossEncoder model."""
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError as exc:
+        raise ImportError(
+            """
+            To use cross-encoder re-ranking, you must install
+            langroid with the [hf-embeddings] extra, e.g.:
+            pip install "langroid[hf-embeddings]"
+            """
+        ) from exc
+    model = CrossEncoder(model_name, device=device or "cpu")
+
+    def score(pairs: List[Tuple[str, str]], batch_size: int) -> Sequence[float]:
+        return model.predict(  # type: ignore
+            pairs, batch_size=batch_size, show_progress_bar=False
+        )
+
+    return score
+
+
+class CrossEncoderReranker:
+    _shared: Dict[Tuple[str, str | None], "CrossEncoderReranker"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str | None = None,
+        batch_size: int = 32,
+        cache_size: int = 50_000,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._scorer: Scorer | None = None
+        # one worker: the model scores one batch at a time anyway
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="cross-encoder")
+        self._cache: OrderedDict[Tuple[bytes, bytes], float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = dict(
+            calls=0, fallbacks=0, cached_pairs=0, scored_pairs=0, model_seconds=0.0
+        )
+
+    @classmethod
+    def shared(
+        cls, model_name: str, device: str | None = None
+    ) -> "CrossEncoderReranker":
+        """The process-wide reranker for this model and device."""
+        with cls._shared_lock:
+            key = (model_name, device)
+            if key not in cls._shared:
+                cls._shared[key] = cls(model_name, device)
+            return cls._shared[key]
+
+    def _load(self) -> Scorer:
+        # only ever called on the worker thread
+        if self._scorer is None:
+            start = time.perf_counter()
+            self._scorer = load_cross_encoder(self.model_name, self.device)
+            logger.info(
+                f"Loaded {self.model_name} in {time.perf_counter() - start:.1f}s"
+            )
+        return self._scorer
+
+    def warmup(self) -> Future:
+        """Start loading the model on the worker thread."""
+        return self._executor.submit(self._load)
+
+    def _count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    def _score_missing(
+        self, query: str, query_key: bytes, texts: Dict[bytes, str]
+    ) -> None:
+        """Score pairs not in the cache (on the worker thread) and cache them."""
+        with self._lock:
+            todo = [
+                (k, t) for k, t in texts.items() if (query_key, k) not in self._cache
+            ]
+        if len(todo) == 0:
+            return
+        todo.sort(key=lambda kt: len(kt[1]))  # similar lengths batch together
+        score = self._load()
+        start = time.perf_counter()
+        logits = np.asarray(
+            score([(query, t) for _, t in todo], self.batch_size), dtype=np.float64
+        )
+        scores = 1.0 / (1.0 + np.exp(-logits))  # to [0, 1], as DocChatAgent does
+        with self._lock:
+            self._counts["model_seconds"] += time.perf_counter() - start
+            self._counts["scored_pairs"] += len(todo)
+            for (k, _), s in zip(todo, scores):
+                self._cache[(query_key, k)] = float(s)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cached(self, query_key: bytes, keys: List[bytes]) -> List[float] | None:
+        with self._lock:
+            if any((query_key, k) not in self._cache for k in keys):
+                return None
+            for k in keys:
+                self._cache.move_to_end((query_key, k))
+            return [self._cache[(query_key, k)] for k in keys]
+
+    def _submit(
+        self, query: str, texts: List[str]
+    ) -> Tuple[bytes, List[bytes], List[float] | Future]:
+        """
+        Cache keys of the query and texts, and either their cached scores or a
+        future for scoring the pairs that are not cached yet.
+        """
+        query_key = text_digest(query)
+        keys = [text_digest(t) for t in texts]
+        cached = self._cached(query_key, keys)
+        if cached is not None:
+            self._count("cached_pairs", len(keys))
+            return query_key, keys, cached
+        future = self._executor.submit(
+            self._score_missing, query, query_key, dict(zip(keys, texts))
+        )
+        return query_key, keys, future
+
+    def scores(
+        self, query: str, texts: List[str], budget: float | None = None
+    ) -> List[float] | None:
+        """
+        Relevance of each text to the query, in [0, 1]; None if they were not
+        all scored within `budget` seconds (None: no limit).
+        """
+        self._count("calls")
+        query_key, keys, future = self._submit(query, texts)
+        if not isinstance(future, Future):
+            return future  # all cached
+        try:
+            future.result(timeout=budget)
+        except FutureTimeoutError:
+            self._count("fallbacks")
+            return None
+        return self._cached(query_key, keys)
+
+    async def scores_async(
+        self, query: str, texts: List[str], budget: float | None = None
+    ) -> List[float] | None:
+        """Like `scores`, without blocking the event loop while scoring."""
+        self._count("calls")
+        query_key, keys, future = self._submit(query, texts)
+        if not isinstance(future, Future):
+            return future  # all cached
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), budget)
+        except asyncio.TimeoutError:
+            self._count("fallbacks")
+            return None
+        return self._cached(query_key, keys)
+
+    @staticmethod
+    def order(
+        passages: List[Document], scores: List[float] | None
+    ) -> List[Document]:
+        if scores is None:  # over budget: keep retrieval order
+            return passages
+        ranked = sorted(zip(scores, range(len(passages))), key=lambda x: -x[0])
+        return [passages[i] for _, i in ranked]
+
+    def rerank(
+        self, query: str, passages: List[Document], budget: float | None = None
+    ) -> List[Document]:
+        return self.order(
+            passages, self.scores(query, [p.content for p in passages], budget)
+        )
+
+    async def rerank_async(
+        self, query: str, passages: List[Document], budget: float | None = None
+    ) -> List[Document]:
+        scores = await self.scores_async(query, [p.content for p in passages], budget)
+        return self.order(passages, scores)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counts, cache_entries=len(self._cache))
+
+
+class RerankingDocChatAgentConfig(DocChatAgentConfig):
+    rerank_batch_size: int = 32  # (query, passage) pairs per model call
+    rerank_cache_size: int = 50_000  # most cached pair scores
+    # seconds to wait for reranking before keeping the vector order;
+    # None waits as long as it takes
+    rerank_budget: float | None = 2.0
+
+
+class RerankingDocChatAgent(DocChatAgent):
+    def __init__(self, config: RerankingDocChatAgentConfig):
+        super().__init__(config)
+        self.config: RerankingDocChatAgentConfig = config
+        self.reranker: CrossEncoderReranker | None = None
+        if (
+            config.cross_encoder_reranking_model != ""
+            and not config.use_reciprocal_rank_fusion
+        ):
+            self.reranker = CrossEncoderReranker.shared(
+                config.cross_encoder_reranking_model, config.cross_encoder_device
+            )
+            self.reranker.batch_size = config.rerank_batch_size
+            self.reranker.cache_size = config.rerank_cache_size
+            self.reranker.warmup()  # load while documents are being ingested
+
+    def rerank_with_cross_encoder(
+        self, query: str, passages: List[Document]
+    ) -> List[Document]:
+        if self.reranker is None:
+            return super().rerank_with_cross_encoder(query, passages)
+        return self.reranker.rerank(query, passages, self.config.rerank_budget)
@@ -0,0 +1,148 @@
+"""
+CPU throughput and latency of cross-encoder reranking with rerank.py vs.
+DocChatAgent's own `rerank_with_cross_encoder`.
+
+Passages are chunks of 50-300 words cut from the example text files; each
+query reranks --passages of them. Runs, all on CPU:
+
+- langroid: `DocChatAgent.rerank_with_cross_encoder`;
+- reranker, batch N: `CrossEncoderReranker` with batch size N, cache cleared
+  before each query (so every pair is scored);
+- cached: the same queries again, all scores from the cache;
+- budget: `rerank_budget` of --budget seconds on fresh pairs: how many
+  queries fall back to vector order, and the latency the caller sees.
+
+Needs sentence-transformers (pip install "langroid[hf-embeddings]"):
+
+python3 -m examples.docqa.rerank_benchmark --passages 20 --queries 10
+"""
+
+import glob
+import random
+import time
+from typing import List
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.mytypes import DocMetaData, Document
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.rerank import CrossEncoderReranker
+
+app = typer.Typer()
+
+QUESTIONS = [
+    "What must an employee do when their role changes?",
+    "Who pays for repairs to the premises?",
+    "How tall are giraffes?",
+    "What happens when the lease ends early?",
+    "What do giraffes eat?",
+    "What notice period applies to termination?",
+]
+
+
+def make_passages(n: int, seed: int) -> List[Document]:
+    rng = random.Random(seed)
+    words: List[str] = []
+    for path in sorted(glob.glob("examples/docqa/*.txt")):
+        with open(path) as f:
+            words += f.read().split()
+    passages = []
+    for i in range(n):
+        size = rng.randint(50, 300)
+        start = rng.randrange(max(1, len(words) - size))
+        passages.append(
+            Document(
+                content=" ".join(words[start : start + size]),
+                metadata=DocMetaData(source=f"passage-{i}"),
+            )
+        )
+    return passages
+
+
+@app.command()
+def main(
+    model: str = typer.Option(
+        "cross-encoder/ms-marco-MiniLM-L-6-v2", "--model", "-m", help="cross-encoder"
+    ),
+    n_passages: int = typer.Option(20, "--passages", "-p", help="per query"),
+    n_queries: int = typer.Option(10, "--queries", "-q", help="queries per run"),
+    batch_sizes: str = typer.Option(
+        "8,32,64", "--batch-sizes", "-b", help="comma-separated batch sizes"
+    ),
+    budget: float = typer.Option(0.2, "--budget", help="rerank budget, seconds"),
+) -> None:
+    set_global(Settings(cache=False, quiet=True))
+    queries = [
+        (QUESTIONS[i % len(QUESTIONS)], make_passages(n_passages, seed=i))
+        for i in range(n_queries)
+    ]
+    n_pairs = n_passages * n_queries
+
+    agent = DocChatAgent(
+        DocChatAgentConfig(
+            llm=MockLMConfig(),
+            vecdb=None,
+            cross_encoder_reranking_model=model,
+            cross_encoder_device="cpu",
+        )
+    )
+    reranker = CrossEncoderReranker(model, device="cpu")
+    start = time.perf_counter()
+    reranker.warmup().result()
+    agent.rerank_with_cross_encoder(*queries[0])  # loads langroid's copy
+    print(f"Loaded {model} (twice) in {time.perf_counter() - start:.1f}s")
+
+    table = Table(title=f"{model} on CPU, {n_passages} passages per query")
+    for col in ["method", "ms/query", "pairs/s", "fallbacks"]:
+        table.add_column(col, justify="right")
+
+    def add_row(name: str, seconds: float, fallbacks: str = "") -> None:
+        table.add_row(
+            name,
+            f"{1000 * seconds / n_queries:.1f}",
+            f"{n_pairs / seconds:,.0f}",
+            fallbacks,
+        )
+
+    start = time.perf_counter()
+    for query, passages in queries:
+        agent.rerank_with_cross_encoder(query, passages)
+    add_row("langroid", time.perf_counter() - start)
+
+    for batch_size in [int(b) for b in batch_sizes.split(",")]:
+        reranker.batch_size = batch_size
+        seconds = 0.0
+        for query, passages in queries:
+            reranker.clear_cache()
+            start = time.perf_counter()
+            reranker.rerank(query, passages)
+            seconds += time.perf_counter() - start
+        add_row(f"reranker, batch {batch_size}", seconds)
+
+    for query, passages in queries:
+        reranker.rerank(query, passages)  # fill the cache
+    start = time.perf_counter()
+    for query, passages in queries:
+        reranker.rerank(query, passages)
+    add_row("cached", time.perf_counter() - start)
+
+    before = reranker.stats()["fallbacks"]
+    seconds = 0.0
+    for query, passages in queries:
+        reranker.clear_cache()
+        start = time.perf_counter()
+        reranker.rerank(query, passages, budget=budget)
+        seconds += time.perf_counter() - start
+        reranker.scores(query, [p.content for p in passages])  # let it finish
+    fallbacks = reranker.stats()["fallbacks"] - before
+    add_row(f"budget {budget}s", seconds, f"{fallbacks}/{n_queries}")
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
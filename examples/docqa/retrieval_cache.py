@@ -0,0 +1,150 @@
+"""
+DocChatAgent with a cache in front of `get_relevant_extracts`.
+
+In the search-and-RAG scripts (chat_search.py, chat-search-filter.py,
+chainlit/chat-search-rag.py) the LLM calls the `relevant_extracts` tool many
+times per session, often with the same or nearly the same query. Each call
+runs the vector search and an LLM relevance-extraction pass.
+`CachingDocChatAgent` remembers the result of each call, keyed by
+
+- the normalized query (lower-cased, punctuation and extra spaces removed),
+- the active filter and vector-store collection,
+- the ingested documents: the cache is emptied whenever documents are
+  ingested or the agent is cleared (and keyed by the number of chunks, so
+  chunks deleted behind the agent's back also miss),
+- the conversation, when it is used to make the query stand-alone.
+
+With `retrieval_cache_similarity` > 0, a query that misses is also compared
+(by embedding cosine similarity) with the cached queries in the same
+context, and a close enough one is a hit as well. `retrieval_cache_stats()`
+reports hits, misses and the time hits saved.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.mytypes import Document
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+class CachingDocChatAgentConfig(DocChatAgentConfig):
+    retrieval_cache_size: int = 256  # most cached queries; 0 disables the cache
+    # cosine similarity above which a different query counts as a hit;
+    # 0 means only identical (normalized) queries hit
+    retrieval_cache_similarity: float = 0.0
+
+
+@dataclass
+class _Entry:
+    key: Tuple[Hashable, str]
+    query: str  # the stand-alone query returned with the extracts
+    extracts: List[Document]
+    seconds: float  # what computing the extracts took
+    vector: np.ndarray | None = None
+
+
+class CachingDocChatAgent(DocChatAgent):
+    def __init__(self, config: CachingDocChatAgentConfig):
+        # set before DocChatAgent.__init__, which may ingest docs
+        self._retrieval_cache: OrderedDict[Tuple[Hashable, str], _Entry] = (
+            OrderedDict()
+        )
+        self._retrieval_counts = dict(
+            hits=0, semantic_hits=0, misses=0, invalidations=0
+        )
+        self._seconds_saved = 0.0
+        super().__init__(config)
+        self.config: CachingDocChatAgentConfig = config
+
+    def invalidate_retrieval_cache(self) -> None:
+        """Forget all cached extracts, e.g. after changing the vecdb directly."""
+        if len(self._retrieval_cache) > 0:
+            self._retrieval_counts["invalidations"] += 1
+        self._retrieval_cache.clear()
+
+    def setup_documents(
+        self,
+        docs: List[Document] = [],
+        filter: str | None = None,
+    ) -> None:
+        # called with docs after every ingestion; without docs it only
+        # re-applies a filter, which is part of the cache key anyway
+        if len(docs) > 0:
+            self.invalidate_retrieval_cache()
+        super().setup_documents(docs, filter=filter)
+
+    def clear(self) -> None:
+        self.invalidate_retrieval_cache()
+        super().clear()
+
+    def _retrieval_context(self) -> Hashable:
+        collection = None if self.vecdb is None else self.vecdb.config.collection_name
+        dialog = ""
+        if len(self.dialog) > 0 and not self.config.assistant_mode:
+            dialog = str(self.dialog)  # used to make the query stand-alone
+        return (collection, self.config.filter, len(self.chunked_docs), dialog)
+
+    def _embed_query(self, query: str) -> np.ndarray | None:
+        if self.vecdb is None:
+            return None
+        v = np.asarray(self.vecdb.embedding_fn([query])[0], dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def _similar_entry(self, context: Hashable, vector: np.ndarray) -> _Entry | None:
+        best, best_score = None, self.config.retrieval_cache_similarity
+        for (ctx, _), entry in self._retrieval_cache.items():
+            if ctx != context or entry.vector is None:
+                continue
+            score = float(entry.vector @ vector)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def get_relevant_extracts(self, query: str) -> Tuple[str, List[Document]]:
+        if self.config.retrieval_cache_size <= 0:
+            return super().get_relevant_extracts(query)
+        context = self._retrieval_context()
+        key = (context, normalize_query(query))
+        entry = self._retrieval_cache.get(key)
+        vector = None
+        if entry is not None:
+            self._retrieval_counts["hits"] += 1
+        elif self.config.retrieval_cache_similarity > 0:
+            vector = self._embed_query(key[1])
+            if vector is not None:
+                entry = self._similar_entry(context, vector)
+            if entry is not None:
+                self._retrieval_counts["semantic_hits"] += 1
+        if entry is not None:
+            self._retrieval_cache.move_to_end(entry.key)
+            self._seconds_saved += entry.seconds
+            return entry.query, list(entry.extracts)
+
+        self._retrieval_counts["misses"] += 1
+        start = time.perf_counter()
+        standalone, extracts = super().get_relevant_extracts(query)
+        seconds = time.perf_counter() - start
+        self._retrieval_cache[key] = _Entry(key, standalone, extracts, seconds, vector)
+        while len(self._retrieval_cache) > self.config.retrieval_cache_size:
+            self._retrieval_cache.popitem(last=False)
+        return standalone, list(extracts)
+
+    def retrieval_cache_stats(self) -> Dict[str, Any]:
+        counts = self._retrieval_counts
+        hits = counts["hits"] + counts["semantic_hits"]
+        total = hits + counts["misses"]
+        return dict(
+            counts,
+            entries=len(self._retrieval_cache),
+            hit_rate=hits / total if total else 0.0,
+            seconds_saved=self._seconds_saved,
+        )
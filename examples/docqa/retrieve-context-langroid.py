@@ -14,6 +14,7 @@ Optional arguments:
     --path=... : path to text file to extract from (default is examples/docqa/giraffes.txt)
     --query="..." : query to run (default is "What do we know about giraffes?")
     --k=... : number of neighbor chunks to retrieve (default is 2)
+    --concurrency=... : max concurrent relevance-extraction LLM calls (default 8)
 
 Also see this colab:
 https://colab.research.google.com/drive/1JvH6CO9AS7CaWK0GTblZGesJoo9Jjyn7
@@ -24,8 +25,12 @@ from time import time
 from langroid.utils.configuration import set_global, Settings
 from fire import Fire
 
-DocChatAgentConfig = lr.agent.special.DocChatAgentConfig
-DocChatAgent = lr.agent.special.DocChatAgent
+from examples.docqa.neighbor_index import (
+    NeighborDocChatAgent,
+    NeighborDocChatAgentConfig,
+)
+from examples.docqa.parallel_extract import answer_from_passages
+
 ParsingConfig = lr.parsing.parser.ParsingConfig
 QdrantDBConfig = lr.vector_store.QdrantDBConfig
 Document = lr.mytypes.Document
@@ -40,6 +45,7 @@ def main(
         #query= "What are the provisions following cessation of employment?",
         query="What must an employee do when their role changes?",
         k=1,
+        concurrency=8,
 ):
     # configure agent
 
@@ -48,7 +54,7 @@ def main(
         text = f.read()
     docs = [Document(content=text, metadata=DocMetaData(source="user"))]
 
-    agent_cfg = DocChatAgentConfig(
+    agent_cfg = NeighborDocChatAgentConfig(
         n_neighbor_chunks=k,
         vecdb=QdrantDBConfig(
             collection_name="testing",
@@ -63,7 +69,8 @@ def main(
         )
     )
 
-    agent = DocChatAgent(agent_cfg)
+    # neighbor windows come from an adjacency index built at ingest time
+    agent = NeighborDocChatAgent(agent_cfg)
     agent.ingest_docs(docs)
 
 
@@ -82,8 +89,15 @@ def main(
     print(f"Retrieved chunks: {n_words} words out of {tot_words}")
 
 
-    extracts = agent.get_verbatim_extracts(query, chunks)
-    answer = agent.get_summary_answer(query, extracts)
+    # relevance extraction runs concurrently over the chunks; extracts are
+    # shown as they arrive, and the summary is skipped if none is relevant
+    answer = answer_from_passages(
+        agent,
+        query,
+        chunks,
+        max_concurrency=concurrency,
+        on_extract=lambda i, doc: print(f"Extract from chunk {i}: {doc.content}"),
+    )
     print(f"Answer: {answer}\n")
 
     print(f"Time (secs): {end - start}")
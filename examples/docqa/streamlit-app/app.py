@@ -1,7 +1,7 @@
 import os
 
 import streamlit as st
-from utils import agent, configure
+from utils import agent, configure, doc_chat_cache
 
 import langroid.language_models as lm
 from langroid.utils.configuration import settings
@@ -51,3 +51,9 @@ if prompt:
     # chat using docchatagent
     answer = agent(cfg, prompt)
     st.write(f"{answer}")
+
+stats = doc_chat_cache().stats()
+st.sidebar.caption(
+    f"Cached docs: {stats['documents']} ({stats['vectors']} vectors), "
+    f"hit rate {stats['hit_rate']:.0%}, evictions {stats['evictions']}"
+)
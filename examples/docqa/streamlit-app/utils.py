@@ -1,4 +1,8 @@
+import hashlib
 import os
+import shutil
+import threading
+from collections import OrderedDict
 
 import streamlit as st
 
@@ -8,8 +12,19 @@ from langroid.language_models.openai_gpt import OpenAIGPTConfig
 from langroid.parsing.parser import ParsingConfig
 from langroid.vector_store.qdrantdb import QdrantDBConfig
 
+from examples.docqa.rerank import RerankingDocChatAgent, RerankingDocChatAgentConfig
+
 OPENAI_KEY = os.environ["OPENAI_API_KEY"]
 
+# Ingested documents are shared by all sessions, keyed by a hash of the file's
+# content and the embedding/chunking settings, so going back to a file (or
+# switching the chat model) reuses its embeddings instead of re-ingesting.
+# Least recently used documents are dropped once the cache holds more than
+# MAX_CACHED_VECTORS vectors in total.
+MAX_CACHED_VECTORS = 100_000
+# each cached document gets its own local Qdrant store under here
+QDRANT_DIR = ".qdrant/streamlit-app"
+
 
 @st.cache_data
 def configure(filename: str, chat_model: str = "") -> DocChatAgentConfig:
@@ -24,7 +39,7 @@ def configure(filename: str, chat_model: str = "") -> DocChatAgentConfig:
     )
 
     # Configuring DocChatAgent
-    cfg = DocChatAgentConfig(
+    cfg = RerankingDocChatAgentConfig(
         n_similar_chunks=4,
         n_relevant_chunks=4,
         parsing=ParsingConfig(
@@ -32,12 +47,14 @@ def configure(filename: str, chat_model: str = "") -> DocChatAgentConfig:
             overlap=20,
         ),
         show_stats=False,
-        cross_encoder_reranking_model="",
+        # cross-encoder reranking runs off-thread and cached; when it takes
+        # longer than this many seconds, chunks keep their retrieval order
+        rerank_budget=1.0,
         llm=llm_cfg,
         vecdb=QdrantDBConfig(
             embedding=oai_embed_config,
-            collection_name="lease",
-            replace_collection=True,
+            collection_name="lease",  # replaced by a per-document name
+            replace_collection=False,
             cloud=False,
         ),
         doc_paths=[filename],
@@ -46,16 +63,158 @@ def configure(filename: str, chat_model: str = "") -> DocChatAgentConfig:
     return cfg
 
 
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CachedDoc:
+    """An ingested document's vector store, and its agents (one per chat model)."""
+
+    def __init__(self, vecdb, n_vectors: int):
+        self.vecdb = vecdb
+        self.n_vectors = n_vectors
+        self.agents: dict[str, DocChatAgent] = {}
+        # sessions share these agents, so they answer one query at a time
+        self.lock = threading.Lock()
+
+
+class DocChatCache:
+    def __init__(self):
+        # guards `docs` and the counters only; never held while ingesting
+        self.lock = threading.Lock()
+        self.docs: OrderedDict[str, CachedDoc] = OrderedDict()
+        # one lock per collection, held while it is ingested, given an agent
+        # or evicted, so sessions wait only for the document they asked for
+        self.loading: dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def total_vectors(self) -> int:
+        return sum(doc.n_vectors for doc in self.docs.values())
+
+    @staticmethod
+    def collection_name(cfg: DocChatAgentConfig) -> str:
+        settings = "|".join(
+            [
+                cfg.vecdb.embedding.model_name,
+                str(cfg.parsing.chunk_size),
+                str(cfg.parsing.overlap),
+            ]
+        )
+        settings_hash = hashlib.sha256(settings.encode()).hexdigest()
+        return f"doc-{file_hash(cfg.doc_paths[0])[:16]}-{settings_hash[:8]}"
+
+    def get(self, cfg: DocChatAgentConfig) -> tuple[DocChatAgent, CachedDoc]:
+        collection = self.collection_name(cfg)
+        chat_model = cfg.llm.chat_model
+        with self.lock:
+            doc = self.docs.get(collection)
+            if doc is not None:
+                self.hits += 1
+                self.docs.move_to_end(collection)
+                if chat_model in doc.agents:
+                    return doc.agents[chat_model], doc
+            loading = self.loading.setdefault(collection, threading.Lock())
+
+        evicted = []
+        with loading:
+            # another session may have ingested (or evicted) it while we waited
+            with self.lock:
+                doc = self.docs.get(collection)
+            if doc is None:
+                doc = self._ingest(cfg, collection)
+                with self.lock:
+                    self.misses += 1
+                    self.docs[collection] = doc
+                    evicted = self._evict()
+            elif chat_model not in doc.agents:
+                attached = self._attach(cfg, doc)
+                with self.lock:
+                    doc.agents[chat_model] = attached
+            rag_agent = doc.agents[chat_model]
+        # after releasing `loading`: dropping a document takes its own lock
+        self._drop(evicted)
+        return rag_agent, doc
+
+    def _ingest(self, cfg: DocChatAgentConfig, collection: str) -> CachedDoc:
+        agent_cfg = cfg.model_copy(deep=True)
+        agent_cfg.doc_paths = []
+        agent_cfg.vecdb.collection_name = collection
+        agent_cfg.vecdb.storage_path = os.path.join(QDRANT_DIR, collection)
+        # this loads the chunks if the collection is already stored on disk
+        # (e.g. from before a restart), so we only embed the file if it isn't
+        agent = RerankingDocChatAgent(agent_cfg)
+        if not agent.chunked_docs:
+            agent.ingest_doc_paths(cfg.doc_paths)
+        doc = CachedDoc(agent.vecdb, len(agent.chunked_docs))
+        doc.agents[cfg.llm.chat_model] = agent
+        return doc
+
+    @staticmethod
+    def _attach(cfg: DocChatAgentConfig, doc: CachedDoc) -> DocChatAgent:
+        """An agent for another chat model, over the document's existing store."""
+        agent_cfg = cfg.model_copy(deep=True)
+        agent_cfg.doc_paths = []
+        # don't open a second client on the same local Qdrant store
+        agent_cfg.vecdb = None
+        agent = RerankingDocChatAgent(agent_cfg)
+        agent.vecdb = doc.vecdb
+        agent.config.vecdb = doc.vecdb.config
+        agent.setup_documents()
+        return agent
+
+    def _evict(self) -> list[tuple[str, CachedDoc]]:
+        """Remove least recently used documents from the cache (under `lock`).
+
+        Returns them, for `_drop` to delete once `lock` is released.
+        """
+        evicted = []
+        # the newest document is last, so it is never evicted
+        while self.total_vectors() > MAX_CACHED_VECTORS and len(self.docs) > 1:
+            evicted.append(self.docs.popitem(last=False))
+            self.evictions += 1
+        return evicted
+
+    def _drop(self, evicted: list[tuple[str, CachedDoc]]) -> None:
+        for collection, doc in evicted:
+            with self.lock:
+                loading = self.loading.setdefault(collection, threading.Lock())
+            # a session re-requesting this document waits until it is deleted
+            with loading, doc.lock:
+                doc.vecdb.delete_collection(collection)
+                doc.vecdb.close()
+                shutil.rmtree(
+                    os.path.join(QDRANT_DIR, collection), ignore_errors=True
+                )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return dict(
+            documents=len(self.docs),
+            vectors=self.total_vectors(),
+            hit_rate=self.hits / lookups if lookups else 0.0,
+            evictions=self.evictions,
+        )
+
+
+@st.cache_resource
+def doc_chat_cache() -> DocChatCache:
+    """One cache for the whole server process, shared by all sessions."""
+    return DocChatCache()
+
+
 def agent(cfg, prompt):
-    # Creating DocChatAgent
-    rag_agent = st.session_state["rag_agent"]
-    if (
-        rag_agent is None
-        or st.session_state["chat_model"] != cfg.llm.chat_model
-        or st.session_state["file_path"] != cfg.doc_paths[0]
-    ):
-        rag_agent = DocChatAgent(cfg)
-        st.session_state["rag_agent"] = rag_agent
-
-    response = rag_agent.llm_response(prompt)
+    if not cfg.doc_paths[0]:
+        return "Please upload a file first."
+    # Get (or create) the DocChatAgent for this file + chat model
+    rag_agent, doc = doc_chat_cache().get(cfg)
+    st.session_state["rag_agent"] = rag_agent
+
+    with doc.lock:
+        response = rag_agent.llm_response(prompt)
     return response.content
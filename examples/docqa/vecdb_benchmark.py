@@ -0,0 +1,100 @@
+"""
+Recall and latency of numpy_vecdb.py's IVF index vs. exact (brute-force)
+search, at several collection sizes.
+
+Vectors are synthetic: points scattered around random cluster centers (real
+embeddings are clustered too; uniformly random vectors are the worst case
+for IVF). For each size the index is trained, then --queries held-out
+points are searched exactly and with several numbers of probed lists:
+
+python3 -m examples.docqa.vecdb_benchmark --sizes 10000,100000,1000000
+
+recall@k is the share of the exact top k that the IVF search also returns.
+The 1M-vector run needs about 4 bytes * dims * 1M of disk and memory.
+"""
+
+import tempfile
+import time
+from typing import Tuple
+
+import numpy as np
+import typer
+from rich import print
+from rich.table import Table
+
+from examples.docqa.numpy_vecdb import VectorIndex
+
+app = typer.Typer()
+
+
+def make_vectors(
+    n: int, n_queries: int, dims: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(10, n // 100), dims)).astype(np.float32)
+
+    def points(m: int) -> np.ndarray:
+        out = np.empty((m, dims), dtype=np.float32)
+        for i in range(0, m, 100_000):
+            size = min(100_000, m - i)
+            noise = rng.standard_normal((size, dims)).astype(np.float32)
+            out[i : i + size] = centers[rng.integers(len(centers), size=size)] + noise
+        return out
+
+    return points(n), points(n_queries)
+
+
+@app.command()
+def main(
+    sizes: str = typer.Option(
+        "10000,100000,1000000", "--sizes", "-s", help="comma-separated sizes"
+    ),
+    dims: int = typer.Option(128, "--dims", "-d", help="vector dimensions"),
+    n_queries: int = typer.Option(100, "--queries", "-q", help="queries per size"),
+    k: int = typer.Option(10, "--k", "-k", help="results per query"),
+    probes: str = typer.Option(
+        "8,32,64,128", "--probes", "-p", help="comma-separated IVF lists to probe"
+    ),
+) -> None:
+    table = Table(title=f"exact vs. IVF search, {dims} dims, top {k}")
+    for col in ["vectors", "search", "build s", "ms/query", f"recall@{k}"]:
+        table.add_column(col, justify="right")
+    for n in [int(s) for s in sizes.split(",")]:
+        vectors, queries = make_vectors(n, n_queries, dims)
+        index = VectorIndex(tempfile.mkdtemp(prefix="vecdb-bench-"), dims)
+        start = time.perf_counter()
+        for i in range(0, n, 100_000):
+            index.add(vectors[i : i + 100_000])
+        add_seconds = time.perf_counter() - start
+        del vectors
+
+        start = time.perf_counter()
+        exact = [set(index.search(q, k)[0].tolist()) for q in queries]
+        ms = 1000 * (time.perf_counter() - start) / n_queries
+        table.add_row(f"{n:,}", "exact", f"{add_seconds:.2f}", f"{ms:.2f}", "1.000")
+
+        start = time.perf_counter()
+        index.train()
+        index.lists()
+        train_seconds = time.perf_counter() - start
+        assert index.centroids is not None
+        for n_probe in [int(p) for p in probes.split(",")]:
+            start = time.perf_counter()
+            found = [index.search(q, k, n_probe=n_probe)[0] for q in queries]
+            ms = 1000 * (time.perf_counter() - start) / n_queries
+            recall = np.mean(
+                [len(exact[i] & set(f.tolist())) / k for i, f in enumerate(found)]
+            )
+            table.add_row(
+                "",
+                f"IVF {n_probe}/{len(index.centroids)} lists",
+                f"{train_seconds:.2f}",
+                f"{ms:.2f}",
+                f"{recall:.3f}",
+            )
+        table.add_section()
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
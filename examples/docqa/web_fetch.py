@@ -0,0 +1,454 @@
+"""
+Concurrent fetch-and-ingest of web pages, e.g. search results, for a
+DocChatAgent.
+
+`DocChatAgent.ingest_doc_paths(urls)` crawls with trafilatura: every URL
+first gets a HEAD request (to spot PDFs), one after the other; pages are
+downloaded in buffers, pausing 5 seconds before a second page from the same
+host; and nothing is ingested until every page has been downloaded and
+extracted, so the user waits for the slowest page.
+
+`fetch_and_ingest` instead:
+
+- downloads all the pages at once with httpx, at most `per_host` at a time
+  from any one host, with the connect/read timeouts and size limit of the
+  agent's ParsingConfig, and gives up on whatever is left after `deadline`
+  seconds;
+- extracts the text of each page as it arrives, in a thread, with the same
+  trafilatura settings as the crawler (PDF and Word documents go to
+  langroid's DocumentParser), and splits and ingests it straight away;
+- stops once `enough_chunks` useful chunks (sharing at least half of the
+  query's terms) have been ingested, cancelling the remaining downloads.
+
+With a PageCache (page_cache.py), pages fetched before are reused, or
+revalidated with a conditional request once stale. `load_urls` is the same
+download (or, with another crawler, `URLLoader`) through the cache, for
+callers that ingest the Documents themselves.
+
+Like trafilatura's downloads, it refuses to connect to loopback, private
+and link-local addresses, unless `allow_private=True`: before every request,
+redirects included, the host is resolved and refused if any of its addresses
+is not public.
+
+`fetch_and_ingest_async` and `load_urls_async` are the API for async code
+(e.g. chainlit or FastAPI handlers); `fetch_and_ingest` and `load_urls` run
+them to completion, in a thread of their own when called from inside a
+running event loop.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Dict, List, Set, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import httpx
+import markdownify as md
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent
+from langroid.mytypes import DocMetaData, Document
+from langroid.parsing.document_parser import DocumentParser
+from langroid.parsing.parser import ParsingConfig
+from langroid.parsing.url_loader import (
+    BaseCrawlerConfig,
+    TrafilaturaConfig,
+    URLLoader,
+)
+
+from examples.docqa.bm25_index import tokenize
+from examples.docqa.page_cache import Page, PageCache
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": (
+        "docx"
+    ),
+    "application/msword": "doc",
+}
+USER_AGENT = "Mozilla/5.0 (compatible; langroid-examples web_fetch)"
+
+T = TypeVar("T")
+
+
+def can_fetch(agent: DocChatAgent) -> bool:
+    """Whether the agent's crawler is the one `fetch_and_ingest` replaces."""
+    crawler = agent.config.crawler_config
+    return crawler is None or isinstance(crawler, TrafilaturaConfig)
+
+
+async def _refuse_private(request: httpx.Request) -> None:
+    """Request hook: refuse hosts with addresses not on the public internet."""
+    url = request.url
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            url.host, port, type=socket.SOCK_STREAM
+        )
+    except OSError as e:
+        raise httpx.ConnectError(f"cannot resolve {url.host}: {e}", request=request)
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        address = getattr(address, "ipv4_mapped", None) or address
+        if not address.is_global:
+            raise httpx.ConnectError(
+                f"non-public address {address} refused", request=request
+            )
+
+
+def _client(config: ParsingConfig, allow_private: bool) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            config.url_read_timeout, connect=config.url_connect_timeout
+        ),
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        # runs for each redirect too
+        event_hooks={"request": [] if allow_private else [_refuse_private]},
+    )
+
+
+def _run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """asyncio.run, in a thread of its own if this one runs an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+def html_to_text(html: str, format: str = "markdown") -> str:
+    """The main text of a page, as `TrafilaturaCrawler` extracts it."""
+    import trafilatura
+
+    text = trafilatura.extract(
+        html,
+        no_fallback=False,
+        favor_recall=True,
+        include_formatting=True,
+        output_format=format,
+        with_metadata=True,
+    )
+    if text is not None and format in ["xml", "html"]:
+        text = md.markdownify(text, heading_style="ATX")
+    return text or html
+
+
+def _document_type(url: str, content_type: str) -> str | None:
+    for mime, doc_type in DOCUMENT_TYPES.items():
+        if mime in content_type:
+            return doc_type
+    path = urlparse(url).path.lower()
+    return next(
+        (t for t in ["pdf", "docx", "doc"] if path.endswith(f".{t}")), None
+    )
+
+
+def parse_page(
+    url: str, page: Page, config: ParsingConfig, format: str = "markdown"
+) -> List[Document]:
+    """The text of a downloaded page: one Document, or chunks of a PDF/doc."""
+    doc_type = _document_type(url, page.content_type)
+    if doc_type is not None:
+        parser = DocumentParser.create(page.body, config, doc_type)
+        chunks = parser.get_doc_chunks()
+        for c in chunks:
+            c.metadata.source = url
+        return chunks
+    text = html_to_text(page.body.decode(page.encoding, errors="replace"), format)
+    if text.strip() == "":
+        return []
+    return [Document(content=text, metadata=DocMetaData(source=url))]
+
+
+def parser_settings(config: ParsingConfig, format: str) -> str:
+    """What `parse_page` output depends on, besides the page."""
+    return f"{format}:{config.pdf.library}:{config.docx.library}:{config.doc.library}"
+
+
+async def _download(
+    client: httpx.AsyncClient,
+    url: str,
+    limit: asyncio.Semaphore,
+    max_size: int,
+    headers: Dict[str, str] = {},
+) -> Page | None:
+    """The page, or None if the server says it is not modified."""
+    async with limit:
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            body = bytearray()
+            async for data in response.aiter_bytes():
+                body += data
+                if len(body) > max_size:
+                    raise ValueError(f"larger than url_max_size={max_size}")
+            return Page(
+                bytes(body),
+                response.headers.get("content-type", "").lower(),
+                response.encoding or "utf-8",
+                etag=response.headers.get("etag", ""),
+                last_modified=response.headers.get("last-modified", ""),
+                store="no-store" not in response.headers.get("cache-control", ""),
+            )
+
+
+async def _cached_docs(
+    cache: PageCache,
+    url: str,
+    config: ParsingConfig,
+    format: str,
+    revalidated: bool = False,
+) -> List[Document] | None:
+    """The page's Documents from the cache, parsing its body again if needed."""
+    settings = parser_settings(config, format)
+    docs = cache.docs(url, settings)
+    if docs is None:
+        page = cache.page(url)
+        if page is None:
+            return None
+        docs = await asyncio.to_thread(parse_page, url, page, config, format)
+        cache.put_docs(url, docs, settings)
+    cache.hit(url, revalidated=revalidated)
+    return docs
+
+
+async def fetch_docs(
+    client: httpx.AsyncClient,
+    url: str,
+    limit: asyncio.Semaphore,
+    config: ParsingConfig,
+    format: str = "markdown",
+    cache: PageCache | None = None,
+) -> List[Document]:
+    """
+    Download and parse one page, or take it from the cache: as is while it
+    is fresh, and after a 304 response to a conditional request once stale.
+    """
+    entry = cache.get(url) if cache is not None else None
+    if cache is not None and entry is not None and cache.is_fresh(entry):
+        docs = await _cached_docs(cache, url, config, format)
+        if docs is not None:
+            return docs
+    headers = cache.validators(entry) if cache is not None else {}
+    page = await _download(client, url, limit, config.url_max_size, headers)
+    if page is None and cache is not None:
+        docs = await _cached_docs(cache, url, config, format, revalidated=True)
+        if docs is not None:
+            return docs
+    if page is None:  # not modified, but no longer cached
+        page = await _download(client, url, limit, config.url_max_size)
+    if page is None:
+        return []
+    docs = await asyncio.to_thread(parse_page, url, page, config, format)
+    if cache is not None and len(docs) > 0:
+        cache.put(url, page, docs, parser_settings(config, format))
+    return docs
+
+
+def _ingest(
+    agent: DocChatAgent,
+    docs: List[Document],
+    metadata: Dict[str, Any],
+    terms: Set[str],
+) -> Tuple[int, int]:
+    """Split and ingest one page; returns (chunks, useful chunks)."""
+    chunks = agent.parser.split(docs)
+    if len(chunks) == 0:
+        return 0, 0
+    agent.ingest_docs(chunks, split=False, metadata=metadata)
+    need = (len(terms) + 1) // 2
+    useful = sum(len(terms & set(tokenize(c.content))) >= need for c in chunks)
+    return len(chunks), useful
+
+
+async def fetch_and_ingest_async(
+    agent: DocChatAgent,
+    urls: List[str],
+    query: str = "",
+    enough_chunks: int = 0,
+    per_host: int = 2,
+    deadline: float = 30.0,
+    metadata: Dict[str, Any] = {},
+    on_page: Callable[[str, Dict[str, Any]], None] | None = None,
+    allow_private: bool = False,
+    cache: PageCache | None = None,
+) -> Dict[str, Any]:
+    """
+    Download, extract and ingest `urls` into the agent's vector store,
+    each page as soon as it arrives.
+
+    Args:
+        agent: the DocChatAgent to ingest into.
+        urls: pages to fetch; duplicates are fetched once.
+        query: what the pages are meant to answer; a chunk is useful if it
+            has at least half of the query's terms (any chunk, if empty).
+        enough_chunks: stop once this many useful chunks are ingested;
+            0 to fetch every page.
+        per_host: most downloads from one host at a time.
+        deadline: seconds after which pages still downloading are dropped.
+        metadata: added to the metadata of every chunk, as in `ingest_docs`.
+        on_page: called with each ingested URL and the running stats.
+        allow_private: also fetch from loopback, private and link-local
+            addresses (e.g. an intranet, or web_fixture.py).
+        cache: PageCache to take pages from, and keep them in.
+
+    Returns:
+        stats: pages (ingested), failed, cancelled (not fetched after the
+            cutoff or deadline), chunks, useful_chunks, first_page and
+            first_extract (seconds until the first page, and the first
+            useful chunk, could be retrieved; None if never), seconds.
+    """
+    parsing = agent.config.parsing
+    crawler = agent.config.crawler_config
+    format = crawler.format if isinstance(crawler, TrafilaturaConfig) else "markdown"
+    terms = set(tokenize(query))
+    stats: Dict[str, Any] = dict(
+        pages=0,
+        failed=0,
+        cancelled=0,
+        chunks=0,
+        useful_chunks=0,
+        first_page=None,
+        first_extract=None,
+        seconds=0.0,
+    )
+    limits: Dict[str, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(per_host)
+    )
+    start = time.perf_counter()
+
+    async with _client(parsing, allow_private) as client:
+
+        async def fetch(url: str) -> Tuple[str, List[Document]]:
+            try:
+                limit = limits[urlparse(url).netloc]
+                docs = await fetch_docs(client, url, limit, parsing, format, cache)
+            except Exception as e:
+                logger.warning(f"Error fetching {url}: {e}")
+                docs = []
+            return url, docs
+
+        tasks = [asyncio.create_task(fetch(url)) for url in dict.fromkeys(urls)]
+        try:
+            for next_page in asyncio.as_completed(tasks, timeout=deadline):
+                url, docs = await next_page
+                n_chunks, n_useful = 0, 0
+                if len(docs) > 0:
+                    n_chunks, n_useful = await asyncio.to_thread(
+                        _ingest, agent, docs, metadata, terms
+                    )
+                if n_chunks == 0:
+                    stats["failed"] += 1
+                    continue
+                now = time.perf_counter() - start
+                stats["pages"] += 1
+                stats["chunks"] += n_chunks
+                stats["useful_chunks"] += n_useful
+                if stats["first_page"] is None:
+                    stats["first_page"] = now
+                if n_useful > 0 and stats["first_extract"] is None:
+                    stats["first_extract"] = now
+                stats["seconds"] = now
+                if on_page is not None:
+                    on_page(url, stats)
+                if 0 < enough_chunks <= stats["useful_chunks"]:
+                    break
+        except asyncio.TimeoutError:
+            logger.warning(f"Web fetch deadline of {deadline}s passed")
+        finally:
+            pending = [t for t in tasks if not t.done()]
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            stats["cancelled"] = len(pending)
+            if cache is not None:
+                cache.save()
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def fetch_and_ingest(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """Sync version of `fetch_and_ingest_async`, with the same arguments."""
+    return _run_sync(fetch_and_ingest_async(*args, **kwargs))
+
+
+async def load_urls_async(
+    urls: List[str],
+    config: ParsingConfig = ParsingConfig(),
+    crawler_config: BaseCrawlerConfig | None = None,
+    cache: PageCache | None = None,
+    per_host: int = 2,
+    allow_private: bool = False,
+) -> List[Document]:
+    """
+    `URLLoader(urls, config, crawler_config).load()`, through a PageCache:
+    with the default trafilatura crawler, the pages are fetched as
+    `fetch_docs` does, all at once; with another crawler, only the pages
+    that are not cached, or are stale, are crawled.
+    """
+    urls = list(dict.fromkeys(urls))
+    if crawler_config is not None and not isinstance(
+        crawler_config, TrafilaturaConfig
+    ):
+        return await asyncio.to_thread(
+            _crawl_cached, urls, config, crawler_config, cache
+        )
+    format = crawler_config.format if crawler_config is not None else "markdown"
+    limits: Dict[str, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(per_host)
+    )
+
+    async def fetch(url: str) -> List[Document]:
+        try:
+            limit = limits[urlparse(url).netloc]
+            return await fetch_docs(client, url, limit, config, format, cache)
+        except Exception as e:
+            logger.warning(f"Error fetching {url}: {e}")
+            return []
+
+    async with _client(config, allow_private) as client:
+        pages = await asyncio.gather(*[fetch(url) for url in urls])
+    if cache is not None:
+        cache.save()
+    return [d for docs in pages for d in docs]
+
+
+def _crawl_cached(
+    urls: List[str],
+    config: ParsingConfig,
+    crawler_config: BaseCrawlerConfig,
+    cache: PageCache | None,
+) -> List[Document]:
+    settings = type(crawler_config).__name__
+    docs: Dict[str, List[Document]] = {}
+    for url in urls:
+        entry = cache.get(url) if cache is not None else None
+        if cache is not None and entry is not None and cache.is_fresh(entry):
+            cached = cache.docs(url, settings)
+            if cached is not None:
+                cache.hit(url)
+                docs[url] = cached
+    missing = [url for url in urls if url not in docs]
+    crawled = URLLoader(missing, config, crawler_config).load() if missing else []
+    for d in crawled:
+        # crawlers may report the final URL, after redirects
+        docs.setdefault(d.metadata.source, []).append(d)
+    if cache is not None:
+        for url in missing:
+            if len(docs.get(url, [])) > 0:
+                cache.put(url, None, docs[url], settings)
+        cache.save()
+    return [d for page in docs.values() for d in page]
+
+
+def load_urls(*args: Any, **kwargs: Any) -> List[Document]:
+    """Sync version of `load_urls_async`, with the same arguments."""
+    return _run_sync(load_urls_async(*args, **kwargs))
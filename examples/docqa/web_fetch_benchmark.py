@@ -0,0 +1,124 @@
+"""
+Time to the first retrievable extract, and to the end of ingestion, when
+ingesting web search results with web_fetch.py vs. `ingest_doc_paths`.
+
+Serves --pages generated articles from --hosts local hosts (web_fixture.py),
+each page after one of the --delays (seconds) to stand in for slow sites,
+and ingests them into a fresh in-memory vector store with the local
+HashEmbeddings model. Runs:
+
+- langroid: `DocChatAgent.ingest_doc_paths(urls)` with the default
+  trafilatura crawler; no extract can be retrieved before it returns;
+- fetch all: `fetch_and_ingest` of every page;
+- cutoff K: `fetch_and_ingest` stopping after K useful chunks for --query.
+
+Loopback addresses are refused by default, by trafilatura and by web_fetch,
+so both are allowed to fetch from them here.
+
+python3 -m examples.docqa.web_fetch_benchmark --pages 9 --hosts 3
+"""
+
+import tempfile
+import time
+from typing import Any, Dict
+
+import typer
+from rich import print
+from rich.table import Table
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.parsing.parser import ParsingConfig, Splitter
+from langroid.utils.configuration import Settings, set_global
+
+from examples.docqa.hash_embeddings import HashEmbeddings
+from examples.docqa.numpy_vecdb import NumpyVectorStore, NumpyVectorStoreConfig
+from examples.docqa.web_fetch import fetch_and_ingest
+from examples.docqa.web_fixture import make_pages, serve_pages
+
+app = typer.Typer()
+
+
+def make_agent(embed_delay: float) -> DocChatAgent:
+    agent = DocChatAgent(
+        DocChatAgentConfig(
+            llm=MockLMConfig(),
+            parsing=ParsingConfig(splitter=Splitter.TOKENS, chunk_size=200),
+            vecdb=None,
+        )
+    )
+    agent.vecdb = NumpyVectorStore(
+        NumpyVectorStoreConfig(
+            collection_name="web-fetch-bench",
+            storage_path=tempfile.mkdtemp(prefix="web-fetch-bench-"),
+            embedding_model=HashEmbeddings(dims=64, delay=embed_delay),
+        )
+    )
+    return agent
+
+
+@app.command()
+def main(
+    n_pages: int = typer.Option(9, "--pages", "-p", help="search results"),
+    hosts: int = typer.Option(3, "--hosts", help="hosts the pages are spread over"),
+    delays: str = typer.Option(
+        "0.2,0.5,1,2,4", "--delays", "-d", help="comma-separated page delays, s"
+    ),
+    words: int = typer.Option(1500, "--words", "-w", help="words per page"),
+    query: str = typer.Option("giraffe neck", "--query", "-q"),
+    cutoff: int = typer.Option(6, "--cutoff", "-k", help="useful chunks to stop at"),
+    embed_delay: float = typer.Option(0.05, "--embed-delay", help="s per call"),
+) -> None:
+    from trafilatura.settings import DEFAULT_CONFIG
+
+    set_global(Settings(cache=False, quiet=True))
+    DEFAULT_CONFIG["DEFAULT"]["SSRF_PROTECTION"] = "off"
+    pages = make_pages(
+        n_pages,
+        hosts=hosts,
+        words=words,
+        delays=[float(d) for d in delays.split(",")],
+    )
+    table = Table(title=f"{n_pages} pages on {hosts} hosts, delays {delays}s")
+    for col in ["method", "first extract s", "done s", "pages", "chunks"]:
+        table.add_column(col, justify="right")
+
+    def add_row(name: str, stats: Dict[str, Any]) -> None:
+        first = stats["first_extract"]
+        table.add_row(
+            name,
+            "-" if first is None else f"{first:.2f}",
+            f"{stats['seconds']:.2f}",
+            f"{stats['pages']}/{n_pages}",
+            str(stats["chunks"]),
+        )
+
+    with serve_pages(pages) as urls:
+        agent = make_agent(embed_delay)
+        start = time.perf_counter()
+        agent.ingest_doc_paths(urls)
+        seconds = time.perf_counter() - start
+        sources = {c.metadata.source for c in agent.chunked_docs}
+        add_row(
+            "langroid",
+            dict(
+                first_extract=seconds,
+                seconds=seconds,
+                pages=len(sources),
+                chunks=len(agent.chunked_docs),
+            ),
+        )
+        for name, k in [("fetch all", 0), (f"cutoff {cutoff}", cutoff)]:
+            stats = fetch_and_ingest(
+                make_agent(embed_delay),
+                urls,
+                query=query,
+                enough_chunks=k,
+                allow_private=True,
+            )
+            add_row(name, stats)
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
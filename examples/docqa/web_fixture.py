@@ -0,0 +1,141 @@
+"""
+Local HTTP servers that stand in for the web, to try out and benchmark web
+fetching (see web_fetch.py) without network access.
+
+`serve_pages` starts one threaded server per host, each on its own loopback
+address (127.0.0.2, 127.0.0.3, ...) so the pages really do come from
+different hosts, and serves each page after that page's delay. `make_pages`
+generates HTML articles from the example text files.
+
+    with serve_pages(make_pages(9, hosts=3)) as urls:
+        ...
+"""
+
+import glob
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+
+@dataclass
+class FixturePage:
+    host: int  # index of the server the page is on
+    path: str
+    body: bytes
+    content_type: str = "text/html; charset=utf-8"
+    delay: float = 0.0  # seconds before the response is sent
+    status: int = 200
+    etag: str = ""  # if set, If-None-Match with it gets a 304
+
+
+def make_pages(
+    n: int,
+    hosts: int = 3,
+    words: int = 600,
+    delays: List[float] = [0.1],
+    seed: int = 0,
+    etags: bool = False,
+) -> List[FixturePage]:
+    """
+    `n` HTML articles of about `words` words each, cut from the example text
+    files, spread over `hosts` hosts; page i waits `delays[i % len(delays)]`.
+    With `etags`, each page has an ETag (a hash of its body).
+    """
+    rng = random.Random(seed)
+    text: List[str] = []
+    for path in sorted(glob.glob("examples/docqa/*.txt")):
+        with open(path) as f:
+            text += f.read().split()
+    pages = []
+    for i in range(n):
+        start = rng.randrange(max(1, len(text) - words))
+        article = text[start : start + words]
+        paragraphs = "\n".join(
+            f"<p>{' '.join(article[j : j + 60])}</p>"
+            for j in range(0, len(article), 60)
+        )
+        body = (
+            f"<html><head><title>Page {i}</title></head><body>"
+            f"<nav><a href='/'>Home</a></nav><article><h1>Page {i}</h1>"
+            f"{paragraphs}</article><footer>Fixture site</footer></body></html>"
+        )
+        digest = hashlib.sha1(body.encode()).hexdigest()[:16]
+        pages.append(
+            FixturePage(
+                host=i % hosts,
+                path=f"/page-{i}.html",
+                body=body.encode(),
+                delay=delays[i % len(delays)],
+                etag=f'"{digest}"' if etags else "",
+            )
+        )
+    return pages
+
+
+def _handler(pages: Dict[str, FixturePage]) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, with_body: bool) -> None:
+            page = pages.get(self.path)
+            if page is None:
+                self.send_error(404)
+                return
+            time.sleep(page.delay)
+            if page.etag and self.headers.get("If-None-Match") == page.etag:
+                self.send_response(304)
+                self.send_header("ETag", page.etag)
+                self.end_headers()
+                return
+            self.send_response(page.status)
+            if page.etag:
+                self.send_header("ETag", page.etag)
+            self.send_header("Content-Type", page.content_type)
+            self.send_header("Content-Length", str(len(page.body)))
+            self.end_headers()
+            if with_body:
+                self.wfile.write(page.body)
+
+        def do_GET(self) -> None:
+            self._respond(with_body=True)
+
+        def do_HEAD(self) -> None:
+            self._respond(with_body=False)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: object, client_address: object) -> None:
+        pass  # mostly clients hanging up, which fetchers do when they stop early
+
+
+@contextmanager
+def serve_pages(pages: List[FixturePage]) -> Iterator[List[str]]:
+    """Serve `pages` for the duration of the block; yields their URLs."""
+    n_hosts = max(p.host for p in pages) + 1
+    servers = []
+    try:
+        for host in range(n_hosts):
+            server = _Server(
+                (f"127.0.0.{host + 2}", 0),
+                _handler({p.path: p for p in pages if p.host == host}),
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+        yield [
+            f"http://127.0.0.{p.host + 2}:{servers[p.host].server_port}{p.path}"
+            for p in pages
+        ]
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
@@ -1,10 +1,56 @@
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from collections import OrderedDict, deque
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Json
+from starlette.background import BackgroundTask
 import uvicorn
+import asyncio
+import codecs
+import contextlib
+import json
 import os
+import sys
+import tempfile
+import time
+from pathlib import Path
 import langroid as lr
+import langroid.language_models as lm
+from langroid.agent.batch import llm_response_batch
+
+# metrics.py, llm_pool.py and llm_stream.py are shared by the example servers
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "server_common"))
+
+import llm_pool
+import llm_stream
+import metrics
+from coalescer import Coalescer
+
+# Streaming file processing (/process_file_stream): uploads are spooled to disk
+# and read back in blocks of this many bytes...
+UPLOAD_BLOCK_SIZE = 64 * 1024
+# ...then sent through the LLM in pieces of about this many characters,
+# at most FILE_MAP_CONCURRENCY pieces at a time.
+FILE_CHUNK_CHARS = 8_000
+FILE_MAP_CONCURRENCY = 4
+# when reducing, this many partial results are combined per LLM call
+FILE_REDUCE_FAN_IN = 4
+REDUCE_PROMPT = (
+    "Below are responses to consecutive parts of one document. "
+    "Combine them into a single coherent response.\n\n"
+)
+
+# Optional micro-batching of /process_text requests: set COALESCE_WINDOW_MS > 0
+# to gather requests for that long (or until COALESCE_MAX_BATCH arrive) and run
+# them through llm_response_batch, with at most COALESCE_WORKERS batches at once.
+COALESCE_WINDOW_MS = float(os.environ.get("COALESCE_WINDOW_MS", "0"))
+COALESCE_MAX_BATCH = int(os.environ.get("COALESCE_MAX_BATCH", "32"))
+COALESCE_WORKERS = int(os.environ.get("COALESCE_WORKERS", "4"))
+
+# Agents are reused across requests: up to AGENT_POOL_PER_KEY idle agents are
+# kept per API key, for the AGENT_POOL_KEYS most recently used keys.
+AGENT_POOL_PER_KEY = int(os.environ.get("AGENT_POOL_PER_KEY", "32"))
+AGENT_POOL_KEYS = int(os.environ.get("AGENT_POOL_KEYS", "64"))
 
 
 class TextInput(BaseModel):
@@ -29,26 +75,216 @@ class Server:
 
     def setup(self):
         # Perform your potentially expensive initial setup here
-        self.agent = lr.ChatAgent()
+        # share one HTTP connection pool per LLM base URL
+        self.llm_config = llm_pool.pooled(lm.OpenAIGPTConfig())
+        # API key -> idle agents, least recently used key first
+        self.idle_agents: OrderedDict[str | None, List[lr.ChatAgent]] = (
+            OrderedDict()
+        )
+        self.coalescer = None
+        if COALESCE_WINDOW_MS > 0:
+            # Template for llm_response_batch, which runs copies of it in its
+            # own event loop (in a worker thread), so it cannot share the
+            # pooled clients that belong to the server's loop.
+            self.batch_agent = lr.ChatAgent(
+                lr.ChatAgentConfig(llm=lm.OpenAIGPTConfig(use_cached_client=False))
+            )
+            self.coalescer = Coalescer(
+                self.serve_batch,
+                window=COALESCE_WINDOW_MS / 1000,
+                max_batch=COALESCE_MAX_BATCH,
+                max_workers=COALESCE_WORKERS,
+            )
+            metrics.add_collector(self.coalescer_metrics)
+
+    def coalescer_metrics(self):
+        s = self.coalescer.stats()
+        return [
+            ("coalescer_batches_total", "counter", "Batches dispatched", s["batches"]),
+            ("coalescer_items_total", "counter", "Requests batched", s["items"]),
+            ("coalescer_waiting", "gauge", "Requests waiting for a batch", s["waiting"]),
+        ]
+
+    def new_agent(self, key: str | None = None) -> lr.ChatAgent:
+        """
+        A new agent with (if given) its own API key. The key goes into this
+        agent's config only, never into os.environ, so concurrent requests
+        cannot see each other's keys.
+        """
+        update = {"api_key": key} if key else {}
+        return lr.ChatAgent(
+            lr.ChatAgentConfig(
+                llm=self.llm_config.model_copy(update=update, deep=True),
+            )
+        )
+
+    @contextlib.asynccontextmanager
+    async def agent(self, key: str | None = None) -> AsyncIterator[lr.ChatAgent]:
+        """
+        An agent for a single request, used by no other request meanwhile: an
+        idle one for the same key if there is one, else a new one, built in a
+        worker thread since that takes long enough to stall the event loop.
+        Only an agent whose request went through is reused, with its history
+        cleared, so requests never see each other's messages.
+        """
+        idle = self.idle_agents.get(key)
+        if idle:
+            agent = idle.pop()
+        else:
+            agent = await asyncio.to_thread(self.new_agent, key)
+        yield agent
+        agent.clear_history(0)
+        idle = self.idle_agents.setdefault(key, [])
+        self.idle_agents.move_to_end(key)
+        if len(idle) < AGENT_POOL_PER_KEY:
+            idle.append(agent)
+        while len(self.idle_agents) > AGENT_POOL_KEYS:
+            self.idle_agents.popitem(last=False)
+
+    async def serve_text(self, text: str, key: str | None = None) -> str | None:
+        async with self.agent(key) as agent:
+            result = await agent.llm_response_async(text)
+        metrics.observe_response(result)
+        return result.content if result else None
+
+    def serve_batch(self, texts: List[str]) -> List[str | None]:
+        """Answer independent single-turn prompts in one concurrent batch."""
+        def output_map(result):
+            metrics.observe_response(result)
+            return result.content if result else None
+
+        return llm_response_batch(
+            self.batch_agent, texts, output_map=output_map, sequential=False
+        )
+
+    async def serve_text_stream(
+        self, text: str, key: str | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield response tokens as the LLM streams them. Closing the generator
+        (e.g. when the client disconnects) cancels the LLM call.
+        """
+        async with self.agent(key) as agent:
+            # closed before the agent goes back to the pool, even if we are
+            # closed early
+            tokens = llm_stream.stream_response(agent, text)
+            async with contextlib.aclosing(tokens):
+                async for token in tokens:
+                    yield token
+
+    async def serve_file(self, text_content: str, filename: str) -> str:
+        # Answer the query, put response in a (temp) file and return its path
+        result = await self.serve_text(text_content) or ""
+        fd, output_path = tempfile.mkstemp(prefix="processed_")
+        with os.fdopen(fd, 'w') as f:
+            f.write(result)
+        return output_path
 
-    def serve_text(self, text:str, key:str|None=None) -> str:
-        os.environ["OPENAI_API_KEY"] = key or "xxx"
-        result = self.agent.llm_response(text)
-        return result.content
+    @staticmethod
+    def read_chunks(path: str) -> Iterator[str]:
+        """
+        Decode a spooled upload incrementally, yielding pieces of about
+        FILE_CHUNK_CHARS characters, cut at a line end where possible.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        with open(path, "rb") as f:
+            while block := f.read(UPLOAD_BLOCK_SIZE):
+                buffer += decoder.decode(block)
+                while len(buffer) >= FILE_CHUNK_CHARS:
+                    cut = buffer.rfind("\n", 0, FILE_CHUNK_CHARS) + 1
+                    cut = cut or FILE_CHUNK_CHARS
+                    yield buffer[:cut]
+                    buffer = buffer[cut:]
+        buffer += decoder.decode(b"", final=True)
+        if buffer.strip():
+            yield buffer
 
-    def serve_file(self, text_content: str, filename: str) -> str:
-        # Answer the query, put response in a file and return it
-        result = self.agent.llm_response(text_content)
-        output_filename = f"processed_{filename}"
-        with open(output_filename, 'w') as f:
-            f.write(result.content)
-        return output_filename
+    async def add_partial(self, levels: List[List[str]], result: str) -> None:
+        """
+        Add a mapped result to a tree of partial results, combining every
+        FILE_REDUCE_FAN_IN results at a level into one at the next level up,
+        so only O(fan-in * log(#chunks)) partial results are held at once.
+        """
+        level = 0
+        while True:
+            if len(levels) == level:
+                levels.append([])
+            levels[level].append(result)
+            if len(levels[level]) < FILE_REDUCE_FAN_IN:
+                return
+            prompt = REDUCE_PROMPT + "\n\n".join(levels[level])
+            result = await self.serve_text(prompt) or ""
+            levels[level] = []
+            level += 1
+
+    async def collapse(self, levels: List[List[str]]) -> str:
+        # higher levels cover earlier parts of the document
+        parts = [p for level in reversed(levels) for p in level]
+        if len(parts) == 1:
+            return parts[0]
+        return await self.serve_text(REDUCE_PROMPT + "\n\n".join(parts)) or ""
+
+    async def serve_file_stream(
+        self, path: str, reduce: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Map each piece of the spooled file through the LLM (a few at a time),
+        yielding the results in order as they complete. With `reduce`, the
+        results are also combined and the combined response is yielded last.
+        Memory use does not grow with the size of the file.
+        """
+        pending: deque[asyncio.Task[str]] = deque()
+        levels: List[List[str]] = []
+
+        async def next_result() -> str:
+            result = await pending.popleft() or ""
+            if reduce:
+                await self.add_partial(levels, result)
+            return result + "\n\n"
+
+        try:
+            for chunk in self.read_chunks(path):
+                pending.append(asyncio.create_task(self.serve_text(chunk)))
+                if len(pending) >= FILE_MAP_CONCURRENCY:
+                    yield await next_result()
+            while pending:
+                yield await next_result()
+            if reduce and levels:
+                yield await self.collapse(levels)
+        finally:
+            for task in pending:
+                task.cancel()
 
 
 app = FastAPI()
 server = Server()
 
 
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    if server.coalescer is not None:
+        await server.coalescer.aclose()
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+        metrics.REQUESTS_IN_FLIGHT.dec()
+
+
+def remove_file(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
 # Dependency for API Key authentication
 async def extract_api_key(request: Request) -> str:
     authorization: str = request.headers.get("Authorization")
@@ -75,33 +311,81 @@ async def process_file(file: UploadFile = File(...)) -> Any:
         file_content_bytes = await file.read()
         text_content = file_content_bytes.decode('utf-8')
         # Process text and get the path to the output file
-        output_filename = server.serve_file(text_content, file.filename)
+        output_path = await server.serve_file(text_content, file.filename)
         return FileResponse(
-            path=output_filename,
-            filename=output_filename,
-            media_type='application/octet-stream'
+            path=output_path,
+            filename=f"processed_{file.filename}",
+            media_type='application/octet-stream',
+            # the output file is removed once it has been sent
+            background=BackgroundTask(remove_file, output_path),
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    #TODO: Omit the file cleanup since we need to return the file
-    # finally:
-    #     # Cleanup by removing the created output file if necessary
-    #     if os.path.exists(output_filename):
-    #         os.remove(output_filename)
+
+@app.post("/process_file_stream")
+async def process_file_stream(
+    file: UploadFile = File(...),
+    reduce: bool = False,
+) -> StreamingResponse:
+    """
+    Like /process_file, but for files of any size: the upload is spooled to
+    disk, processed piece by piece, and the results are streamed back.
+    With ?reduce=true a combined response for the whole file is sent last.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, prefix="upload_") as spool:
+        try:
+            while block := await file.read(UPLOAD_BLOCK_SIZE):
+                spool.write(block)
+        except Exception as e:
+            remove_file(spool.name)
+            raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        server.serve_file_stream(spool.name, reduce=reduce),
+        media_type="text/plain",
+        # runs after the response is done, or the client has gone away
+        background=BackgroundTask(remove_file, spool.name),
+    )
 
 @app.post("/process_text")
-def process_text(text_input: TextInput) -> Any:
-    api_key = os.environ.get("OPENAI_API_KEY")
-    result = server.serve_text(text_input.text, key=api_key)
+async def process_text(text_input: TextInput) -> Any:
+    # uses the server's own key (OPENAI_API_KEY in the env)
+    if server.coalescer is not None:
+        result = await server.coalescer.submit(text_input.text)
+    else:
+        result = await server.serve_text(text_input.text)
     return {"message": result, "status": "ok"}
 
+# streaming example: tokens are sent as server-sent events as they arrive
+@app.post("/process_text_stream")
+async def process_text_stream(text_input: TextInput) -> StreamingResponse:
+    async def events() -> AsyncIterator[str]:
+        async for token in server.serve_text_stream(text_input.text):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/metrics")
+def serve_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/llm_pool_stats")
+def llm_pool_stats() -> Dict[str, Any]:
+    return llm_pool.stats()
+
+@app.get("/coalescer_stats")
+def coalescer_stats() -> Dict[str, Any]:
+    if server.coalescer is None:
+        return {"enabled": False}
+    return {"enabled": True, **server.coalescer.stats()}
+
 # authenticated example
 @app.post("/process_text_auth")
-def process_text(
+async def process_text_auth(
     text_input: TextInput,
     api_key:str = Depends(extract_api_key),
 ) -> Any:
-    result = server.serve_text(text_input.text, key=api_key)
+    result = await server.serve_text(text_input.text, key=api_key)
     return {"message": result, "status": "ok"}
 
 @app.post("/process_file_and_data/")
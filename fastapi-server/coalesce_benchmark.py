@@ -0,0 +1,98 @@
+"""
+Throughput and tail latency of /process_text with and without coalescing.
+
+Run two copies of the server against the mock LLM in ../cloud, one of them
+with coalescing turned on, then point this script at both:
+
+MOCK_LLM_LATENCY=0.5 uvicorn mock_openai:app --port 9000  # in ../cloud
+OPENAI_API_BASE=http://localhost:9000/v1 uvicorn app:app --port 8001
+COALESCE_WINDOW_MS=20 OPENAI_API_BASE=http://localhost:9000/v1 \\
+    uvicorn app:app --port 8002
+python3 coalesce_benchmark.py --url http://localhost:8001 \\
+    --coalesced-url http://localhost:8002
+"""
+import asyncio
+import time
+import uuid
+from typing import List
+
+import httpx
+import typer
+from rich import print
+from rich.table import Table
+
+app = typer.Typer()
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+async def run(url: str, clients: int, n_requests: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    # unique prompts, so no response comes from the LLM cache
+    run_id = uuid.uuid4().hex[:8]
+
+    async with httpx.AsyncClient(
+        base_url=url, timeout=300, limits=httpx.Limits(max_connections=clients)
+    ) as client:
+
+        async def client_loop(c: int) -> None:
+            nonlocal errors
+            for i in range(n_requests):
+                start = time.perf_counter()
+                r = await client.post(
+                    "/process_text", json={"text": f"{run_id} client {c} req {i}"}
+                )
+                if r.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(c) for c in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return dict(
+        ok=len(latencies),
+        errors=errors,
+        rps=len(latencies) / elapsed,
+        p50=percentile(latencies, 50) if latencies else float("nan"),
+        p99=percentile(latencies, 99) if latencies else float("nan"),
+    )
+
+
+@app.command()
+def main(
+    url: str = typer.Option(
+        "http://localhost:8001", "--url", "-u", help="server without coalescing"
+    ),
+    coalesced_url: str = typer.Option(
+        "http://localhost:8002", "--coalesced-url", "-cu", help="coalescing server"
+    ),
+    clients: int = typer.Option(64, "--clients", "-c", help="concurrent clients"),
+    n_requests: int = typer.Option(
+        5, "--requests", "-n", help="sequential requests per client"
+    ),
+) -> None:
+    table = Table(title=f"/process_text, {clients} concurrent clients")
+    for col in ["server", "ok", "errors", "req/s", "p50 (s)", "p99 (s)"]:
+        table.add_column(col, justify="right")
+    for label, server_url in [("direct", url), ("coalesced", coalesced_url)]:
+        res = asyncio.run(run(server_url, clients, n_requests))
+        table.add_row(
+            label,
+            str(res["ok"]),
+            str(res["errors"]),
+            f"{res['rps']:.1f}",
+            f"{res['p50']:.3f}",
+            f"{res['p99']:.3f}",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
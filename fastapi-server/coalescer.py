@@ -0,0 +1,97 @@
+"""
+Micro-batching request coalescer.
+
+Requests submitted within a short window (or until `max_batch` are waiting)
+are handed to a synchronous `dispatch` function as one batch, which runs in a
+worker thread; at most `max_workers` batches run at once. Each caller gets back
+its own item's result (or exception). `aclose` waits for the batches still
+running, e.g. on server shutdown.
+
+In app.py the dispatch function is Langroid's `llm_response_batch`, which runs
+its own event loop via asyncio.run, hence the worker threads.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    def __init__(
+        self,
+        dispatch: Callable[[List[Any]], List[Any]],
+        window: float = 0.02,
+        max_batch: int = 32,
+        max_workers: int = 4,
+    ):
+        self.dispatch = dispatch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_workers = max_workers
+        self.waiting: List[Tuple[Any, asyncio.Future]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.workers: asyncio.Semaphore | None = None  # created in the loop
+        # batches in progress; the loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.waiting.append((item, future))
+        if len(self.waiting) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.waiting:
+            batch = self.waiting[: self.max_batch]
+            self.waiting = self.waiting[self.max_batch :]
+            task = asyncio.get_running_loop().create_task(self.run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Batch failed", exc_info=task.exception())
+
+    async def run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        if self.workers is None:
+            self.workers = asyncio.Semaphore(self.max_workers)
+        async with self.workers:
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await asyncio.to_thread(
+                    self.dispatch, [item for item, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Dispatch any waiting requests and wait for all batches to finish."""
+        self.flush()
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return dict(
+            batches=self.batches,
+            items=self.items,
+            mean_batch_size=self.items / self.batches if self.batches else 0.0,
+            waiting=len(self.waiting),
+        )
@@ -0,0 +1,72 @@
+"""
+Checks that concurrent /process_text_auth requests don't leak into each other.
+
+Sends N requests in parallel, each with its own bearer key and prompt, to a
+server whose LLM is the echoing mock from ../cloud/mock_openai.py. Every
+response must report the request's own key, its own prompt, and a fresh
+conversation (just the system message and the prompt). With `--keys K`
+the requests share K keys, so later requests reuse agents that served
+earlier ones, which must not carry over their history.
+
+MOCK_LLM_ECHO=1 MOCK_LLM_LATENCY=0.5 uvicorn mock_openai:app --port 9000  # in ../cloud
+OPENAI_API_BASE=http://localhost:9000/v1 uvicorn app:app --port 8000
+python3 concurrency_check.py --url http://localhost:8000 -n 100
+"""
+import asyncio
+import time
+
+import httpx
+import typer
+from rich import print
+
+app = typer.Typer()
+
+
+async def one_request(client: httpx.AsyncClient, i: int, keys: int) -> str | None:
+    """Returns a description of what went wrong, or None if all is well."""
+    key = f"test-key-{i % keys}"
+    prompt = f"request-{i}"
+    r = await client.post(
+        "/process_text_auth",
+        json={"text": prompt},
+        headers={"Authorization": f"Bearer {key}"},
+    )
+    if r.status_code != 200:
+        return f"request {i}: HTTP {r.status_code}"
+    expected = f"key={key} messages=2 last={prompt}"
+    message = r.json()["message"]
+    if message != expected:
+        return f"request {i}: expected {expected!r}, got {message!r}"
+    return None
+
+
+async def run(url: str, n: int, keys: int) -> None:
+    limits = httpx.Limits(max_connections=n)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        failures = await asyncio.gather(
+            *(one_request(client, i, keys) for i in range(n))
+        )
+        elapsed = time.perf_counter() - start
+
+    failures = [f for f in failures if f is not None]
+    for f in failures:
+        print(f"[red]{f}")
+    print(f"{n - len(failures)}/{n} requests isolated correctly in {elapsed:.2f}s")
+    if failures:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def main(
+    url: str = typer.Option("http://localhost:8000", "--url", "-u", help="server"),
+    n: int = typer.Option(100, "--requests", "-n", help="parallel requests"),
+    keys: int = typer.Option(
+        0, "--keys", "-k", help="distinct API keys (default: one per request)"
+    ),
+) -> None:
+    asyncio.run(run(url, n, keys or n))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,253 @@
+"""
+Process-wide pooled HTTP transport for LLM clients.
+
+By default every agent's OpenAIGPT builds its own httpx client, i.e. its own
+connection pool, so each new agent pays fresh TCP/TLS handshakes and nothing
+caps the number of outstanding upstream requests. Here all agents talking to
+the same base URL share one (httpx.Client, httpx.AsyncClient) pair, and every
+request through them holds a slot of a global concurrency limit until its
+response (including a streamed one) is closed or read to the end, or the
+request's task finishes.
+
+Use it by passing a config through `pooled`:
+
+    llm_config = llm_pool.pooled(OpenAIGPTConfig(chat_model=...))
+
+Limits can be set in the environment:
+LLM_POOL_MAX_CONNECTIONS, LLM_POOL_MAX_KEEPALIVE, LLM_POOL_KEEPALIVE_EXPIRY,
+LLM_POOL_MAX_CONCURRENCY, LLM_POOL_HTTP2.
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+
+import httpx
+
+import metrics
+
+MAX_CONNECTIONS = int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+# max outstanding upstream LLM requests across all agents in this process
+MAX_CONCURRENCY = int(os.environ.get("LLM_POOL_MAX_CONCURRENCY", "64"))
+# HTTP/2 is used only if the `h2` package is installed
+HTTP2 = os.environ.get("LLM_POOL_HTTP2", "1") == "1" and (
+    importlib.util.find_spec("h2") is not None
+)
+
+
+class PoolCounters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+
+    def waiting_start(self):
+        with self.lock:
+            self.waiting += 1
+
+    def acquired(self):
+        with self.lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def released(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+counters = PoolCounters()
+_sync_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_async_slots = None  # created lazily, inside the server's event loop
+_clients = {}  # base_url -> (httpx.Client, httpx.AsyncClient)
+_clients_lock = threading.Lock()
+
+
+def _get_async_slots():
+    global _async_slots
+    if _async_slots is None:
+        _async_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _async_slots
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that gives back its concurrency slot when closed or read."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        try:
+            yield from self.stream
+        finally:
+            self._release()
+
+    def _release(self):
+        if self.release is not None:
+            release, self.release = self.release, None
+            release()
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """
+    Async response body that gives back its concurrency slot when it is
+    closed or fully read, or when the task that made the request finishes
+    without closing it. The last case happens when a streaming LLM call is
+    cancelled mid-stream (e.g. its client disconnected): the OpenAI client
+    then never closes the response, so the slot would otherwise be held
+    forever.
+    """
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+        self.closing = None
+        self.owner = asyncio.current_task()
+        if self.owner is not None:
+            self.owner.add_done_callback(self._abandoned)
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.stream:
+                yield chunk
+        finally:
+            self._release()
+
+    def _release(self):
+        if self.release is None:
+            return
+        release, self.release = self.release, None
+        release()
+        if self.owner is not None:
+            self.owner.remove_done_callback(self._abandoned)
+            self.owner = None
+
+    def _abandoned(self, task):
+        if self.release is None:
+            return
+        self._release()
+        # nobody will read the rest, so give the connection back to the pool
+        self.closing = asyncio.ensure_future(self.stream.aclose())
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self._release()
+
+
+class LimitedTransport(httpx.HTTPTransport):
+    def handle_request(self, request):
+        counters.waiting_start()
+        _sync_slots.acquire()
+        counters.acquired()
+        start = time.perf_counter()
+
+        def release():
+            metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - start)
+            counters.released()
+            _sync_slots.release()
+
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+
+class LimitedAsyncTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request):
+        slots = _get_async_slots()
+        counters.waiting_start()
+        try:
+            await slots.acquire()
+        except BaseException:
+            with counters.lock:
+                counters.waiting -= 1
+            raise
+        counters.acquired()
+        start = time.perf_counter()
+
+        def release():
+            metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - start)
+            counters.released()
+            slots.release()
+
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+
+def _make_clients():
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    return (
+        httpx.Client(transport=LimitedTransport(limits=limits, http2=HTTP2)),
+        httpx.AsyncClient(
+            transport=LimitedAsyncTransport(limits=limits, http2=HTTP2)
+        ),
+    )
+
+
+def get_clients(base_url=None):
+    """The shared (httpx.Client, httpx.AsyncClient) pair for this base URL."""
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = _make_clients()
+        return _clients[base_url]
+
+
+def pooled(llm_config):
+    """Make an OpenAIGPTConfig use the shared clients for its base URL."""
+    base_url = llm_config.api_base
+    llm_config.http_client_factory = lambda: get_clients(base_url)
+    return llm_config
+
+
+def stats():
+    with counters.lock:
+        return dict(
+            pools=len(_clients),
+            max_connections=MAX_CONNECTIONS,
+            max_concurrency=MAX_CONCURRENCY,
+            http2=HTTP2,
+            in_flight=counters.in_flight,
+            peak_in_flight=counters.peak_in_flight,
+            waiting=counters.waiting,
+            requests=counters.requests,
+            utilization=counters.in_flight / MAX_CONCURRENCY,
+        )
+
+
+def _pool_metrics():
+    s = stats()
+    return [
+        ("llm_pool_in_flight", "gauge", "LLM requests in flight", s["in_flight"]),
+        ("llm_pool_waiting", "gauge", "LLM requests waiting for a slot", s["waiting"]),
+        ("llm_pool_utilization", "gauge", "Share of LLM slots in use", s["utilization"]),
+    ]
+
+
+metrics.add_collector(_pool_metrics)
@@ -0,0 +1,67 @@
+"""
+Streaming an agent's LLM response token by token, for the example servers.
+
+`stream_response` points the agent's streaming callback at a bounded queue
+and yields tokens from it while the LLM call runs as a task. A slow client
+that lets the queue fill up pauses reading from the LLM until it catches up;
+closing the generator (e.g. on client disconnect) cancels the LLM call.
+"""
+import asyncio
+from typing import AsyncIterator
+
+from langroid.agent.chat_agent import ChatAgent
+from langroid.language_models.base import StreamEventType
+
+import metrics
+
+# Max tokens buffered for a streaming client.
+STREAM_QUEUE_SIZE = 64
+
+
+async def stream_response(
+    agent: ChatAgent, prompt: str, queue_size: int = STREAM_QUEUE_SIZE
+) -> AsyncIterator[str]:
+    """
+    Yield the tokens of `agent`'s response to `prompt` as the LLM streams
+    them. The caller must make sure no other response runs on `agent`
+    meanwhile: its streaming callback is swapped out until this returns.
+    """
+    tokens: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+
+    async def stream_token(token: str, event=StreamEventType.TEXT) -> None:
+        if event == StreamEventType.TEXT:
+            await tokens.put(token)
+
+    async def start_llm_stream_async():
+        return stream_token
+
+    callbacks = agent.callbacks
+    orig_start = callbacks.start_llm_stream_async
+    callbacks.start_llm_stream_async = start_llm_stream_async
+    task = asyncio.create_task(agent.llm_response_async(prompt))
+    streamed = False
+    next_token = None
+    try:
+        while True:
+            next_token = asyncio.ensure_future(tokens.get())
+            done, _ = await asyncio.wait(
+                {next_token, task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_token not in done:
+                next_token.cancel()
+                break
+            streamed = True
+            yield next_token.result()
+        while not tokens.empty():
+            streamed = True
+            yield tokens.get_nowait()
+        response = task.result()
+        metrics.observe_response(response)
+        # cached responses are not streamed, so send them whole
+        if not streamed and response is not None:
+            yield response.content
+    finally:
+        task.cancel()
+        if next_token is not None:
+            next_token.cancel()
+        callbacks.start_llm_stream_async = orig_start
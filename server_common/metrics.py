@@ -0,0 +1,178 @@
+"""
+Minimal Prometheus-style metrics for the example servers.
+
+Counters, gauges and histograms kept in-process and rendered in the
+Prometheus text exposition format, for a server to serve at /metrics.
+Recording a value takes one uncontended lock and a few list operations,
+so it is cheap enough for every request (see ../cloud/metrics_benchmark.py).
+Values that already exist elsewhere (LLM token counts and cost, agent pool
+size) are not recorded on the hot path at all: they are read when /metrics
+is scraped, via `add_collector`.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langroid.language_models.base import LanguageModel
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # label values -> value
+        _metrics.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # per-bucket counts (+Inf last), sum, count
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self.lock:
+            items = [(k, [list(s[0]), s[1], s[2]]) for k, s in self.values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                lbl = _labels(self.label_names + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{lbl} {cumulative}")
+            lbl = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{lbl} {total}")
+            lines.append(f"{self.name}_count{lbl} {count}")
+        return lines
+
+
+_metrics = []
+_collectors = []
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("endpoint",)
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests in progress")
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "LLM API call latency")
+LLM_CACHE = Counter(
+    "llm_response_cache_total", "LLM responses by cache result", ("result",)
+)
+
+
+def add_collector(collect):
+    """
+    Register a function called at scrape time, returning a list of
+    (name, type, help, value) tuples, e.g. for a pool size.
+    """
+    _collectors.append(collect)
+
+
+def _llm_usage():
+    tokens, cost = LanguageModel.tot_tokens_cost()
+    return [
+        ("llm_tokens_total", "counter", "LLM tokens used, all models", tokens),
+        ("llm_cost_usd_total", "counter", "LLM cost in USD, all models", cost),
+    ]
+
+
+add_collector(_llm_usage)
+
+
+@contextmanager
+def track_request(endpoint):
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+        REQUESTS_IN_FLIGHT.dec()
+
+
+def observe_response(response):
+    """Count an agent response (a ChatDocument or None) as a cache hit/miss."""
+    if response is not None:
+        LLM_CACHE.inc(1, "hit" if response.metadata.cached else "miss")
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, type, help, value in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_in_thread(port):
+    """Serve /metrics on its own port, for servers without their own routes."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
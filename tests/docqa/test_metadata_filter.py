@@ -0,0 +1,52 @@
+import numpy as np
+
+from examples.docqa.metadata_filter import (
+    F,
+    MetadataIndex,
+    compile_for,
+    to_predicate,
+)
+
+DOCS = [
+    {"content": "a", "metadata": {"flag": True}},
+    {"content": "b", "metadata": {"flag": 1}},
+    {"content": "c", "metadata": {"flag": 1.0}},
+    {"content": "d", "metadata": {"flag": False}},
+    {"content": "e", "metadata": {"flag": 0}},
+    {"content": "f", "metadata": {"flag": [True, 2]}},
+]
+
+
+def expected(expr):
+    predicate = to_predicate(expr)
+    return [row for row, doc in enumerate(DOCS) if predicate(doc)]
+
+
+def test_bool_and_int_values_do_not_collide():
+    index = MetadataIndex()
+    index.add(DOCS)
+    cases = [
+        (F("flag") == True, [0, 5]),  # noqa: E712
+        (F("flag") == 1, [1, 2]),
+        (F("flag") == False, [3]),  # noqa: E712
+        (F("flag") == 0, [4]),
+        (F("flag") != True, [1, 2, 3, 4, 5]),  # noqa: E712
+        (F("flag").isin([True]), [0, 5]),
+        (F("flag").notin([1]), [0, 3, 4, 5]),
+        (F("flag").has(True), [0, 5]),
+    ]
+    for expr, rows in cases:
+        assert expected(expr) == rows, expr
+        assert index.rows(expr).tolist() == rows, expr
+    # cached postings of one value are not returned for the other
+    assert np.array_equal(index.rows(F("flag") == 1), [1, 2])
+    assert np.array_equal(index.rows(F("flag") == True), [0, 5])  # noqa: E712
+
+
+def test_bool_and_int_conditions_compile_separately():
+    assert (F("flag") == True) != (F("flag") == 1)  # noqa: E712
+    assert F("flag").isin([True, 0]) != F("flag").isin([1, 0])
+    assert F("flag").isin([1, 0]) == F("flag").isin([1.0, 0])
+    assert compile_for(None, F("flag") == 1) != compile_for(
+        None, F("flag") == True  # noqa: E712
+    )
@@ -0,0 +1,41 @@
+import os
+
+from langroid.agent.special.doc_chat_agent import DocChatAgent, DocChatAgentConfig
+from langroid.language_models.mock_lm import MockLMConfig
+from langroid.parsing.parser import ParsingConfig, Splitter
+from langroid.utils.configuration import Settings, set_global
+from langroid.vector_store.qdrantdb import QdrantDBConfig
+
+from examples.docqa.hash_embeddings import HashEmbeddings
+from examples.docqa.parallel_ingest import ingest_files_parallel
+
+
+def test_streaming_ingest_sets_original_docs(tmp_path):
+    set_global(Settings(cache=False, stream=False))
+    paths = []
+    for i in range(3):
+        path = os.path.join(tmp_path, f"doc-{i}.txt")
+        with open(path, "w") as f:
+            f.write(" ".join(f"word{i}-{j}" for j in range(300)))
+        paths.append(path)
+    agent = DocChatAgent(
+        DocChatAgentConfig(
+            llm=MockLMConfig(),
+            parsing=ParsingConfig(splitter=Splitter.TOKENS, chunk_size=100),
+            vecdb=QdrantDBConfig(
+                cloud=False,
+                collection_name="test-parallel-ingest",
+                storage_path=os.path.join(tmp_path, "qdrant"),
+                embedding_model=HashEmbeddings(dims=16),
+                replace_collection=True,
+            ),
+        )
+    )
+    # no enrichment and no add_fields_to_content: the streaming path
+    ids = ingest_files_parallel(agent, paths, workers=1)
+
+    chunk_ids = [i for path in paths for i in ids[path]]
+    assert len(chunk_ids) > len(paths)
+    assert [d.id() for d in agent.original_docs] == chunk_ids
+    assert agent.original_docs_length == agent.doc_length(agent.original_docs)
+    assert agent.original_docs_length > 0
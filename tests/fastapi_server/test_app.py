@@ -0,0 +1,77 @@
+import asyncio
+import contextlib
+import importlib.util
+import random
+import sys
+from pathlib import Path
+
+import langroid as lr
+from langroid.language_models.mock_lm import MockLMConfig
+
+APP_DIR = Path(__file__).resolve().parents[2] / "fastapi-server"
+# app.py imports coalescer.py from its own directory
+sys.path.insert(0, str(APP_DIR))
+spec = importlib.util.spec_from_file_location("fastapi_app", APP_DIR / "app.py")
+app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app)
+
+
+class KeyedMockLMConfig(MockLMConfig):
+    # Server.new_agent puts each request's API key here
+    api_key: str = ""
+
+
+async def echo(msg: str) -> str:
+    # let other requests run in the middle of this one
+    await asyncio.sleep(random.uniform(0, 0.01))
+    return f"re: {msg}"
+
+
+def mock_server() -> "app.Server":
+    server = app.Server()
+    server.llm_config = KeyedMockLMConfig(response_fn_async=echo)
+    return server
+
+
+def test_serve_text_keeps_keys_apart_under_concurrency():
+    server = mock_server()
+    seen = []
+    pooled_agent = server.agent
+
+    @contextlib.asynccontextmanager
+    async def agent(key=None):
+        async with pooled_agent(key) as a:
+            seen.append((key, a.config.llm.api_key, len(a.message_history)))
+            yield a
+
+    server.agent = agent
+    requests = [(f"key-{i % 3}", f"prompt {i}") for i in range(30)]
+
+    async def main():
+        # twice, so the second round runs on agents from the pool
+        for _ in range(2):
+            results = await asyncio.gather(
+                *(server.serve_text(text, key=key) for key, text in requests)
+            )
+            assert results == [f"re: {text}" for _, text in requests]
+
+    asyncio.run(main())
+
+    assert len(seen) == 2 * len(requests)
+    for key, api_key, n_messages in seen:
+        # each request got an agent with its own key, and no earlier history
+        assert api_key == key
+        assert n_messages == 0
+    assert set(server.idle_agents) == {"key-0", "key-1", "key-2"}
+    for key, idle in server.idle_agents.items():
+        assert all(a.config.llm.api_key == key for a in idle)
+
+
+def test_serve_text_without_a_response(monkeypatch):
+    server = mock_server()
+
+    async def no_response(self, message=None):
+        return None
+
+    monkeypatch.setattr(lr.ChatAgent, "llm_response_async", no_response)
+    assert asyncio.run(server.serve_text("hello", key="key-0")) is None